@@ -6,8 +6,9 @@ import jwt
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from config import settings
-from database import get_db
+from database import get_db_session, run_db
 from models import User
 from schemas import TokenData
 
@@ -52,8 +53,11 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
     
     return token_data
 
-def get_current_user(token_data: TokenData = Depends(verify_token), db: Session = Depends(get_db)) -> User:
-    user = db.query(User).filter(User.email == token_data.email).first()
+def get_user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
+async def get_current_user(token_data: TokenData = Depends(verify_token), db=Depends(get_db_session)) -> User:
+    user = await run_db(db, get_user_by_email, token_data.email)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -67,9 +71,18 @@ def get_current_active_user(current_user: User = Depends(get_current_user)) -> U
     return current_user
 
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    user = db.query(User).filter(User.email == email).first()
+    user = get_user_by_email(db, email)
     if not user:
         return None
     if not verify_password(password, user.hashed_password):
         return None
     return user
+
+async def authenticate_user_async(db, email: str, password: str) -> Optional[User]:
+    user = await run_db(db, get_user_by_email, email)
+    if not user:
+        return None
+    # bcrypt is deliberately slow; keep it off the event loop
+    if not await run_in_threadpool(verify_password, password, user.hashed_password):
+        return None
+    return user
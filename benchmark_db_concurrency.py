@@ -0,0 +1,137 @@
+"""
+Database Concurrency Benchmark
+Measures knowledge-base read and chat write throughput under each SQLite PRAGMA profile
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import SQLITE_PRAGMA_PROFILES, make_engine
+
+READ_QUERY = text(
+    "SELECT d.name, COUNT(*) FROM diseases d "
+    "JOIN symptom_disease_mapping m ON m.disease_id = d.id "
+    "JOIN symptoms s ON s.id = m.symptom_id "
+    "WHERE s.name = :name GROUP BY d.id"
+)
+WRITE_QUERY = text(
+    "INSERT INTO conversations (id, user_id, session_id, message_type, content, created_at) "
+    "VALUES (:id, :user_id, :session_id, 'user', :content, :created_at)"
+)
+
+
+def _run_profile(database_path: str, profile: str, readers: int, writers: int, duration: float,
+                 read_only_pool: bool) -> dict:
+    url = f"sqlite:///{database_path}"
+    write_engine = make_engine(url, pragma_profile=profile, pool_size=writers, max_overflow=0)
+    read_engine = (
+        make_engine(url, read_only=True, pragma_profile=profile, pool_size=readers, max_overflow=0)
+        if read_only_pool else make_engine(url, pragma_profile=profile, pool_size=readers + writers, max_overflow=0)
+    )
+    with read_engine.connect() as conn:
+        symptom_names = [row[0] for row in conn.execute(text("SELECT name FROM symptoms"))]
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {"read_latencies": [], "write_latencies": [], "read_errors": 0, "write_errors": 0}
+
+    def reader(seed: int):
+        latencies, errors, i = [], 0, seed
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with read_engine.connect() as conn:
+                    conn.execute(READ_QUERY, {"name": symptom_names[i % len(symptom_names)]}).all()
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors += 1
+            i += 1
+        with lock:
+            results["read_latencies"].extend(latencies)
+            results["read_errors"] += errors
+
+    def writer(seed: int):
+        latencies, errors = [], 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with write_engine.begin() as conn:
+                    conn.execute(WRITE_QUERY, {
+                        "id": str(uuid.uuid4()), "user_id": "benchmark", "session_id": f"bench-{seed}",
+                        "content": "benchmark message " * 20, "created_at": datetime.utcnow()
+                    })
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors += 1
+        with lock:
+            results["write_latencies"].extend(latencies)
+            results["write_errors"] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    def p95(values):
+        return statistics.quantiles(values, n=20)[-1] * 1000 if len(values) >= 20 else float("nan")
+
+    return {
+        "profile": profile,
+        "reads_per_sec": len(results["read_latencies"]) / duration,
+        "writes_per_sec": len(results["write_latencies"]) / duration,
+        "read_p95_ms": p95(results["read_latencies"]),
+        "write_p95_ms": p95(results["write_latencies"]),
+        "read_errors": results["read_errors"],
+        "write_errors": results["write_errors"],
+    }
+
+
+def run_benchmark(source_database: str, profiles, readers: int = 8, writers: int = 2,
+                  duration: float = 5.0, read_only_pool: bool = True):
+    """Run the benchmark for each profile on a fresh copy of the database"""
+    rows = []
+    for profile in profiles:
+        workdir = tempfile.mkdtemp(prefix="mayberry-bench-")
+        try:
+            database_path = os.path.join(workdir, "bench.db")
+            shutil.copyfile(source_database, database_path)
+            rows.append(_run_profile(database_path, profile, readers, writers, duration, read_only_pool))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{readers} readers, {writers} writers, {duration:.0f}s per profile")
+    print(f"{'profile':<12} {'reads/s':>10} {'writes/s':>10} {'read p95':>10} {'write p95':>10} {'errors r/w':>12}")
+    for row in rows:
+        print(f"{row['profile']:<12} {row['reads_per_sec']:>10.0f} {row['writes_per_sec']:>10.0f} "
+              f"{row['read_p95_ms']:>8.1f}ms {row['write_p95_ms']:>8.1f}ms "
+              f"{row['read_errors']:>5}/{row['write_errors']:<5}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent reads and writes per SQLite PRAGMA profile")
+    parser.add_argument("--database", default="./mayberry_medical.db", help="SQLite file to copy for each run")
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PRAGMA_PROFILES), choices=list(SQLITE_PRAGMA_PROFILES))
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--shared-pool", action="store_true", help="Read through the writable pool instead of a read-only one")
+    args = parser.parse_args()
+
+    run_benchmark(args.database, args.profiles, args.readers, args.writers, args.duration, not args.shared_pool)
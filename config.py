@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Core settings
@@ -9,6 +9,11 @@ class Settings(BaseSettings):
 
     # Database settings
     DATABASE_URL: str = "sqlite:///./mayberry_medical.db"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_SQLITE_PRAGMA_PROFILE: str = "performance"  # 'default', 'performance', 'durable'
+    ASYNC_DB_ENABLED: bool = False  # Serve routers through an async engine (aiosqlite / asyncpg)
 
     # JWT settings
     JWT_SECRET: str = "your-jwt-secret-key-change-this-in-production"
@@ -31,9 +36,38 @@ class Settings(BaseSettings):
     BIOBERT_MODEL_ENABLED: bool = True
     CLINICALBERT_MODEL_ENABLED: bool = True
     PREDICTIVE_ANALYTICS_ENABLED: bool = True
+    INFERENCE_BACKEND: str = "transformers"  # Key of services.inference.BACKENDS
+    BIOBERT_MODEL_PATH: Optional[str] = None  # Local model directory; models are never downloaded
+    CLINICALBERT_MODEL_PATH: Optional[str] = None
+    INFERENCE_MAX_BATCH_SIZE: int = 8  # Concurrent requests run as one forward pass
+    INFERENCE_MAX_WAIT_MS: float = 5.0  # Longest a request waits for its batch to fill
+    INFERENCE_MAX_LENGTH: int = 256  # Tokens per text
+    INFERENCE_NUM_THREADS: Optional[int] = None  # torch intra-op threads; torch's default when unset
+    INFERENCE_TIMEOUT_SECONDS: float = 2.0  # Chat falls back to knowledge base ranking after this
+    INFERENCE_RERANK_WEIGHT: float = 0.0  # Share of encoder similarity in chat search ranking; 0 keeps the TF-IDF order
+    
+    # Knowledge Base Settings
+    KB_READ_ONLY_POOL: bool = True  # Separate read-only connection pool for knowledge base lookups
+    KB_READ_POOL_SIZE: int = 5
+    KB_SYMPTOM_SCORER: str = "ratio"  # 'ratio', 'weighted', 'bayes'
+    KB_VERSION_CHECK_SECONDS: float = 30.0  # How often to look for a repopulated knowledge base
+    KB_BATCH_CHUNK_SIZE: int = 256  # Symptom sets scored together by the batch endpoint
+    KB_STREAM_BATCH_SIZE: int = 200  # Rows fetched per keyset query when streaming NDJSON listings
+    KB_CACHE_MAX_ENTRIES: int = 2048  # 0 disables the query result cache
+    KB_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # Approximate (JSON-length) budget for cached results; 0 = entry count only
+    KB_CACHE_TTL_SECONDS: float = 3600.0
+    KB_SNAPSHOT_PATH: Optional[str] = None  # Binary snapshot built by knowledge_base/build_snapshot.py
+    KB_SEMANTIC_INDEX_PATH: Optional[str] = None  # Saved TF-IDF index; built in memory when unset
+    KB_ADMIN_TOKEN: Optional[str] = None  # Enables POST /knowledge/admin/reload (X-Admin-Token header)
+    KB_RELOAD_WATCH_PATH: Optional[str] = None  # File whose modification triggers a reload; defaults to KB_SNAPSHOT_PATH
+    KB_RELOAD_WATCH_SECONDS: float = 5.0  # Poll interval for the watched file; 0 disables watching
     
     # Feature Flags
     MEDICAL_MEMORY_ENABLED: bool = True
+    MEDICAL_MEMORY_MAX_USERS: int = 10000  # Users whose memory is kept in process; 0 always reads the database
+    MEDICAL_MEMORY_TTL_SECONDS: float = 300.0  # Bounds how long another worker's updates can go unseen
+    MEDICAL_MEMORY_FLUSH_SECONDS: float = 2.0  # Write-behind interval for updated memories
+    MEDICAL_MEMORY_FLUSH_BATCH: int = 500  # Pending users that trigger an early flush
     SYMPTOM_DETECTIVE_ENABLED: bool = True
     HEALTH_TIMELINE_ENABLED: bool = True
     EMERGENCY_AI_ENABLED: bool = True
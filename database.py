@@ -1,17 +1,163 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
 from config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Needed for SQLite
+try:
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+except ImportError:
+    AsyncSession = None
+
+# PRAGMAs applied to every new SQLite connection, selected by DB_SQLITE_PRAGMA_PROFILE
+SQLITE_PRAGMA_PROFILES = {
+    # SQLite defaults: rollback journal, writers block readers
+    "default": {},
+    # WAL lets readers run alongside a writer; NORMAL sync is safe with WAL
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,  # KiB (negative) -> 64 MB page cache per connection
+        "mmap_size": 268435456,  # 256 MB memory-mapped I/O
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,  # ms to wait for a lock instead of failing
+    },
+    # WAL concurrency with a full fsync on every commit
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+}
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def _is_sqlite_memory(url: str) -> bool:
+    return _is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+# Async drivers substituted for the sync ones when ASYNC_DB_ENABLED
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def _engine_kwargs(url: str, pool_size: int = None, max_overflow: int = None) -> dict:
+    kwargs = {}
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False}  # Needed for SQLite
+    else:
+        kwargs["pool_pre_ping"] = True
+    if not _is_sqlite_memory(url):
+        kwargs["pool_size"] = pool_size if pool_size is not None else settings.DB_POOL_SIZE
+        kwargs["max_overflow"] = max_overflow if max_overflow is not None else settings.DB_MAX_OVERFLOW
+        kwargs["pool_timeout"] = settings.DB_POOL_TIMEOUT
+    return kwargs
+
+def _install_pragmas(engine: Engine, read_only: bool, pragma_profile: str = None):
+    pragmas = dict(SQLITE_PRAGMA_PROFILES[pragma_profile or settings.DB_SQLITE_PRAGMA_PROFILE])
+    if read_only:
+        pragmas["query_only"] = "ON"
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+def make_engine(url: str = None, read_only: bool = False, pool_size: int = None,
+                max_overflow: int = None, pragma_profile: str = None) -> Engine:
+    """Create an engine configured from settings
+
+    SQLite connections get the PRAGMAs of the selected profile; read-only
+    engines additionally set ``query_only`` so a stray write fails loudly.
+    """
+    url = url or settings.DATABASE_URL
+    engine = create_engine(url, **_engine_kwargs(url, pool_size, max_overflow))
+    if _is_sqlite(url):
+        _install_pragmas(engine, read_only, pragma_profile)
+    return engine
+
+def make_async_engine(url: str = None, read_only: bool = False, pool_size: int = None,
+                      max_overflow: int = None, pragma_profile: str = None) -> "AsyncEngine":
+    """Create an async engine for the same database, swapping in the async driver"""
+    if AsyncSession is None:
+        raise RuntimeError("Async database access requires SQLAlchemy's asyncio extension")
+    url = make_url(url or settings.DATABASE_URL)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver configured for '{backend}' databases")
+    url = url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+    kwargs = _engine_kwargs(url, pool_size, max_overflow)
+    kwargs.get("connect_args", {}).pop("check_same_thread", None)  # aiosqlite runs on its own thread
+    if "pool_size" in kwargs:
+        kwargs["poolclass"] = AsyncAdaptedQueuePool  # aiosqlite would otherwise default to NullPool
+    engine = create_async_engine(url, **kwargs)
+    if backend == "sqlite":
+        # Events are registered on the sync facade; aiosqlite's adapter exposes a DB-API cursor
+        _install_pragmas(engine.sync_engine, read_only, pragma_profile)
+    return engine
+
+engine = make_engine()
+
+# Knowledge base lookups can use their own read-only pool so they never queue behind chat writes
+kb_read_engine = (
+    make_engine(read_only=True, pool_size=settings.KB_READ_POOL_SIZE)
+    if settings.KB_READ_ONLY_POOL and not _is_sqlite_memory(settings.DATABASE_URL)
+    else engine
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async counterparts, only created when the routers run in async mode
+async_engine = make_async_engine() if settings.ASYNC_DB_ENABLED else None
+kb_async_read_engine = (
+    make_async_engine(read_only=True, pool_size=settings.KB_READ_POOL_SIZE)
+    if async_engine is not None and settings.KB_READ_ONLY_POOL and not _is_sqlite_memory(settings.DATABASE_URL)
+    else async_engine
+)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if async_engine is not None else None
+)
+
+async def dispose_async_engines():
+    """Close pooled async connections; each aiosqlite connection keeps a worker thread alive until then"""
+    engines = {id(e): e for e in (kb_async_read_engine, async_engine) if e is not None}
+    for pooled in engines.values():
+        await pooled.dispose()
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_db_session():
+    """Request-scoped session for async routes: an AsyncSession in async mode, otherwise a sync Session
+
+    Routes hand their ORM work to ``run_db`` so the same code serves both modes.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run ``fn(session, *args, **kwargs)`` without blocking the event loop
+
+    AsyncSessions run it through ``run_sync`` on the async driver; sync
+    Sessions run it in the threadpool.
+    """
+    if AsyncSession is not None and isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -0,0 +1,60 @@
+"""
+Differential Diagnosis Builder Script
+Precomputes the most similar diseases for every disease into differential_diagnoses
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to the path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from knowledge_base.differentials import SIMILARITY_METRICS, compute_differentials, store_differentials
+from knowledge_base.index import load_knowledge_index
+try:
+    from config import settings
+except ImportError:
+    # Fallback configuration
+    class Settings:
+        DATABASE_URL = "sqlite:///./mayberry_medical.db"
+    settings = Settings()
+
+
+def build_differentials(top_k: int = 10, metric: str = "cosine", min_similarity: float = 0.1) -> int:
+    """Recompute and store the differential diagnosis table"""
+    engine = create_engine(settings.DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    try:
+        started = time.perf_counter()
+        index = load_knowledge_index(db)
+        pairs = compute_differentials(index, top_k=top_k, metric=metric, min_similarity=min_similarity)
+        computed = time.perf_counter()
+        stored = store_differentials(db, index, pairs)
+    finally:
+        db.close()
+
+    print(f"Computed {len(pairs)} differentials for {len(index.disease_order)} diseases "
+          f"({metric}, top {top_k}) in {computed - started:.2f}s")
+    print(f"Stored {stored} rows in {time.perf_counter() - computed:.2f}s")
+    return stored
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Precompute differential diagnoses from symptom similarity")
+    parser.add_argument("--top-k", type=int, default=10, help="Differentials kept per disease")
+    parser.add_argument("--metric", choices=SIMILARITY_METRICS, default="cosine")
+    parser.add_argument("--min-similarity", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    build_differentials(args.top_k, args.metric, args.min_similarity)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
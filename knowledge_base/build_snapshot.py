@@ -0,0 +1,90 @@
+"""
+Knowledge Base Snapshot Builder
+Compiles the knowledge base tables into the binary snapshot served to API workers
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to the path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from knowledge_base.index import load_knowledge_index
+from knowledge_base.snapshot import KnowledgeSnapshot, SnapshotError, write_snapshot
+from knowledge_base.version import compute_kb_version
+try:
+    from config import settings
+except ImportError:
+    # Fallback configuration
+    class Settings:
+        DATABASE_URL = "sqlite:///./mayberry_medical.db"
+        KB_SNAPSHOT_PATH = "./knowledge_base.snapshot"
+    settings = Settings()
+
+
+def build_snapshot(output_path: str) -> dict:
+    """Compile the knowledge base into a snapshot file"""
+    engine = create_engine(settings.DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    try:
+        started = time.perf_counter()
+        index = load_knowledge_index(db)
+        header = write_snapshot(index, output_path)
+    finally:
+        db.close()
+
+    tables = ", ".join(f"{name}={info['rows']}" for name, info in header["tables"].items())
+    print(f"Snapshot written to {output_path} ({os.path.getsize(output_path)} bytes, "
+          f"{time.perf_counter() - started:.2f}s)")
+    print(f"  knowledge base version: {header['kb_version']}")
+    print(f"  rows: {tables}")
+    return header
+
+
+def verify_snapshot(path: str) -> bool:
+    """Check a snapshot's checksum and whether it matches the current database"""
+    try:
+        with KnowledgeSnapshot(path) as snapshot:
+            if not snapshot.verify():
+                print(f"Snapshot {path} failed its checksum")
+                return False
+            snapshot_version = snapshot.kb_version
+    except (OSError, SnapshotError) as e:
+        print(f"Snapshot {path} could not be read: {e}")
+        return False
+
+    engine = create_engine(settings.DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    try:
+        current_version = compute_kb_version(db)
+    finally:
+        db.close()
+
+    if snapshot_version != current_version:
+        print(f"Snapshot {path} is stale (snapshot {snapshot_version}, database {current_version})")
+        return False
+    print(f"Snapshot {path} is valid for knowledge base version {current_version}")
+    return True
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build or verify the knowledge base snapshot")
+    parser.add_argument("command", choices=["build", "verify"])
+    parser.add_argument("--path", default=settings.KB_SNAPSHOT_PATH or "./knowledge_base.snapshot",
+                        help="Snapshot file (defaults to KB_SNAPSHOT_PATH)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build_snapshot(args.path)
+        return 0
+    return 0 if verify_snapshot(args.path) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Knowledge Base Bulk Loader
+Streams CSV/JSONL files into the knowledge base as chunked upserts keyed by natural keys
+"""
+
+import argparse
+import csv
+import gzip
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Add the parent directory to the path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, Table, create_engine, inspect, select
+from sqlalchemy.engine import Connection, Engine
+
+from knowledge_base.models import (
+    MedicalSpecialty, Symptom, Disease, Treatment, Medication, LabMarker, DrugInteraction, SymptomCluster,
+    TermSynonym, symptom_disease_association, disease_treatment_association, symptom_cluster_association
+)
+from knowledge_base.fts import create_fts_tables
+from knowledge_base.index import load_knowledge_index
+from knowledge_base.snapshot import write_snapshot
+
+try:
+    from config import settings
+except ImportError:
+    # Fallback configuration
+    class Settings:
+        DATABASE_URL = "sqlite:///./mayberry_medical.db"
+        KB_SNAPSHOT_PATH = None
+    settings = Settings()
+
+DEFAULT_CHUNK_SIZE = 5000
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+
+
+class EntitySpec(NamedTuple):
+    table: Table
+    key: Tuple[str, ...]  # natural key the upsert conflicts on
+    # input field -> (foreign key column, referenced entity), e.g. "disease" -> ("disease_id", "diseases")
+    references: Dict[str, Tuple[str, str]] = {}
+    lookup: Tuple[str, ...] = ()  # columns other entities may reference this one by
+
+
+# In dependency order: a file is loaded only after the entities it references
+ENTITIES: Dict[str, EntitySpec] = {
+    "specialties": EntitySpec(MedicalSpecialty.__table__, ("name",), lookup=("name",)),
+    "symptoms": EntitySpec(Symptom.__table__, ("name",), lookup=("name",)),
+    "diseases": EntitySpec(Disease.__table__, ("name",), {"specialty": ("specialty_id", "specialties")},
+                           lookup=("name", "icd_10_code")),
+    "treatments": EntitySpec(Treatment.__table__, ("name",), {"specialty": ("specialty_id", "specialties")},
+                             lookup=("name",)),
+    "medications": EntitySpec(Medication.__table__, ("generic_name",), lookup=("generic_name",)),
+    "lab_markers": EntitySpec(LabMarker.__table__, ("name",), {"disease": ("disease_id", "diseases")}),
+    "symptom_clusters": EntitySpec(SymptomCluster.__table__, ("name",), lookup=("name",)),
+    "synonyms": EntitySpec(TermSynonym.__table__, ("synonym", "kind")),
+    "drug_interactions": EntitySpec(DrugInteraction.__table__, ("drug_a_id", "drug_b_id"), {
+        "drug_a": ("drug_a_id", "medications"), "drug_b": ("drug_b_id", "medications")}),
+    "symptom_disease": EntitySpec(symptom_disease_association, ("symptom_id", "disease_id"), {
+        "symptom": ("symptom_id", "symptoms"), "disease": ("disease_id", "diseases")}),
+    "disease_treatment": EntitySpec(disease_treatment_association, ("disease_id", "treatment_id"), {
+        "disease": ("disease_id", "diseases"), "treatment": ("treatment_id", "treatments")}),
+    "symptom_cluster": EntitySpec(symptom_cluster_association, ("cluster_id", "symptom_id"), {
+        "cluster": ("cluster_id", "symptom_clusters"), "symptom": ("symptom_id", "symptoms")}),
+}
+
+
+class LoadStats(NamedTuple):
+    entity: str
+    read: int
+    written: int
+    skipped: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.seconds if self.seconds else 0.0
+
+
+def _upsert_insert(connection: Connection):
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise RuntimeError(f"Upserts are not supported for '{dialect}' databases")
+    return insert
+
+
+def require_unique_key(connection: Connection, table: Table, key: Sequence[str]):
+    """Raise RuntimeError unless the database has a primary key, unique index or unique constraint on ``key``
+
+    Upserts name the key as their conflict target, which only resolves once
+    the migrations adding the natural-key indexes have run.
+    """
+    inspector = inspect(connection)
+    unique_keys = [inspector.get_pk_constraint(table.name, table.schema)["constrained_columns"]]
+    unique_keys += [index["column_names"] for index in inspector.get_indexes(table.name, table.schema) if index["unique"]]
+    unique_keys += [constraint["column_names"] for constraint in inspector.get_unique_constraints(table.name, table.schema)]
+    if not any(set(columns) == set(key) for columns in unique_keys):
+        raise RuntimeError(
+            f"Table '{table.name}' has no unique index on ({', '.join(key)}); "
+            f"run `alembic upgrade head` before loading data"
+        )
+
+
+def upsert_rows(connection: Connection, table: Table, rows: Sequence[Dict], key: Sequence[str],
+                check_key: bool = True) -> int:
+    """Insert rows, updating the existing row whenever the natural key already exists
+
+    Only the columns a row carries are written, so a record with fewer fields
+    never blanks the others. Rows sharing a set of columns run as one
+    executemany; ids and creation timestamps of existing rows are never
+    overwritten. Callers that already ran ``require_unique_key`` may pass
+    ``check_key=False``.
+    """
+    if not rows:
+        return 0
+    if check_key:
+        require_unique_key(connection, table, key)
+    insert = _upsert_insert(connection)
+    # A statement may not touch the same row twice; repeated keys merge, later fields winning
+    merged: Dict[Tuple, Dict] = {}
+    for row in rows:
+        merged.setdefault(tuple(row.get(column) for column in key), {}).update(row)
+
+    groups: Dict[frozenset, List[Dict]] = {}
+    for row in merged.values():
+        if row.get("id", 0) is None and table.c.id.default is not None:
+            # An explicit NULL id still gets the generated default
+            row["id"] = table.c.id.default.arg(None)
+        groups.setdefault(frozenset(row), []).append(row)
+
+    for columns, group in groups.items():
+        statement = insert(table)
+        updates = {
+            column: statement.excluded[column]
+            for column in columns if column not in key and column not in ("id", "created_at")
+        }
+        if "updated_at" in table.c and "updated_at" not in updates:
+            updates["updated_at"] = datetime.utcnow()
+        if updates:
+            statement = statement.on_conflict_do_update(index_elements=list(key), set_=updates)
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=list(key))
+        connection.execute(statement, group)
+    return len(merged)
+
+
+class ReferenceMaps:
+    """Natural key -> id maps for resolving foreign keys without a query per row"""
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self._maps: Dict[str, Dict[str, str]] = {}
+
+    def resolve(self, entity: str, value) -> Optional[str]:
+        if entity not in self._maps:
+            spec = ENTITIES[entity]
+            mapping = {}
+            # Later lookup columns never shadow earlier ones (a name beats a matching code)
+            for column in reversed(spec.lookup):
+                for natural_key, row_id in self.connection.execute(select(spec.table.c[column], spec.table.c.id)):
+                    if natural_key is not None:
+                        mapping[str(natural_key).strip().casefold()] = row_id
+            self._maps[entity] = mapping
+        return self._maps[entity].get(str(value).strip().casefold())
+
+
+def iter_records(path: str, fmt: str = None) -> Iterator[Dict]:
+    """Stream records from a CSV or JSON Lines file (optionally gzipped) one at a time"""
+    name = path[:-3] if path.endswith(".gz") else path
+    fmt = fmt or ("csv" if name.endswith(".csv") else "jsonl")
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as handle:
+        if fmt == "csv":
+            yield from csv.DictReader(handle)
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _coerce(column, value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if not isinstance(value, str):
+        return value
+    if isinstance(column.type, Boolean):
+        return value.strip().lower() in TRUE_VALUES
+    if isinstance(column.type, Integer):
+        return int(value)
+    if isinstance(column.type, Float):
+        return float(value)
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _prepare(record: Dict, spec: EntitySpec, references: ReferenceMaps) -> Optional[Dict]:
+    """Map a raw record onto table columns, or None when a reference does not resolve"""
+    row = {}
+    for field, value in record.items():
+        if field in spec.references:
+            column, entity = spec.references[field]
+            if record.get(column):
+                continue  # an explicit id wins over the natural key
+            if value in (None, ""):
+                row[column] = None
+                continue
+            row[column] = references.resolve(entity, value)
+            if row[column] is None:
+                return None
+        elif field in spec.table.c:
+            row[field] = _coerce(spec.table.c[field], value)
+    if any(row.get(column) is None for column in spec.key):
+        return None
+    return row
+
+
+def load_file(engine: Engine, entity: str, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              fmt: str = None, progress_every: int = 100000) -> LoadStats:
+    """Upsert every record of ``path`` into ``entity``, committing once per chunk"""
+    spec = ENTITIES[entity]
+    read = written = skipped = 0
+    next_progress = progress_every
+    started = time.perf_counter()
+    records = iter_records(path, fmt)
+    with engine.connect() as connection:
+        require_unique_key(connection, spec.table, spec.key)
+        references = ReferenceMaps(connection)
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            rows = [row for row in (_prepare(record, spec, references) for record in chunk) if row is not None]
+            written += upsert_rows(connection, spec.table, rows, spec.key, check_key=False)
+            connection.commit()
+            read += len(chunk)
+            skipped += len(chunk) - len(rows)
+            if progress_every and read >= next_progress:
+                print(f"   {entity}: {read:,} rows ({read / (time.perf_counter() - started):,.0f} rows/s)")
+                next_progress += progress_every
+    return LoadStats(entity, read, written, skipped, time.perf_counter() - started)
+
+
+def bulk_load(files: Iterable[Tuple[str, str]], chunk_size: int = DEFAULT_CHUNK_SIZE, fmt: str = None,
+              engine: Engine = None) -> List[LoadStats]:
+    """Load (entity, path) pairs in dependency order and refresh the derived artifacts"""
+    engine = engine or create_engine(settings.DATABASE_URL)
+    # Create the FTS triggers first so every upserted row is indexed for search
+    create_fts_tables(engine)
+
+    order = list(ENTITIES)
+    stats = []
+    for entity, path in sorted(files, key=lambda item: order.index(item[0])):
+        print(f"📥 Loading {entity} from {path}...")
+        result = load_file(engine, entity, path, chunk_size, fmt)
+        print(f"   {result.written:,} upserted, {result.skipped:,} skipped of {result.read:,} rows "
+              f"in {result.seconds:.1f}s ({result.rows_per_second:,.0f} rows/s)")
+        stats.append(result)
+
+    if settings.KB_SNAPSHOT_PATH:
+        # Running API workers watch the snapshot and hot-swap to the new data
+        from sqlalchemy.orm import sessionmaker
+        db = sessionmaker(bind=engine)()
+        try:
+            write_snapshot(load_knowledge_index(db), settings.KB_SNAPSHOT_PATH)
+        finally:
+            db.close()
+        print(f"📦 Wrote knowledge base snapshot to {settings.KB_SNAPSHOT_PATH}")
+    return stats
+
+
+def _file_argument(value: str) -> Tuple[str, str]:
+    entity, _, path = value.partition("=")
+    if entity not in ENTITIES or not path:
+        raise argparse.ArgumentTypeError(f"expected ENTITY=PATH with ENTITY one of: {', '.join(ENTITIES)}")
+    return entity, path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Upsert knowledge base data from CSV/JSONL files",
+        epilog="Columns are named after the table columns; foreign keys may be given by natural key "
+               "(e.g. symptom_disease rows with 'symptom' and 'disease' names or ICD-10 codes)."
+    )
+    parser.add_argument("files", nargs="+", type=_file_argument, metavar="ENTITY=PATH")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per executemany and commit")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Override detection from the file extension")
+    args = parser.parse_args(argv)
+
+    try:
+        stats = bulk_load(args.files, args.chunk_size, args.format)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    total = sum(result.read for result in stats)
+    seconds = sum(result.seconds for result in stats)
+    print(f"✅ Loaded {total:,} rows in {seconds:.1f}s ({total / seconds if seconds else 0:,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
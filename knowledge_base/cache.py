@@ -0,0 +1,150 @@
+"""
+Knowledge Base Result Cache
+Bounded LRU/TTL cache for read-only knowledge base queries
+"""
+
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a maximum entry count, an optional byte budget and per-entry TTL
+
+    Sizes are whatever the caller passes to ``set`` (an approximation such
+    as the entry's JSON length); ``max_bytes`` of 0 bounds the entry count only.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600.0, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Look up a key, returning (hit, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value, size = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any, size: int = 0):
+        if self.max_entries <= 0 or (self.max_bytes > 0 and size > self.max_bytes):
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes > 0 and self._bytes > self.max_bytes):
+                _, (_expires_at, _value, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def values(self) -> List[Any]:
+        """Snapshot of the cached values, expired or not, without touching LRU order"""
+        with self._lock:
+            return [value for _, value, _size in self._entries.values()]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+def json_default(value: Any) -> Any:
+    """``json.dumps`` default that serializes frozen mappings as objects"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
+
+
+def freeze(value: Any) -> Any:
+    """Read-only copy of a query result: dicts become MappingProxyType, lists and tuples become tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def approximate_size(value: Any) -> int:
+    """Rough in-memory footprint of a cached result, measured as its JSON length"""
+    return len(json.dumps(value, default=json_default))
+
+
+def cached_query(method):
+    """Cache a MedicalKnowledgeService read method on its arguments and the knowledge base version
+
+    Keys include the version of the current index, so a repopulated
+    knowledge base never serves stale entries; they simply age out of the LRU.
+    Results are frozen (see ``freeze``) and shared between callers, so a hit
+    costs no copy. Coroutine methods named ``<name>_async`` share entries with
+    their sync ``<name>`` counterpart.
+    """
+    if inspect.iscoroutinefunction(method):
+        name = method.__name__[:-len("_async")] if method.__name__.endswith("_async") else method.__name__
+
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            index = await self.get_index_async()
+            key = (name, index.version, args, tuple(sorted(kwargs.items())))
+            hit, value = self.cache.get(key)
+            if not hit:
+                value = await method(self, *args, **kwargs)
+                value = _store(self.cache, key, value)
+            return value
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, self.get_index().version, args, tuple(sorted(kwargs.items())))
+        hit, value = self.cache.get(key)
+        if not hit:
+            value = _store(self.cache, key, method(self, *args, **kwargs))
+        return value
+    return wrapper
+
+
+def _store(cache: LRUCache, key: Hashable, value: Any) -> Any:
+    frozen = freeze(value)
+    cache.set(key, frozen, approximate_size(frozen))
+    return frozen
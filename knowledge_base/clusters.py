@@ -0,0 +1,117 @@
+"""
+Symptom Cluster Matching
+Detects syndromes by matching symptom sets against every SymptomCluster at once
+"""
+
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+from knowledge_base.index import KnowledgeIndex
+
+# Cluster urgency -> minimum risk level it implies for an analysis
+URGENCY_RISK_LEVELS: Dict[str, str] = {
+    "emergency": "critical",
+    "urgent": "high",
+    "routine": "low",
+}
+_URGENCY_RANK = {"emergency": 2, "urgent": 1, "routine": 0}
+
+
+class ClusterMatcher:
+    """Cluster membership compiled into sparse (clusters x symptoms) matrices
+
+    A cluster matches when the reported symptoms cover at least
+    ``min_coverage`` of its total diagnostic weight and at least
+    ``min_members`` of its symptoms (or all of them, for smaller clusters).
+    """
+
+    def __init__(self, index: KnowledgeIndex, min_coverage: float = 0.6, min_members: int = 2):
+        if np is None or sparse is None:
+            raise RuntimeError("Cluster matching requires numpy and scipy")
+
+        self.index = index
+        self.clusters = index.clusters
+        self.min_coverage = min_coverage
+        shape = (len(self.clusters), len(index.symptom_order))
+        if index.cluster_rows is not None:
+            # Snapshot-backed index: the weights share the mapped arrays instead of copying them
+            members = index.cluster_rows
+            self.weights = sparse.csr_matrix(
+                (members.values["diagnostic_weight"], members.indices, members.indptr), shape=shape, copy=False
+            )
+            self.presence = sparse.csr_matrix(
+                (np.ones(len(members), dtype=np.float64), members.indices, members.indptr), shape=shape, copy=False
+            )
+        else:
+            cluster_position = {cluster["id"]: i for i, cluster in enumerate(self.clusters)}
+            rows, cols, weights = [], [], []
+            for cluster_id, symptom_id, _frequency, weight in index.cluster_members:
+                row = cluster_position.get(cluster_id)
+                col = index.symptom_position.get(symptom_id)
+                if row is None or col is None:
+                    continue
+                rows.append(row)
+                cols.append(col)
+                weights.append(weight)
+
+            self.weights = sparse.csr_matrix((np.asarray(weights, dtype=np.float64), (rows, cols)), shape=shape)
+            self.presence = sparse.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=shape)
+            self.presence.data[:] = 1.0
+
+        self.total_weight = np.asarray(self.weights.sum(axis=1)).ravel()
+        sizes = np.asarray(self.presence.sum(axis=1)).ravel()
+        self.required_members = np.minimum(sizes, min_members)
+
+    def match(self, symptom_ids: List[Optional[str]]) -> List[Dict]:
+        """Clusters matched by one symptom set, most urgent and best covered first"""
+        return self.match_many([symptom_ids])[0]
+
+    def match_many(self, symptom_id_sets: List[List[Optional[str]]]) -> List[List[Dict]]:
+        """Match several symptom sets with one sparse product"""
+        if not self.clusters or not symptom_id_sets:
+            return [[] for _ in symptom_id_sets]
+
+        rows, cols = [], []
+        for row, symptom_ids in enumerate(symptom_id_sets):
+            for symptom_id in set(symptom_ids):
+                position = self.index.symptom_position.get(symptom_id)
+                if position is not None:
+                    rows.append(row)
+                    cols.append(position)
+        queries = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+            shape=(len(symptom_id_sets), len(self.index.symptom_order))
+        )
+
+        matched_weight = np.asarray((queries @ self.weights.T).todense())
+        matched_count = np.asarray((queries @ self.presence.T).todense())
+        with np.errstate(divide="ignore", invalid="ignore"):
+            coverage = np.where(self.total_weight > 0, matched_weight / self.total_weight, 0.0)
+        hits = (coverage >= self.min_coverage) & (matched_count >= self.required_members) & (matched_count > 0)
+
+        results = []
+        for row, symptom_ids in enumerate(symptom_id_sets):
+            reported = set(symptom_ids)
+            matches = []
+            for cluster_position in np.flatnonzero(hits[row]):
+                cluster = self.clusters[cluster_position]
+                start, end = self.presence.indptr[cluster_position], self.presence.indptr[cluster_position + 1]
+                members = [self.index.symptom_order[col] for col in self.presence.indices[start:end]]
+                matches.append({
+                    "id": cluster["id"],
+                    "name": cluster["name"],
+                    "category": cluster["category"],
+                    "urgency_level": cluster["urgency_level"],
+                    "clinical_significance": cluster["clinical_significance"],
+                    "coverage": float(min(coverage[row, cluster_position], 1.0)),
+                    "matched_symptoms": [self.index.symptoms[sid]["name"] for sid in members if sid in reported]
+                })
+            matches.sort(key=lambda m: (-_URGENCY_RANK.get(m["urgency_level"], 0), -m["coverage"], m["name"]))
+            results.append(matches)
+        return results
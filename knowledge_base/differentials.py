@@ -0,0 +1,125 @@
+"""
+Differential Diagnosis Builder
+Offline disease-to-disease similarity over symptom-weight vectors
+"""
+
+import json
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from knowledge_base.index import KnowledgeIndex
+from knowledge_base.models import DifferentialDiagnosis
+from knowledge_base.scoring import get_scorer
+
+SIMILARITY_METRICS = ("cosine", "jaccard")
+
+# (primary_disease_id, differential_disease_id, similarity)
+DifferentialPair = Tuple[str, str, float]
+
+
+def _top_k_rows(similarity, row_offset: int, top_k: int, min_similarity: float):
+    """Yield (row, column, score) for the k best off-diagonal entries of each row of a sparse block"""
+    similarity = similarity.tocsr()
+    for local_row in range(similarity.shape[0]):
+        row = row_offset + local_row
+        start, end = similarity.indptr[local_row], similarity.indptr[local_row + 1]
+        columns = similarity.indices[start:end]
+        scores = similarity.data[start:end]
+        keep = (columns != row) & (scores >= min_similarity)
+        columns, scores = columns[keep], scores[keep]
+        if columns.size > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            columns, scores = columns[top], scores[top]
+        for i in np.lexsort((columns, -scores)):
+            yield row, int(columns[i]), float(scores[i])
+
+
+def compute_differentials(index: KnowledgeIndex, top_k: int = 10, metric: str = "cosine",
+                          min_similarity: float = 0.1, block_size: int = 2048) -> List[DifferentialPair]:
+    """Find each disease's top-k most similar diseases
+
+    Similarity is computed as a sparse product of the (diseases x symptoms)
+    weight matrix with its transpose, one block of rows at a time, so memory
+    is bounded by the block size and the number of shared symptoms rather than
+    by diseases squared.
+    """
+    if np is None or sparse is None:
+        raise RuntimeError("Computing differentials requires numpy and scipy")
+    if metric not in SIMILARITY_METRICS:
+        raise ValueError(f"Unknown similarity metric '{metric}'. Available metrics: {', '.join(SIMILARITY_METRICS)}")
+
+    scorer = get_scorer(index, "weighted")
+    if metric == "cosine":
+        vectors = scorer.weights.tocsr()
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        vectors = sparse.diags(1.0 / norms) @ vectors
+    else:
+        vectors = scorer.presence.tocsr()
+        sizes = np.asarray(vectors.sum(axis=1)).ravel()
+    transposed = vectors.T.tocsc()
+
+    disease_order = index.disease_order
+    pairs: List[DifferentialPair] = []
+    for block_start in range(0, vectors.shape[0], block_size):
+        block = vectors[block_start:block_start + block_size]
+        similarity = (block @ transposed).tocsr()
+        if metric == "jaccard":
+            # |A n B| / (|A| + |B| - |A n B|) over the non-zero intersections only
+            similarity = similarity.tocoo()
+            unions = sizes[similarity.row + block_start] + sizes[similarity.col] - similarity.data
+            similarity.data = similarity.data / unions
+        for row, column, score in _top_k_rows(similarity, block_start, top_k, min_similarity):
+            pairs.append((disease_order[row], disease_order[column], min(score, 1.0)))
+    return pairs
+
+
+def describe_differences(index: KnowledgeIndex, primary_id: str, differential_id: str,
+                         max_features: int = 5) -> Dict:
+    """Summarise which symptoms two diseases share and which tell them apart"""
+    primary = index.disease_to_symptoms.get(primary_id, frozenset())
+    differential = index.disease_to_symptoms.get(differential_id, frozenset())
+
+    def names(symptom_ids):
+        return sorted(index.symptoms[sid]["name"] for sid in symptom_ids)[:max_features]
+
+    return {
+        "shared_symptoms": names(primary & differential),
+        "only_in_primary": names(primary - differential),
+        "only_in_differential": names(differential - primary)
+    }
+
+
+def store_differentials(db: Session, index: KnowledgeIndex, pairs: List[DifferentialPair],
+                        chunk_size: int = 5000) -> int:
+    """Replace the DifferentialDiagnosis table with the given pairs"""
+    db.execute(delete(DifferentialDiagnosis))
+    stored = 0
+    for start in range(0, len(pairs), chunk_size):
+        rows = []
+        for primary_id, differential_id, score in pairs[start:start + chunk_size]:
+            features = describe_differences(index, primary_id, differential_id)
+            differential_name = index.diseases[differential_id]["name"]
+            rows.append({
+                "primary_disease_id": primary_id,
+                "differential_disease_id": differential_id,
+                "similarity_score": score,
+                "distinguishing_features": json.dumps(features),
+                "key_differences": (
+                    f"{differential_name} also presents with {', '.join(features['only_in_differential'])}"
+                    if features["only_in_differential"] else None
+                )
+            })
+        db.execute(insert(DifferentialDiagnosis), rows)
+        stored += len(rows)
+    db.commit()
+    return stored
@@ -0,0 +1,130 @@
+"""
+Knowledge Base Full-Text Search
+SQLite FTS5 indexes kept in sync with the symptom, disease and guideline tables
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Source table -> (FTS table, indexed columns, BM25 column weights)
+FTS_TABLES: Dict[str, Tuple[str, List[str], List[float]]] = {
+    "symptoms": ("symptoms_fts", ["name", "description"], [10.0, 1.0]),
+    "diseases": ("diseases_fts", ["name", "description"], [10.0, 1.0]),
+    "medical_guidelines": ("medical_guidelines_fts", ["title", "content"], [5.0, 1.0]),
+}
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_supported(engine: Engine) -> bool:
+    """Check whether the engine is SQLite with the FTS5 extension compiled in"""
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)"))
+            conn.execute(text("DROP TABLE IF EXISTS temp.fts5_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def _key_table(fts_table: str) -> str:
+    return f"{fts_table}_keys"
+
+
+def _fts_statements(source: str, fts_table: str, columns: List[str]) -> List[str]:
+    # The source tables have string ids and only implicit rowids, which VACUUM may renumber,
+    # so each indexed row gets a stable integer key of its own that doubles as its FTS rowid
+    keys = _key_table(fts_table)
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    delete_old = (
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+        f"VALUES ('delete', (SELECT fts_rowid FROM {keys} WHERE id = old.id), {old_values}); "
+    )
+    insert_new = (
+        f"INSERT INTO {fts_table}(rowid, {column_list}) "
+        f"VALUES ((SELECT fts_rowid FROM {keys} WHERE id = new.id), {new_values}); "
+    )
+    return [
+        f"CREATE TABLE IF NOT EXISTS {keys} (fts_rowid INTEGER PRIMARY KEY, id VARCHAR NOT NULL UNIQUE)",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{column_list}, content='', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {keys}(id) VALUES (new.id); {insert_new}END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source} BEGIN "
+        f"{delete_old}DELETE FROM {keys} WHERE id = old.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {source} BEGIN "
+        f"{delete_old}UPDATE {keys} SET id = new.id WHERE id = old.id; {insert_new}END",
+    ]
+
+
+def _rebuild_statements(source: str, fts_table: str, columns: List[str]) -> List[str]:
+    keys = _key_table(fts_table)
+    source_columns = ", ".join(f"{source}.{c}" for c in columns)
+    return [
+        f"INSERT INTO {fts_table}({fts_table}) VALUES ('delete-all')",
+        f"DELETE FROM {keys}",
+        f"INSERT INTO {keys}(id) SELECT id FROM {source}",
+        f"INSERT INTO {fts_table}(rowid, {', '.join(columns)}) SELECT {keys}.fts_rowid, {source_columns} "
+        f"FROM {keys} JOIN {source} ON {source}.id = {keys}.id",
+    ]
+
+
+def create_fts_tables(engine: Engine) -> bool:
+    """Create the FTS5 tables and sync triggers, indexing existing rows on first creation
+
+    Returns False when the backend has no FTS5 support so callers can fall
+    back to substring search.
+    """
+    if not fts_supported(engine):
+        return False
+
+    with engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        }
+        for source, (fts_table, columns, _weights) in FTS_TABLES.items():
+            if source not in existing:
+                continue
+            if fts_table in existing and _key_table(fts_table) not in existing:
+                # Replace indexes keyed on the source's implicit rowid
+                for suffix in ("ai", "ad", "au"):
+                    conn.execute(text(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}"))
+                conn.execute(text(f"DROP TABLE {fts_table}"))
+                existing.discard(fts_table)
+            for statement in _fts_statements(source, fts_table, columns):
+                conn.execute(text(statement))
+            if fts_table not in existing:
+                for statement in _rebuild_statements(source, fts_table, columns):
+                    conn.execute(text(statement))
+    return True
+
+
+def rebuild_fts_indexes(engine: Engine):
+    """Re-index every FTS table from its source table"""
+    if not create_fts_tables(engine):
+        return
+    with engine.begin() as conn:
+        for source, (fts_table, columns, _weights) in FTS_TABLES.items():
+            for statement in _rebuild_statements(source, fts_table, columns):
+                conn.execute(text(statement))
+
+
+def build_match_query(query: str, match_any: bool = False) -> Optional[str]:
+    """Turn free text into a safe FTS5 MATCH expression of quoted prefix terms"""
+    tokens = _TOKEN_PATTERN.findall(query.lower())
+    if not tokens:
+        return None
+    joiner = " OR " if match_any else " "
+    return joiner.join(f'"{token}"*' for token in tokens)
+
+
+def bm25_expression(source: str) -> str:
+    """BM25 ranking expression for a source table's FTS index (lower is better)"""
+    fts_table, _columns, weights = FTS_TABLES[source]
+    return f"bm25({fts_table}, {', '.join(str(w) for w in weights)})"
@@ -0,0 +1,317 @@
+"""
+Knowledge Base Index
+Compiled, immutable in-memory view of the symptom-disease associations
+"""
+
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from knowledge_base.models import (
+    Symptom, Disease, LabMarker, Medication, DrugInteraction, SymptomCluster,
+    symptom_disease_association, drug_interaction_association, symptom_cluster_association
+)
+from knowledge_base.version import compute_kb_version
+
+
+class CompressedRows:
+    """Row-major sparse layout: the entries of row ``i`` are ``indptr[i]:indptr[i + 1]``
+
+    ``indices`` holds each entry's column position and ``values`` its named
+    per-entry arrays. Indexes loaded from a snapshot pass numpy views onto
+    the mapped file, so the arrays are never written to.
+    """
+
+    def __init__(self, indptr, indices, values: Dict[str, Any] = None):
+        self.indptr = indptr
+        self.indices = indices
+        self.values = values or {}
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def columns(self, row: int):
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+
+class _LinkedIds(Mapping):
+    """Read-only id -> frozenset of linked ids, decoded from CompressedRows on access"""
+
+    def __init__(self, rows: CompressedRows, key_order: Sequence[str], key_position: Mapping,
+                 linked_order: Sequence[str]):
+        self._rows = rows
+        self._key_order = key_order
+        self._key_position = key_position
+        self._linked_order = linked_order
+
+    def __getitem__(self, key: str) -> FrozenSet[str]:
+        columns = self._rows.columns(self._key_position[key])
+        if len(columns) == 0:
+            raise KeyError(key)
+        return frozenset(self._linked_order[column] for column in columns.tolist())
+
+    def __iter__(self) -> Iterator[str]:
+        indptr = self._rows.indptr
+        return (key for i, key in enumerate(self._key_order) if indptr[i + 1] > indptr[i])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class KnowledgeIndex:
+    """Read-only lookup tables compiled from the knowledge base
+
+    Built once from ``symptom_disease_association`` so that symptom scoring
+    runs without touching the database. Instances are never mutated after
+    construction; a refreshed knowledge base produces a new index.
+
+    Associations and cluster members come either as id tuples or, from a
+    snapshot, as CompressedRows over symptom/disease/cluster positions
+    (``association_rows`` is diseases x symptoms with probability_weight,
+    severity_modifier and combined_weight; ``symptom_association_rows`` its
+    transpose; ``cluster_rows`` is clusters x symptoms with
+    frequency_in_cluster and diagnostic_weight). ``source`` is kept alive
+    for as long as the index, so mapped arrays stay valid.
+    """
+
+    def __init__(self, symptoms: Iterable[Dict], diseases: Iterable[Dict],
+                 associations: Iterable[Tuple[str, str, float, float]], version: str = None,
+                 lab_markers: Iterable[Dict] = (), medications: Iterable[Dict] = (),
+                 drug_interactions: Iterable[Dict] = (), clusters: Iterable[Dict] = (),
+                 cluster_members: Iterable[Tuple[str, str, float, float]] = (),
+                 association_rows: Optional[CompressedRows] = None,
+                 symptom_association_rows: Optional[CompressedRows] = None,
+                 cluster_rows: Optional[CompressedRows] = None, source: Any = None):
+        symptoms = [dict(s) for s in symptoms]
+        diseases = [dict(d) for d in diseases]
+
+        self.version = version
+        self.symptoms = MappingProxyType({s["id"]: s for s in symptoms})
+        self.symptom_ids_by_name = MappingProxyType({s["name"]: s["id"] for s in symptoms})
+        self.symptom_order = tuple(s["id"] for s in symptoms)
+        self.symptom_position = MappingProxyType({sid: i for i, sid in enumerate(self.symptom_order)})
+        self.diseases = MappingProxyType({d["id"]: d for d in diseases})
+        self.disease_order = tuple(d["id"] for d in diseases)
+        self.disease_position = MappingProxyType({did: i for i, did in enumerate(self.disease_order)})
+        self.association_rows = association_rows
+        self.cluster_rows = cluster_rows
+        self._source = source
+        self._derived: Dict[str, Any] = {}
+        self.lab_markers: Tuple[Dict, ...] = tuple(MappingProxyType(dict(m)) for m in lab_markers)
+        self.medications: Tuple[Dict, ...] = tuple(MappingProxyType(dict(m)) for m in medications)
+        self.drug_interactions: Tuple[Dict, ...] = tuple(MappingProxyType(dict(i)) for i in drug_interactions)
+        self.clusters: Tuple[Dict, ...] = tuple(MappingProxyType(dict(c)) for c in clusters)
+        if cluster_rows is None:
+            # (cluster_id, symptom_id, frequency_in_cluster, diagnostic_weight)
+            self._derived["cluster_members"] = tuple(cluster_members)
+
+        # Emergency snapshot: O(1) membership checks and a ready-to-serve listing
+        emergency = [s for s in symptoms if s["is_emergency"]]
+        self.emergency_symptom_ids: FrozenSet[str] = frozenset(s["id"] for s in emergency)
+        self.emergency_symptom_names: FrozenSet[str] = frozenset(s["name"] for s in emergency)
+        self.emergency_symptoms: Tuple[Dict, ...] = tuple(
+            MappingProxyType({
+                "name": s["name"],
+                "description": s["description"],
+                "body_system": s["body_system"],
+                "red_flags": s["red_flags"]
+            })
+            for s in emergency
+        )
+
+        if association_rows is not None:
+            # Decoded per lookup, so the mapped arrays are not copied into Python sets
+            self.symptom_to_diseases: Mapping = _LinkedIds(
+                symptom_association_rows, self.symptom_order, self.symptom_position, self.disease_order
+            )
+            self.disease_to_symptoms: Mapping = _LinkedIds(
+                association_rows, self.disease_order, self.disease_position, self.symptom_order
+            )
+            return
+
+        associations = tuple(associations)
+        self._derived["associations"] = associations
+        symptom_to_diseases: Dict[str, set] = {}
+        disease_to_symptoms: Dict[str, set] = {}
+        for symptom_id, disease_id, _weight, _modifier in associations:
+            if symptom_id not in self.symptoms or disease_id not in self.diseases:
+                continue
+            symptom_to_diseases.setdefault(symptom_id, set()).add(disease_id)
+            disease_to_symptoms.setdefault(disease_id, set()).add(symptom_id)
+
+        self.symptom_to_diseases: Mapping = MappingProxyType(
+            {sid: frozenset(dids) for sid, dids in symptom_to_diseases.items()}
+        )
+        self.disease_to_symptoms: Mapping = MappingProxyType(
+            {did: frozenset(sids) for did, sids in disease_to_symptoms.items()}
+        )
+
+    @property
+    def associations(self) -> Tuple[Tuple[str, str, float, float], ...]:
+        """(symptom_id, disease_id, probability_weight, severity_modifier) for every association"""
+        return self.derived("associations", lambda index: tuple(
+            (index.symptom_order[symptom], index.disease_order[disease], weight, modifier)
+            for disease, symptom, weight, modifier in _row_entries(
+                index.association_rows, "probability_weight", "severity_modifier"
+            )
+        ))
+
+    @property
+    def cluster_members(self) -> Tuple[Tuple[str, str, float, float], ...]:
+        """(cluster_id, symptom_id, frequency_in_cluster, diagnostic_weight) for every cluster member"""
+        return self.derived("cluster_members", lambda index: tuple(
+            (index.clusters[cluster]["id"], index.symptom_order[symptom], frequency, weight)
+            for cluster, symptom, frequency, weight in _row_entries(
+                index.cluster_rows, "frequency_in_cluster", "diagnostic_weight"
+            )
+        ))
+
+    def derived(self, key: str, factory: Callable[["KnowledgeIndex"], Any]) -> Any:
+        """Return a structure compiled from this index, building it once on first use
+
+        Scorers and other engines hang their compiled arrays off the index so
+        they are discarded together with it when the knowledge base is reloaded.
+        """
+        value = self._derived.get(key)
+        if value is None:
+            value = factory(self)
+            self._derived[key] = value
+        return value
+
+    def count_matching_symptoms(self, symptom_ids: Iterable[str]) -> Dict[str, int]:
+        """Count how many of the given symptoms each candidate disease presents with"""
+        counts: Dict[str, int] = {}
+        for symptom_id in symptom_ids:
+            for disease_id in self.symptom_to_diseases.get(symptom_id, ()):
+                counts[disease_id] = counts.get(disease_id, 0) + 1
+        return counts
+
+
+def _row_entries(rows: CompressedRows, *value_names: str) -> Iterator[Tuple]:
+    """(row, column, *values) for every entry of a CompressedRows"""
+    counts = [end - start for start, end in zip(rows.indptr[:-1].tolist(), rows.indptr[1:].tolist())]
+    row_of_entry = [row for row, count in enumerate(counts) for _ in range(count)]
+    return zip(row_of_entry, rows.indices.tolist(), *(rows.values[name].tolist() for name in value_names))
+
+
+def load_knowledge_index(db: Session) -> KnowledgeIndex:
+    """Read the knowledge base tables and compile them into a KnowledgeIndex"""
+    version = compute_kb_version(db)
+    symptom_rows = db.execute(select(
+        Symptom.id, Symptom.name, Symptom.description, Symptom.category,
+        Symptom.body_system, Symptom.is_emergency_symptom, Symptom.prevalence_rate,
+        Symptom.red_flags
+    )).all()
+    disease_rows = db.execute(select(
+        Disease.id, Disease.name, Disease.description, Disease.icd_10_code,
+        Disease.severity_level, Disease.prevalence, Disease.is_contagious,
+        Disease.age_group_affected, Disease.gender_bias
+    )).all()
+    association_rows = db.execute(select(
+        symptom_disease_association.c.symptom_id,
+        symptom_disease_association.c.disease_id,
+        symptom_disease_association.c.probability_weight,
+        symptom_disease_association.c.severity_modifier
+    )).all()
+
+    symptoms = [
+        {
+            "id": row.id,
+            "name": row.name,
+            "description": row.description,
+            "category": row.category,
+            "body_system": row.body_system,
+            "is_emergency": bool(row.is_emergency_symptom),
+            "prevalence_rate": row.prevalence_rate,
+            "red_flags": row.red_flags
+        }
+        for row in symptom_rows
+    ]
+    diseases = [
+        {
+            "id": row.id,
+            "name": row.name,
+            "description": row.description,
+            "icd_10_code": row.icd_10_code,
+            "severity_level": row.severity_level,
+            "prevalence": row.prevalence,
+            "is_contagious": row.is_contagious,
+            "age_group_affected": row.age_group_affected,
+            "gender_bias": row.gender_bias
+        }
+        for row in disease_rows
+    ]
+    associations = [
+        (
+            row.symptom_id,
+            row.disease_id,
+            row.probability_weight if row.probability_weight is not None else 0.5,
+            row.severity_modifier if row.severity_modifier is not None else 1.0
+        )
+        for row in association_rows
+    ]
+    lab_markers = [
+        dict(row._mapping)
+        for row in db.execute(select(
+            LabMarker.id, LabMarker.name, LabMarker.test_type, LabMarker.units,
+            LabMarker.normal_range_min, LabMarker.normal_range_max, LabMarker.normal_range_text,
+            LabMarker.critical_low, LabMarker.critical_high, LabMarker.clinical_significance,
+            LabMarker.disease_id
+        ))
+    ]
+    medications = [
+        dict(row._mapping)
+        for row in db.execute(select(
+            Medication.id, Medication.generic_name, Medication.brand_names, Medication.drug_class,
+            Medication.mechanism_of_action, Medication.indications, Medication.contraindications,
+            Medication.side_effects, Medication.pregnancy_category, Medication.requires_monitoring,
+            Medication.is_controlled_substance
+        ))
+    ]
+    drug_interactions = [
+        dict(row._mapping)
+        for row in db.execute(select(
+            DrugInteraction.drug_a_id, DrugInteraction.drug_b_id, DrugInteraction.interaction_type,
+            DrugInteraction.severity_level, DrugInteraction.mechanism, DrugInteraction.clinical_effect,
+            DrugInteraction.management, DrugInteraction.evidence_level, DrugInteraction.onset,
+            DrugInteraction.documentation
+        ))
+    ]
+    # Simple pairwise mappings carry only a severity label and a description
+    drug_interactions.extend(
+        {
+            "drug_a_id": row.drug_a_id,
+            "drug_b_id": row.drug_b_id,
+            "interaction_type": row.interaction_severity,
+            "severity_level": None,
+            "mechanism": None,
+            "clinical_effect": row.interaction_description,
+            "management": None,
+            "evidence_level": None,
+            "onset": None,
+            "documentation": None
+        }
+        for row in db.execute(select(drug_interaction_association))
+    )
+    clusters = [
+        dict(row._mapping)
+        for row in db.execute(select(
+            SymptomCluster.id, SymptomCluster.name, SymptomCluster.description, SymptomCluster.category,
+            SymptomCluster.clinical_significance, SymptomCluster.urgency_level
+        ))
+    ]
+    cluster_members = [
+        (
+            row.cluster_id,
+            row.symptom_id,
+            row.frequency_in_cluster if row.frequency_in_cluster is not None else 0.5,
+            row.diagnostic_weight if row.diagnostic_weight is not None else 1.0
+        )
+        for row in db.execute(select(symptom_cluster_association))
+    ]
+    return KnowledgeIndex(symptoms, diseases, associations, version=version,
+                          lab_markers=lab_markers, medications=medications,
+                          drug_interactions=drug_interactions, clusters=clusters,
+                          cluster_members=cluster_members)
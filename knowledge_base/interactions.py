@@ -0,0 +1,120 @@
+"""
+Drug Interaction Graph
+Adjacency map of known drug-drug interactions for checking whole medication lists
+"""
+
+import json
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional
+
+from knowledge_base.index import KnowledgeIndex
+from knowledge_base.resolver import normalize_term
+
+# Interaction labels from most to least severe; both tables' vocabularies are covered
+INTERACTION_SEVERITY_RANK: Dict[str, int] = {
+    "contraindicated": 4,
+    "major": 3,
+    "severe": 3,
+    "moderate": 2,
+    "minor": 1,
+    "mild": 1,
+}
+
+
+def _brand_names(value: Optional[str]) -> List[str]:
+    """Brand names are stored either as a JSON list or as a comma-separated string"""
+    if not value:
+        return []
+    try:
+        names = json.loads(value)
+    except ValueError:
+        names = value.split(",")
+    if isinstance(names, str):
+        names = [names]
+    return [name.strip() for name in names if isinstance(name, str) and name.strip()]
+
+
+def _severity_key(interaction: Dict):
+    rank = INTERACTION_SEVERITY_RANK.get((interaction["interaction_type"] or "").lower(), 0)
+    return (rank, interaction["severity_level"] or 0)
+
+
+class InteractionGraph:
+    """Undirected interaction graph compiled once per knowledge index
+
+    ``adjacency[a][b]`` holds the most severe recorded interaction between two
+    medications, so checking a list of n drugs costs n^2/2 dictionary lookups
+    and no queries.
+    """
+
+    def __init__(self, index: KnowledgeIndex):
+        self.medications = {m["id"]: m for m in index.medications}
+
+        # Generic and brand names -> medication id
+        self.name_index: Dict[str, str] = {}
+        for medication in index.medications:
+            self.name_index.setdefault(normalize_term(medication["generic_name"]), medication["id"])
+        for medication in index.medications:
+            for brand in _brand_names(medication["brand_names"]):
+                self.name_index.setdefault(normalize_term(brand), medication["id"])
+
+        self.adjacency: Dict[str, Dict[str, Dict]] = {}
+        for interaction in index.drug_interactions:
+            drug_a, drug_b = interaction["drug_a_id"], interaction["drug_b_id"]
+            if drug_a == drug_b or drug_a not in self.medications or drug_b not in self.medications:
+                continue
+            for source, target in ((drug_a, drug_b), (drug_b, drug_a)):
+                neighbours = self.adjacency.setdefault(source, {})
+                current = neighbours.get(target)
+                if current is None or _severity_key(interaction) > _severity_key(current):
+                    neighbours[target] = interaction
+
+    def resolve(self, medication_name: str) -> Optional[str]:
+        """Resolve a generic or brand name to a medication id"""
+        return self.name_index.get(normalize_term(medication_name))
+
+    def check(self, medication_names: Iterable[str]) -> Dict:
+        """Find every pairwise interaction within a medication list, most severe first"""
+        resolved: List[Dict] = []
+        unresolved: List[str] = []
+        seen = set()
+        for name in medication_names:
+            medication_id = self.resolve(name)
+            if medication_id is None:
+                unresolved.append(name)
+            elif medication_id not in seen:
+                seen.add(medication_id)
+                resolved.append({
+                    "input": name,
+                    "medication_id": medication_id,
+                    "generic_name": self.medications[medication_id]["generic_name"]
+                })
+
+        found = []
+        for first, second in combinations(resolved, 2):
+            interaction = self.adjacency.get(first["medication_id"], {}).get(second["medication_id"])
+            if interaction is not None:
+                found.append((interaction, first, second))
+        found.sort(key=lambda item: _severity_key(item[0]), reverse=True)
+
+        interactions = [
+            {
+                "drug_a": first["generic_name"],
+                "drug_b": second["generic_name"],
+                "interaction_type": interaction["interaction_type"],
+                "severity_level": interaction["severity_level"],
+                "mechanism": interaction["mechanism"],
+                "clinical_effect": interaction["clinical_effect"],
+                "management": interaction["management"],
+                "evidence_level": interaction["evidence_level"],
+                "onset": interaction["onset"],
+                "documentation": interaction["documentation"]
+            }
+            for interaction, first, second in found
+        ]
+        return {
+            "medications": resolved,
+            "unresolved_medications": unresolved,
+            "interactions": interactions,
+            "highest_severity": interactions[0]["interaction_type"] if interactions else None
+        }
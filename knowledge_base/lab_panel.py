@@ -0,0 +1,171 @@
+"""
+Lab Panel Interpreter
+Resolves lab marker names and classifies whole panels of results in one vectorised pass
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from knowledge_base.index import KnowledgeIndex
+from knowledge_base.resolver import normalize_term
+
+# Common clinical abbreviations -> canonical marker name (normalised)
+LAB_MARKER_ALIASES: Dict[str, str] = {
+    "hb": "hemoglobin",
+    "hgb": "hemoglobin",
+    "haemoglobin": "hemoglobin",
+    "wbc": "white blood cell count",
+    "white count": "white blood cell count",
+    "leukocytes": "white blood cell count",
+    "blood sugar": "glucose",
+    "blood glucose": "glucose",
+    "fasting glucose": "glucose",
+    "cholesterol": "cholesterol total",
+    "total cholesterol": "cholesterol total",
+    "systolic": "blood pressure systolic",
+    "systolic blood pressure": "blood pressure systolic",
+    "sbp": "blood pressure systolic",
+    "creat": "creatinine",
+    "cr": "creatinine",
+    "thyroid stimulating hormone": "tsh",
+    "a1c": "hba1c",
+    "hemoglobin a1c": "hba1c",
+}
+
+# (interpretation, status) in classification priority order, matching the single-marker rules
+_CLASSES = [
+    ("critically_low", "critical"),
+    ("critically_high", "critical"),
+    ("low", "abnormal"),
+    ("high", "abnormal"),
+]
+
+_ENTRY_SEPARATOR = re.compile(r"[\n;]+|,\s*(?=[A-Za-z])")
+_ENTRY_PATTERN = re.compile(
+    r"^\s*(?P<name>[A-Za-z][A-Za-z0-9 ()/%.\-]*?)\s*[:=]?\s*(?P<value>[-+]?\d+(?:,\d{3})*(?:\.\d+)?)"
+)
+
+
+def parse_lab_values(raw_data: str) -> List[Tuple[str, float]]:
+    """Parse manually entered results such as 'Hemoglobin: 13.2 g/dL; WBC 7,500' into (name, value) pairs"""
+    values = []
+    for entry in _ENTRY_SEPARATOR.split(raw_data or ""):
+        match = _ENTRY_PATTERN.match(entry)
+        if match:
+            values.append((match.group("name").strip(), float(match.group("value").replace(",", ""))))
+    return values
+
+
+class LabPanelInterpreter:
+    """Marker lookup tables and bound arrays compiled once per knowledge index
+
+    Unset (or zero) bounds are stored as NaN, so comparisons against them are
+    always false and that rule is skipped, as in the original per-marker checks.
+    """
+
+    def __init__(self, index: KnowledgeIndex):
+        if np is None:
+            raise RuntimeError("Lab panel interpretation requires numpy")
+
+        self.markers = index.lab_markers
+        self.positions: Dict[str, int] = {}
+        for position, marker in enumerate(self.markers):
+            self.positions.setdefault(normalize_term(marker["name"]), position)
+        for alias, name in LAB_MARKER_ALIASES.items():
+            if name in self.positions:
+                self.positions.setdefault(alias, self.positions[name])
+
+        def bounds(field):
+            return np.array([marker[field] or np.nan for marker in self.markers], dtype=np.float64)
+
+        self.critical_low = bounds("critical_low")
+        self.critical_high = bounds("critical_high")
+        self.normal_min = bounds("normal_range_min")
+        self.normal_max = bounds("normal_range_max")
+
+    def lookup(self, marker_name: str) -> Optional[int]:
+        """Resolve an exact marker name or alias (after normalisation) to its position"""
+        term = normalize_term(marker_name)
+        return self.positions.get(term) if term else None
+
+    def classify(self, positions, values):
+        """Classify values against their markers' bounds, returning (interpretation, status) arrays"""
+        positions = np.asarray(positions, dtype=np.intp)
+        values = np.asarray(values, dtype=np.float64)
+        conditions = [
+            values < self.critical_low[positions],
+            values > self.critical_high[positions],
+            values < self.normal_min[positions],
+            values > self.normal_max[positions],
+        ]
+        interpretations = np.select(conditions, [c[0] for c in _CLASSES], default="normal")
+        statuses = np.select(conditions, [c[1] for c in _CLASSES], default="within_range")
+        return interpretations, statuses
+
+    def _result(self, position: int, value: float, interpretation: str, status: str) -> Dict:
+        marker = self.markers[position]
+        return {
+            "marker_name": marker["name"],
+            "value": value,
+            "units": marker["units"],
+            "normal_range": f"{marker['normal_range_min']}-{marker['normal_range_max']}",
+            "interpretation": str(interpretation),
+            "status": str(status),
+            "clinical_significance": marker["clinical_significance"]
+        }
+
+    def interpret(self, marker_name: str, value: float) -> Optional[Dict]:
+        """Interpret a single result, or None when the marker is unknown"""
+        panel = self.interpret_panel([(marker_name, value)])
+        return panel["results"][0] if panel["results"] else None
+
+    def interpret_panel(self, results: Iterable[Tuple[str, float]]) -> Dict:
+        """Interpret a panel of (marker name, value) pairs
+
+        A marker reported more than once (e.g. as 'Hb' and 'Hemoglobin') is
+        interpreted from its first value; the later entries are listed in
+        ``duplicate_markers`` rather than silently replacing it.
+        """
+        resolved, unresolved, duplicates = [], [], []
+        seen = set()
+        for marker_name, value in results:
+            position = self.lookup(marker_name)
+            if position is None:
+                unresolved.append(marker_name)
+            elif position in seen:
+                duplicates.append(marker_name)
+            else:
+                seen.add(position)
+                resolved.append((position, float(value)))
+
+        interpreted = []
+        if resolved:
+            positions, values = zip(*resolved)
+            interpretations, statuses = self.classify(positions, values)
+            interpreted = [
+                self._result(position, value, interpretation, status)
+                for (position, value), interpretation, status in zip(resolved, interpretations, statuses)
+            ]
+
+        critical = [r["marker_name"] for r in interpreted if r["status"] == "critical"]
+        abnormal = [r["marker_name"] for r in interpreted if r["status"] == "abnormal"]
+        if critical:
+            overall_status = "critical"
+        elif abnormal:
+            overall_status = "abnormal"
+        else:
+            overall_status = "normal"
+
+        return {
+            "results": interpreted,
+            "unresolved_markers": unresolved,
+            "duplicate_markers": duplicates,
+            "overall_status": overall_status,
+            "critical_markers": critical,
+            "abnormal_markers": abnormal
+        }
@@ -3,7 +3,7 @@ Medical Knowledge Base Models
 Defines the structure for medical knowledge storage and relationships
 """
 
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, ForeignKey, Table, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -18,7 +18,9 @@ symptom_disease_association = Table(
     Column('symptom_id', String, ForeignKey('symptoms.id'), primary_key=True),
     Column('disease_id', String, ForeignKey('diseases.id'), primary_key=True),
     Column('probability_weight', Float, default=0.5),
-    Column('severity_modifier', Float, default=1.0)
+    Column('severity_modifier', Float, default=1.0),
+    # The primary key only serves symptom-first lookups
+    Index('ix_symptom_disease_mapping_disease_id', 'disease_id')
 )
 
 disease_treatment_association = Table(
@@ -107,7 +109,7 @@ class Treatment(Base):
     __tablename__ = "treatments"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True, index=True)
     type = Column(String)  # 'medication', 'procedure', 'lifestyle', 'therapy'
     description = Column(Text)
     indications = Column(Text)  # When to use
@@ -130,7 +132,7 @@ class Medication(Base):
     __tablename__ = "medications"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    generic_name = Column(String, nullable=False)
+    generic_name = Column(String, nullable=False, unique=True, index=True)
     brand_names = Column(Text)  # JSON string
     drug_class = Column(String)
     mechanism_of_action = Column(Text)
@@ -150,7 +152,7 @@ class LabMarker(Base):
     __tablename__ = "lab_markers"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True, index=True)
     test_type = Column(String)  # 'blood', 'urine', 'stool', 'csf', etc.
     units = Column(String)  # mg/dL, mmol/L, etc.
     normal_range_min = Column(Float)
@@ -161,7 +163,7 @@ class LabMarker(Base):
     age_dependent = Column(Boolean, default=False)
     gender_dependent = Column(Boolean, default=False)
     clinical_significance = Column(Text)
-    disease_id = Column(String, ForeignKey("diseases.id"))
+    disease_id = Column(String, ForeignKey("diseases.id"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -213,6 +215,11 @@ class DrugInteraction(Base):
     onset = Column(String)  # 'rapid', 'delayed'
     documentation = Column(String)  # 'excellent', 'good', 'fair', 'poor'
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # One row per ordered pair; the bulk loader upserts on it
+    __table_args__ = (
+        Index("uq_drug_interactions_pair", "drug_a_id", "drug_b_id", unique=True),
+    )
 
 class ClinicalTrial(Base):
     """Clinical trials and research data"""
@@ -246,6 +253,11 @@ class DifferentialDiagnosis(Base):
     key_differences = Column(Text)  # What sets them apart
     diagnostic_tests = Column(Text)  # Tests to differentiate
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Serves "differentials of X, most similar first" without a sort
+    __table_args__ = (
+        Index("ix_differential_diagnoses_primary_similarity", "primary_disease_id", "similarity_score"),
+    )
 
 class MedicalProcedure(Base):
     """Medical procedures and diagnostic tests"""
@@ -325,13 +337,28 @@ class SymptomCluster(Base):
     __tablename__ = "symptom_clusters"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True, index=True)
     description = Column(Text)
     category = Column(String)  # 'syndrome', 'constellation', 'pattern'
     clinical_significance = Column(Text)
     urgency_level = Column(String)  # 'emergency', 'urgent', 'routine'
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class TermSynonym(Base):
+    """Lay terms and alternative names chat extraction maps onto canonical entities"""
+    __tablename__ = "term_synonyms"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    synonym = Column(String, nullable=False)  # e.g. 'throwing up'
+    kind = Column(String, nullable=False)  # 'symptom', 'medication', 'disease'
+    canonical_name = Column(String, nullable=False)  # Symptom.name, Medication.generic_name or Disease.name
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("uq_term_synonyms_synonym_kind", "synonym", "kind", unique=True),
+    )
+
 # Association table for symptom clusters
 symptom_cluster_association = Table(
     'symptom_cluster_mapping',
@@ -0,0 +1,87 @@
+"""
+Knowledge Base Pagination
+Opaque keyset cursors and NDJSON streaming for knowledge base listings
+"""
+
+import base64
+import json
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from knowledge_base.cache import json_default
+
+# fetch_page(cursor, limit) -> (items, cursor of the next page or None)
+PageFetcher = Callable[[Optional[str], int], Tuple[List[Dict], Optional[str]]]
+
+
+def encode_cursor(kind: str, *key) -> str:
+    """Encode the sort key of the last item on a page; ``kind`` names the ordering it belongs to"""
+    payload = json.dumps([kind, *key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> List:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        decoded = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(decoded, list) or not decoded:
+        raise ValueError("Invalid pagination cursor")
+    return decoded
+
+
+def cursor_kind(cursor: Optional[str]) -> Optional[str]:
+    """The ordering a cursor was issued under, or None when there is none (raises ValueError when malformed)"""
+    return _decode(cursor)[0] if cursor else None
+
+
+def decode_cursor(cursor: Optional[str], kind: str, arity: int) -> Optional[Tuple]:
+    """Decode a cursor produced by encode_cursor, or None when there is none
+
+    Raises ValueError for malformed cursors and for cursors issued under a
+    different ordering (e.g. FTS relevance vs. name order).
+    """
+    if not cursor:
+        return None
+    decoded = _decode(cursor)
+    if len(decoded) != arity + 1 or decoded[0] != kind:
+        raise ValueError("Pagination cursor does not belong to this listing")
+    return tuple(decoded[1:])
+
+
+def keyset_page(rows: Sequence, limit: Optional[int], item: Callable, key: Callable,
+                kind: str) -> Tuple[List[Dict], Optional[str]]:
+    """Turn up to ``limit + 1`` fetched rows into a page and the cursor of the next one
+
+    The extra row only signals that another page exists; it is not returned.
+    Without a limit every row is one final page.
+    """
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(kind, *key(rows[-1])) if has_more and rows else None
+    return [item(row) for row in rows], next_cursor
+
+
+def iter_ndjson(fetch_page: PageFetcher, cursor: Optional[str] = None, limit: Optional[int] = None,
+                batch_size: int = 200, first_page: Optional[Tuple[List[Dict], Optional[str]]] = None) -> Iterator[str]:
+    """Stream every item after ``cursor`` as NDJSON, fetching ``batch_size`` at a time
+
+    Each batch is its own short query, so memory stays flat however large
+    the listing is. When ``limit`` stops the stream early, a final
+    ``{"next_cursor": ...}`` line tells the client where to resume. Callers
+    may pass an already fetched ``first_page`` of ``min(batch_size, limit)`` items.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        if first_page is not None:
+            (items, cursor), first_page = first_page, None
+        else:
+            items, cursor = fetch_page(cursor, size)
+        for item in items:
+            yield json.dumps(item, default=json_default) + "\n"
+        if cursor is None:
+            return
+        if remaining is not None:
+            remaining -= len(items)
+    yield json.dumps({"next_cursor": cursor}) + "\n"
@@ -17,31 +17,39 @@ from sqlalchemy.orm import Session
 from sqlalchemy import create_engine
 from knowledge_base.models import (
     Symptom, Disease, Treatment, Medication, LabMarker, MedicalGuideline, 
-    MedicalKnowledgeSource, MedicalSpecialty, DrugInteraction, symptom_disease_association
+    MedicalKnowledgeSource, MedicalSpecialty, DrugInteraction, SymptomCluster, TermSynonym,
+    symptom_disease_association, symptom_cluster_association
 )
+from knowledge_base.fts import create_fts_tables
+from knowledge_base.index import load_knowledge_index
+from knowledge_base.semantic import build_semantic_index
+from knowledge_base.snapshot import write_snapshot
+from knowledge_base.bulk_load import upsert_rows
 
 try:
     from config import settings
 except ImportError:
     class Settings:
         DATABASE_URL = "sqlite:///./mayberry_medical.db"
+        KB_SEMANTIC_INDEX_PATH = None
+        KB_SNAPSHOT_PATH = None
     settings = Settings()
 
 def populate_specialties(db: Session):
     """Populate medical specialties"""
     specialties = [
-        MedicalSpecialty(name="Cardiology", description="Heart and cardiovascular system"),
-        MedicalSpecialty(name="Dermatology", description="Skin, hair, and nails"),
-        MedicalSpecialty(name="Endocrinology", description="Hormones and endocrine system"),
-        MedicalSpecialty(name="Gastroenterology", description="Digestive system"),
-        MedicalSpecialty(name="Neurology", description="Nervous system"),
-        MedicalSpecialty(name="Orthopedics", description="Bones, joints, and muscles"),
-        MedicalSpecialty(name="Pulmonology", description="Respiratory system"),
-        MedicalSpecialty(name="Psychiatry", description="Mental health"),
-        MedicalSpecialty(name="Emergency Medicine", description="Emergency and critical care"),
-        MedicalSpecialty(name="Internal Medicine", description="General internal medicine")
+        dict(name="Cardiology", description="Heart and cardiovascular system"),
+        dict(name="Dermatology", description="Skin, hair, and nails"),
+        dict(name="Endocrinology", description="Hormones and endocrine system"),
+        dict(name="Gastroenterology", description="Digestive system"),
+        dict(name="Neurology", description="Nervous system"),
+        dict(name="Orthopedics", description="Bones, joints, and muscles"),
+        dict(name="Pulmonology", description="Respiratory system"),
+        dict(name="Psychiatry", description="Mental health"),
+        dict(name="Emergency Medicine", description="Emergency and critical care"),
+        dict(name="Internal Medicine", description="General internal medicine")
     ]
-    db.bulk_save_objects(specialties)
+    upsert_rows(db.connection(), MedicalSpecialty.__table__, specialties, ["name"])
     db.commit()
     return {spec.name: spec.id for spec in db.query(MedicalSpecialty).all()}
 
@@ -97,7 +105,7 @@ def populate_comprehensive_symptoms(db: Session):
     
     symptoms = []
     for name, description, category, body_system, is_emergency, prevalence in symptoms_data:
-        symptom = Symptom(
+        symptom = dict(
             name=name,
             description=description,
             category=category,
@@ -108,7 +116,7 @@ def populate_comprehensive_symptoms(db: Session):
         )
         symptoms.append(symptom)
     
-    db.bulk_save_objects(symptoms)
+    upsert_rows(db.connection(), Symptom.__table__, symptoms, ["name"])
     db.commit()
 
 def populate_comprehensive_diseases(db: Session, specialty_ids: dict):
@@ -211,7 +219,7 @@ def populate_comprehensive_diseases(db: Session, specialty_ids: dict):
         else:
             specialty_id = specialty_ids.get("Internal Medicine")
         
-        disease = Disease(
+        disease = dict(
             name=name,
             icd_10_code=icd_code,
             description=description,
@@ -230,7 +238,7 @@ def populate_comprehensive_diseases(db: Session, specialty_ids: dict):
         )
         diseases.append(disease)
     
-    db.bulk_save_objects(diseases)
+    upsert_rows(db.connection(), Disease.__table__, diseases, ["name"])
     db.commit()
 
 def populate_medications(db: Session):
@@ -281,7 +289,7 @@ def populate_medications(db: Session):
     for (generic, brands, drug_class, mechanism, indications, 
          contraindications, side_effects, forms, pregnancy) in medications_data:
         
-        medication = Medication(
+        medication = dict(
             generic_name=generic,
             brand_names=brands,
             drug_class=drug_class,
@@ -294,7 +302,7 @@ def populate_medications(db: Session):
         )
         medications.append(medication)
     
-    db.bulk_save_objects(medications)
+    upsert_rows(db.connection(), Medication.__table__, medications, ["generic_name"])
     db.commit()
 
 def populate_lab_markers(db: Session):
@@ -332,7 +340,7 @@ def populate_lab_markers(db: Session):
     for (name, test_type, units, range_min, range_max, range_text, 
          crit_low, crit_high, age_dep, gender_dep, significance, disease_id) in lab_markers_data:
         
-        marker = LabMarker(
+        marker = dict(
             name=name,
             test_type=test_type,
             units=units,
@@ -348,7 +356,7 @@ def populate_lab_markers(db: Session):
         )
         lab_markers.append(marker)
     
-    db.bulk_save_objects(lab_markers)
+    upsert_rows(db.connection(), LabMarker.__table__, lab_markers, ["name"])
     db.commit()
 
 def create_symptom_disease_associations(db: Session):
@@ -397,22 +405,72 @@ def create_symptom_disease_associations(db: Session):
     ]
     
     # Create the associations
+    rows = []
     for disease_name, symptom_list in associations:
         disease_id = diseases.get(disease_name)
         if disease_id:
             for symptom_name, weight in symptom_list:
                 symptom_id = symptoms.get(symptom_name)
                 if symptom_id:
-                    # Insert into association table
-                    db.execute(
-                        symptom_disease_association.insert().values(
-                            symptom_id=symptom_id,
-                            disease_id=disease_id,
-                            probability_weight=weight,
-                            severity_modifier=1.0
-                        )
-                    )
+                    rows.append(dict(
+                        symptom_id=symptom_id,
+                        disease_id=disease_id,
+                        probability_weight=weight,
+                        severity_modifier=1.0
+                    ))
     
+    upsert_rows(db.connection(), symptom_disease_association, rows, ["symptom_id", "disease_id"])
+    db.commit()
+
+def populate_symptom_clusters(db: Session):
+    """Populate symptom clusters (syndromes) and their member symptoms"""
+    symptoms = {s.name: s.id for s in db.query(Symptom).all()}
+
+    # (name, category, urgency, significance, [(symptom, frequency_in_cluster, diagnostic_weight)])
+    clusters_data = [
+        ("Acute Coronary Syndrome Pattern", "syndrome", "emergency",
+         "Possible heart attack or unstable angina",
+         [("Chest Pain", 0.9, 2.0), ("Shortness of Breath", 0.7, 1.0), ("Nausea", 0.5, 0.5),
+          ("Dizziness", 0.4, 0.5), ("Fainting", 0.2, 0.5)]),
+        ("Neurological Warning Signs", "constellation", "emergency",
+         "Possible stroke, seizure disorder or other acute neurological event",
+         [("Confusion", 0.7, 1.5), ("Numbness", 0.7, 1.5), ("Dizziness", 0.5, 0.5),
+          ("Headache", 0.5, 0.5), ("Seizures", 0.3, 1.0)]),
+        ("Lower Respiratory Infection Pattern", "pattern", "urgent",
+         "Possible pneumonia or bronchitis",
+         [("Fever", 0.85, 1.0), ("Cough", 0.9, 1.0), ("Shortness of Breath", 0.7, 1.5), ("Chest Pain", 0.5, 0.5)]),
+        ("Constitutional Symptoms", "constellation", "urgent",
+         "B symptoms that may indicate chronic infection or malignancy",
+         [("Fever", 0.6, 1.0), ("Night Sweats", 0.7, 1.5), ("Weight Loss", 0.7, 1.5), ("Fatigue", 0.6, 0.5)]),
+        ("Influenza-like Illness", "syndrome", "routine",
+         "Typical of viral respiratory infections",
+         [("Fever", 0.9, 1.5), ("Cough", 0.8, 1.0), ("Muscle Pain", 0.7, 1.0), ("Fatigue", 0.8, 0.5),
+          ("Headache", 0.6, 0.5), ("Chills", 0.6, 0.5)]),
+        ("Gastroenteritis Pattern", "syndrome", "routine",
+         "Typical of viral or food-borne gastrointestinal infections",
+         [("Nausea", 0.8, 1.0), ("Vomiting", 0.7, 1.0), ("Diarrhea", 0.8, 1.5), ("Abdominal Pain", 0.7, 1.0)]),
+    ]
+
+    clusters = [
+        dict(name=name, category=category, urgency_level=urgency, clinical_significance=significance)
+        for name, category, urgency, significance, _ in clusters_data
+    ]
+    upsert_rows(db.connection(), SymptomCluster.__table__, clusters, ["name"])
+    cluster_ids = dict(db.query(SymptomCluster.name, SymptomCluster.id).all())
+
+    members_rows = []
+    for name, _, _, _, members in clusters_data:
+        for symptom_name, frequency, weight in members:
+            symptom_id = symptoms.get(symptom_name)
+            if symptom_id:
+                members_rows.append(dict(
+                    cluster_id=cluster_ids[name],
+                    symptom_id=symptom_id,
+                    frequency_in_cluster=frequency,
+                    diagnostic_weight=weight
+                ))
+    upsert_rows(db.connection(), symptom_cluster_association, members_rows, ["cluster_id", "symptom_id"])
+
     db.commit()
 
 def populate_drug_interactions(db: Session):
@@ -423,14 +481,17 @@ def populate_drug_interactions(db: Session):
         # Add more interactions
     ]
 
+    # Resolve every medication id with one query instead of two per interaction
+    medication_ids = dict(db.query(Medication.generic_name, Medication.id).all())
+
     interactions = []
     for (generic_a, generic_b, type, severity, mechanism, effect, management, evidence, onset, documentation) in interactions_data:
-        drug_a = db.query(Medication).filter_by(generic_name=generic_a).first()
-        drug_b = db.query(Medication).filter_by(generic_name=generic_b).first()
-        if drug_a and drug_b:
-            interaction = DrugInteraction(
-                drug_a_id=drug_a.id,
-                drug_b_id=drug_b.id,
+        drug_a_id = medication_ids.get(generic_a)
+        drug_b_id = medication_ids.get(generic_b)
+        if drug_a_id and drug_b_id:
+            interaction = dict(
+                drug_a_id=drug_a_id,
+                drug_b_id=drug_b_id,
                 interaction_type=type,
                 severity_level=severity,
                 mechanism=mechanism,
@@ -441,17 +502,55 @@ def populate_drug_interactions(db: Session):
                 documentation=documentation
             )
             interactions.append(interaction)
-    db.bulk_save_objects(interactions)
+    upsert_rows(db.connection(), DrugInteraction.__table__, interactions, ["drug_a_id", "drug_b_id"])
+    db.commit()
+
+def populate_term_synonyms(db: Session):
+    """Populate lay terms chat extraction maps onto knowledge base names"""
+    # (synonym, kind, canonical name)
+    synonyms_data = [
+        ("throwing up", "symptom", "Vomiting"),
+        ("threw up", "symptom", "Vomiting"),
+        ("short of breath", "symptom", "Shortness of Breath"),
+        ("breathless", "symptom", "Shortness of Breath"),
+        ("lightheaded", "symptom", "Dizziness"),
+        ("tired", "symptom", "Fatigue"),
+        ("exhausted", "symptom", "Fatigue"),
+        ("passed out", "symptom", "Fainting"),
+        ("stomach ache", "symptom", "Abdominal Pain"),
+        ("tummy ache", "symptom", "Abdominal Pain"),
+        ("racing heart", "symptom", "Heart Palpitations"),
+        ("paracetamol", "medication", "Acetaminophen"),
+        ("albuterol inhaler", "medication", "Albuterol"),
+        ("salbutamol", "medication", "Albuterol"),
+        ("flu", "disease", "Influenza"),
+        ("high blood pressure", "disease", "Hypertension"),
+        ("acid reflux", "disease", "Gastroesophageal Reflux Disease"),
+        ("heartburn", "disease", "Gastroesophageal Reflux Disease"),
+        ("GERD", "disease", "Gastroesophageal Reflux Disease"),
+        ("IBS", "disease", "Irritable Bowel Syndrome"),
+        ("diabetes", "disease", "Type 2 Diabetes"),
+        ("underactive thyroid", "disease", "Hypothyroidism"),
+    ]
+    rows = [dict(synonym=synonym, kind=kind, canonical_name=canonical) for synonym, kind, canonical in synonyms_data]
+    upsert_rows(db.connection(), TermSynonym.__table__, rows, ["synonym", "kind"])
     db.commit()
 
 # Define `populate_clinical_trials`, `populate_risk_factors`, `populate_preventive_measures`, and other functions as needed.
 
 def run_comprehensive_population():
-    """Main function to populate comprehensive medical data"""
+    """Main function to populate comprehensive medical data
+    
+    Every step upserts on natural keys, so running it again updates the
+    existing rows instead of duplicating them.
+    """
     engine = create_engine(settings.DATABASE_URL)
     from sqlalchemy.orm import sessionmaker
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+    # Create the FTS triggers first so every inserted row is indexed for search
+    create_fts_tables(engine)
+
     db = SessionLocal()
     try:
         print("🏥 Starting comprehensive medical data population...")
@@ -479,6 +578,22 @@ def run_comprehensive_population():
         print("🔗 Creating symptom-disease associations...")
         create_symptom_disease_associations(db)
 
+        print("🧩 Populating symptom clusters...")
+        populate_symptom_clusters(db)
+
+        print("🗣️ Populating term synonyms...")
+        populate_term_synonyms(db)
+
+        index = load_knowledge_index(db)
+        print("🧠 Building semantic search index...")
+        semantic_index = build_semantic_index(db, index, settings.KB_SEMANTIC_INDEX_PATH)
+        print(f"   Indexed {len(semantic_index.ids)} documents")
+
+        if settings.KB_SNAPSHOT_PATH:
+            # Running API workers watch the snapshot and hot-swap to the new data
+            print("📦 Writing knowledge base snapshot...")
+            write_snapshot(index, settings.KB_SNAPSHOT_PATH)
+
         print("✅ Comprehensive medical data population completed!")
         print("📊 Database now contains extensive medical knowledge comparable to major platforms")
 
@@ -0,0 +1,190 @@
+"""
+Symptom Name Resolver
+Maps free-text symptom strings to canonical knowledge-base symptom ids
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from knowledge_base.index import KnowledgeIndex
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+# Separators between symptoms in one phrase, e.g. "nausea and vomiting", "fever, chills"
+_CONJUNCTIONS = re.compile(r"\s*(?:[,;/&+]|\band\b|\bor\b|\bwith\b|\bplus\b)\s*")
+# Leading words that deny a symptom rather than report it ("no fever", "without chest pain")
+NEGATIONS = ("no", "not", "without", "denies", "denied", "never", "negative for", "absence of", "free of")
+# Words ignored when comparing the words of a phrase with a symptom name
+_FILLER_WORDS = {"of", "in", "the", "a", "an", "on", "at", "to", "my"}
+
+
+def normalize_term(term: str) -> str:
+    """Lowercase and collapse punctuation/whitespace, e.g. 'Shortness-of-Breath' -> 'shortness of breath'"""
+    return _NON_ALNUM.sub(" ", term.lower()).strip()
+
+
+def is_negated(term: str) -> bool:
+    """Whether a normalised term denies the symptom it names"""
+    return any(term == negation or term.startswith(negation + " ") for negation in NEGATIONS)
+
+
+def _content_words(term: str) -> Set[str]:
+    return {word for word in term.split() if word not in _FILLER_WORDS}
+
+
+def _trigrams(term: str) -> Set[str]:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _deletes(term: str, max_distance: int) -> Set[str]:
+    """All strings reachable from term by removing up to max_distance characters"""
+    results = {term}
+    frontier = {term}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for word in frontier:
+            if len(word) <= 1:
+                continue
+            for i in range(len(word)):
+                next_frontier.add(word[:i] + word[i + 1:])
+        results |= next_frontier
+        frontier = next_frontier
+    return results
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance, returning max_distance + 1 once exceeded"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymptomResolver:
+    """In-process resolver built once from the symptom vocabulary
+
+    Resolution tries, in order: an exact match on the normalised name (also
+    ignoring spaces, so 'head ache' finds 'Headache'), deletion-based spelling
+    correction in the style of SymSpell, and trigram similarity for
+    reordered phrases. Fuzzy matches never add or drop a word: 'chest' does
+    not resolve to Chest Pain, nor 'pain' to Back Pain. Negated terms
+    ('no fever') resolve to nothing.
+    """
+
+    def __init__(self, index: KnowledgeIndex, max_edit_distance: int = 2,
+                 prefix_length: int = 7, min_similarity: float = 0.75):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.min_similarity = min_similarity
+
+        self.exact: Dict[str, str] = {}
+        self.compact_terms: Dict[str, str] = {}
+        self.deletes: Dict[str, Set[str]] = {}
+        self.trigram_postings: Dict[str, Set[str]] = {}
+        self.term_trigrams: Dict[str, Set[str]] = {}
+        self.names: Dict[str, str] = {}
+
+        for symptom_id, symptom in index.symptoms.items():
+            term = normalize_term(symptom["name"])
+            if not term:
+                continue
+            compact = term.replace(" ", "")
+            self.exact[term] = symptom_id
+            self.names[symptom_id] = term
+            self.compact_terms[compact] = symptom_id
+
+            for variant in _deletes(compact[:prefix_length], max_edit_distance):
+                self.deletes.setdefault(variant, set()).add(compact)
+
+            grams = _trigrams(term)
+            self.term_trigrams[symptom_id] = grams
+            for gram in grams:
+                self.trigram_postings.setdefault(gram, set()).add(symptom_id)
+
+    def resolve(self, text: str) -> Optional[str]:
+        """Resolve one free-text symptom to a symptom id, or None if nothing is close enough"""
+        term = normalize_term(text)
+        if not term or is_negated(term):
+            return None
+        compact = term.replace(" ", "")
+
+        symptom_id = self.exact.get(term) or self.compact_terms.get(compact)
+        if symptom_id:
+            return symptom_id
+
+        return self._spelling_match(compact) or self._trigram_match(term)
+
+    def resolve_many(self, texts: Iterable[str]) -> List[Optional[str]]:
+        """Resolve each input string, preserving order"""
+        return [self.resolve(text) for text in texts]
+
+    def split_phrase(self, text: str) -> List[str]:
+        """Split a phrase naming several symptoms into one term per symptom, dropping negated ones
+
+        A phrase that is itself a symptom name is kept whole.
+        """
+        term = normalize_term(text)
+        if term in self.exact or term.replace(" ", "") in self.compact_terms:
+            return [text.strip()]
+        parts = [part.strip() for part in _CONJUNCTIONS.split(text.lower()) if normalize_term(part)]
+        return [part for part in parts if not is_negated(normalize_term(part))]
+
+    def resolve_phrases(self, texts: Iterable[str]) -> Tuple[List[str], List[Optional[str]]]:
+        """Split every phrase into symptom terms and resolve each term
+
+        Returns the terms and their ids (None when unresolved), aligned.
+        """
+        terms = [term for text in texts for term in self.split_phrase(text)]
+        return terms, self.resolve_many(terms)
+
+    def _max_distance(self, compact: str) -> int:
+        # Short words are only an edit or two away from unrelated words, so they get fewer edits
+        if len(compact) < 4:
+            return 0
+        return min(self.max_edit_distance, 1 if len(compact) < 8 else 2)
+
+    def _spelling_match(self, compact: str) -> Optional[str]:
+        max_distance = self._max_distance(compact)
+        if max_distance == 0:
+            return None
+        candidates: Set[str] = set()
+        for variant in _deletes(compact[:self.prefix_length], self.max_edit_distance):
+            candidates |= self.deletes.get(variant, set())
+
+        best_term, best_distance = None, max_distance + 1
+        for candidate in sorted(candidates):
+            distance = edit_distance(compact, candidate, max_distance)
+            if distance < best_distance:
+                best_term, best_distance = candidate, distance
+        return self.compact_terms[best_term] if best_term else None
+
+    def _trigram_match(self, term: str) -> Optional[str]:
+        grams = _trigrams(term)
+        overlaps: Dict[str, int] = {}
+        for gram in grams:
+            for symptom_id in self.trigram_postings.get(gram, ()):
+                overlaps[symptom_id] = overlaps.get(symptom_id, 0) + 1
+
+        words = len(_content_words(term))
+        best_id, best_similarity = None, self.min_similarity
+        for symptom_id, overlap in overlaps.items():
+            # Reordering only: a partial phrase must not pick up (or lose) a word
+            if len(_content_words(self.names[symptom_id])) != words:
+                continue
+            # Dice coefficient over trigram sets
+            similarity = 2.0 * overlap / (len(grams) + len(self.term_trigrams[symptom_id]))
+            if similarity > best_similarity or (similarity == best_similarity and best_id is None):
+                best_id, best_similarity = symptom_id, similarity
+        return best_id
@@ -0,0 +1,331 @@
+"""
+Disease Scoring Engines
+Selectable strategies for ranking diseases against a set of symptoms
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+from knowledge_base.index import KnowledgeIndex
+
+# (disease_id, match_score, matching_symptoms)
+ScoredDisease = Tuple[str, float, int]
+
+
+def _mapped_matrix(rows, value_name: str, shape):
+    """CSR matrix over a snapshot's CompressedRows; data, indices and indptr stay views onto the mapping"""
+    return sparse.csr_matrix((rows.values[value_name], rows.indices, rows.indptr), shape=shape, copy=False)
+
+
+class RatioScorer:
+    """Scores a disease by the fraction of the reported symptoms it presents with"""
+
+    name = "ratio"
+    # Result field the score is reported in; risk levels are read from match_score
+    score_field = "match_score"
+
+    def __init__(self, index: KnowledgeIndex):
+        self.index = index
+
+    def score(self, symptom_ids: List[str], total_symptoms: int,
+              limit: Optional[int] = None, **demographics) -> List[ScoredDisease]:
+        matches = self.index.count_matching_symptoms(symptom_ids)
+        position = self.index.disease_position
+        ranked = sorted(matches.items(), key=lambda item: (-item[1], position[item[0]]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [
+            (disease_id, matching / total_symptoms, matching)
+            for disease_id, matching in ranked
+        ]
+
+    def score_many(self, queries: List[Dict], limit: Optional[int] = None) -> List[List[ScoredDisease]]:
+        """Score several queries, each a dict with symptom_ids, total_symptoms and demographics"""
+        return [
+            self.score(query["symptom_ids"], query["total_symptoms"], limit=limit,
+                       age=query.get("age"), gender=query.get("gender"))
+            for query in queries
+        ]
+
+
+class WeightedScorer:
+    """Scores diseases with one sparse matrix-vector product over association weights
+
+    Each association contributes ``probability_weight * severity_modifier``; the
+    sum over the reported symptoms is divided by the number of reported symptoms
+    so the score stays comparable with the ratio scorer (capped at 1.0).
+    """
+
+    name = "weighted"
+    score_field = "match_score"
+
+    def __init__(self, index: KnowledgeIndex):
+        if np is None or sparse is None:
+            raise RuntimeError("The weighted scorer requires numpy and scipy")
+
+        self.index = index
+        shape = (len(index.disease_order), len(index.symptom_order))
+        if index.association_rows is not None:
+            # Snapshot-backed index: the matrices share the mapped arrays instead of copying them
+            self.weights = _mapped_matrix(index.association_rows, "combined_weight", shape)
+            self.presence = sparse.csr_matrix(
+                (np.ones(len(index.association_rows), dtype=np.float64),
+                 index.association_rows.indices, index.association_rows.indptr), shape=shape, copy=False
+            )
+            return
+
+        rows, cols, weights = [], [], []
+        for symptom_id, disease_id, weight, modifier in index.associations:
+            row = index.disease_position.get(disease_id)
+            col = index.symptom_position.get(symptom_id)
+            if row is None or col is None:
+                continue
+            rows.append(row)
+            cols.append(col)
+            weights.append(weight * modifier)
+
+        self.weights = sparse.csr_matrix(
+            (np.asarray(weights, dtype=np.float64), (rows, cols)), shape=shape
+        )
+        self.presence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=shape
+        )
+        self.presence.data[:] = 1.0
+
+    def query_vector(self, symptom_ids: List[str]):
+        vector = np.zeros(self.weights.shape[1], dtype=np.float64)
+        for symptom_id in symptom_ids:
+            position = self.index.symptom_position.get(symptom_id)
+            if position is not None:
+                vector[position] = 1.0
+        return vector
+
+    def query_matrix(self, queries: List[Dict]):
+        """Stack the queries' symptom sets into a sparse (queries x symptoms) indicator matrix"""
+        rows, cols = [], []
+        for row, query in enumerate(queries):
+            for symptom_id in query["symptom_ids"]:
+                position = self.index.symptom_position.get(symptom_id)
+                if position is not None:
+                    rows.append(row)
+                    cols.append(position)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+            shape=(len(queries), self.weights.shape[1])
+        )
+
+    def score(self, symptom_ids: List[str], total_symptoms: int,
+              limit: Optional[int] = None, **demographics) -> List[ScoredDisease]:
+        query = self.query_vector(symptom_ids)
+        scores = self.weights @ query
+        counts = self.presence @ query
+        candidates = np.flatnonzero(counts > 0)
+        return self._rank(candidates, scores[candidates] / total_symptoms, counts[candidates], limit)
+
+    def score_many(self, queries: List[Dict], limit: Optional[int] = None) -> List[List[ScoredDisease]]:
+        """Score a batch of queries with one sparse matrix-matrix product
+
+        The product stays sparse (queries x candidate diseases), so memory grows
+        with the number of matches rather than with the size of the knowledge base.
+        """
+        if not queries:
+            return []
+        matrix = self.query_matrix(queries)
+        scores = (matrix @ self.weights.T).tocsr()
+        counts = (matrix @ self.presence.T).tocsr()
+        scores.sort_indices()
+        counts.sort_indices()
+
+        results = []
+        for row, query in enumerate(queries):
+            start, end = counts.indptr[row], counts.indptr[row + 1]
+            candidates = counts.indices[start:end]
+            row_counts = counts.data[start:end]
+            row_scores = self._row_values(scores, row, candidates)
+            results.append(self._rank(candidates, row_scores / query["total_symptoms"], row_counts, limit))
+        return results
+
+    @staticmethod
+    def _row_values(matrix, row: int, columns):
+        """Values of one CSR row at the given (sorted) columns, zero where absent"""
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        values = np.zeros(len(columns), dtype=np.float64)
+        positions = np.searchsorted(matrix.indices[start:end], columns)
+        present = positions < end - start
+        present[present] = matrix.indices[start:end][positions[present]] == columns[present]
+        values[present] = matrix.data[start:end][positions[present]]
+        return values
+
+    def _rank(self, candidates, scores, counts, limit: Optional[int]) -> List[ScoredDisease]:
+        """Order candidate diseases by score, breaking ties by knowledge base order"""
+        if candidates.size == 0:
+            return []
+
+        # Select the top-k candidates without sorting the whole score vector
+        if limit is not None and limit < candidates.size:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores, counts = candidates[top], scores[top], counts[top]
+        order = np.lexsort((candidates, -scores))
+
+        disease_order = self.index.disease_order
+        return [
+            (disease_order[candidates[i]], float(min(scores[i], 1.0)), int(counts[i]))
+            for i in order
+        ]
+
+
+def age_group(age: Optional[int]) -> Optional[str]:
+    """Bucket an age into the values used by Disease.age_group_affected"""
+    if age is None:
+        return None
+    if age < 18:
+        return "children"
+    if age < 65:
+        return "adults"
+    return "elderly"
+
+
+class BayesScorer(WeightedScorer):
+    """Log-space naive Bayes over prevalence priors, demographics and symptom likelihoods
+
+    ``log P(d | symptoms) = log prior(d) + log demographic modifier(d)
+    + sum log P(s | d)``, with ``P(s | d)`` taken from ``probability_weight``
+    and a small leak probability for symptoms the disease is not associated
+    with. Priors and demographic modifiers are precomputed per (age group,
+    gender), so a query is one sparse product plus one dense addition. Scores
+    are posteriors normalised over every disease in the knowledge base; they
+    are reported as ``posterior``, since a likely disease is not necessarily
+    a strong symptom match, and ``match_score`` keeps the matched fraction.
+    """
+
+    name = "bayes"
+    score_field = "posterior"
+
+    leak_probability = 0.02
+    default_prevalence = 0.01
+    # Modifier when a disease's population does not include the patient
+    age_mismatch = {"children": 0.3, "adults": 0.3, "elderly": 0.3}
+    # Adult-onset diseases remain plausible, if less so, in the elderly
+    age_partial = {("adults", "elderly"): 0.8, ("elderly", "adults"): 0.5}
+    gender_match = 1.5
+    gender_mismatch = 0.3
+
+    def __init__(self, index: KnowledgeIndex):
+        super().__init__(index)
+        diseases = [index.diseases[disease_id] for disease_id in index.disease_order]
+
+        prevalence = np.array(
+            [d["prevalence"] if d["prevalence"] else self.default_prevalence for d in diseases], dtype=np.float64
+        )
+        self.log_prior = np.log(np.clip(prevalence, 1e-6, 1.0))
+
+        groups = [(d.get("age_group_affected") or "all").lower() for d in diseases]
+        self.age_log_modifiers = {None: np.zeros(len(diseases))}
+        for patient_group in ("children", "adults", "elderly"):
+            self.age_log_modifiers[patient_group] = np.log(np.array([
+                1.0 if group in ("all", patient_group)
+                else self.age_partial.get((group, patient_group), self.age_mismatch[patient_group])
+                for group in groups
+            ]))
+
+        biases = [(d.get("gender_bias") or "none").lower() for d in diseases]
+        self.gender_log_modifiers = {None: np.zeros(len(diseases))}
+        for gender in ("male", "female"):
+            self.gender_log_modifiers[gender] = np.log(np.array([
+                1.0 if bias not in ("male", "female")
+                else self.gender_match if bias == gender else self.gender_mismatch
+                for bias in biases
+            ]))
+
+        # Per-association log-likelihood gain over the leak probability
+        self.log_leak = np.log(self.leak_probability)
+        self.log_likelihood = self._probability_matrix()
+        self.log_likelihood.data = np.log(np.clip(self.log_likelihood.data, self.leak_probability, 1.0)) - self.log_leak
+        self._log_bases: Dict[Tuple, "np.ndarray"] = {}
+
+    def _probability_matrix(self):
+        """(diseases x symptoms) CSR matrix of probability_weight"""
+        if self.index.association_rows is not None:
+            return _mapped_matrix(self.index.association_rows, "probability_weight", self.presence.shape)
+        rows, cols, values = [], [], []
+        for symptom_id, disease_id, weight, _modifier in self.index.associations:
+            row = self.index.disease_position.get(disease_id)
+            col = self.index.symptom_position.get(symptom_id)
+            if row is None or col is None:
+                continue
+            rows.append(row)
+            cols.append(col)
+            values.append(weight)
+        return sparse.csr_matrix((np.asarray(values, dtype=np.float64), (rows, cols)), shape=self.presence.shape)
+
+    def log_base(self, age: Optional[int] = None, gender: Optional[str] = None):
+        """Log prior plus demographic modifiers for one patient profile"""
+        key = (age_group(age), gender.lower() if gender and gender.lower() in ("male", "female") else None)
+        base = self._log_bases.get(key)
+        if base is None:
+            base = self.log_prior + self.age_log_modifiers[key[0]] + self.gender_log_modifiers[key[1]]
+            self._log_bases[key] = base
+        return base
+
+    def _posterior(self, base, known_symptoms: int, candidates, gains):
+        """Posterior probabilities of the candidates, normalised over all diseases"""
+        log_scores = base + known_symptoms * self.log_leak
+        log_scores[candidates] += gains
+        peak = log_scores.max()
+        normaliser = peak + np.log(np.exp(log_scores - peak).sum())
+        return np.exp(log_scores[candidates] - normaliser)
+
+    def score(self, symptom_ids: List[str], total_symptoms: int,
+              limit: Optional[int] = None, age: Optional[int] = None, gender: Optional[str] = None,
+              **demographics) -> List[ScoredDisease]:
+        query = self.query_vector(symptom_ids)
+        counts = self.presence @ query
+        candidates = np.flatnonzero(counts > 0)
+        if candidates.size == 0:
+            return []
+        gains = (self.log_likelihood @ query)[candidates]
+        posterior = self._posterior(self.log_base(age, gender), int(query.sum()), candidates, gains)
+        return self._rank(candidates, posterior, counts[candidates], limit)
+
+    def score_many(self, queries: List[Dict], limit: Optional[int] = None) -> List[List[ScoredDisease]]:
+        if not queries:
+            return []
+        matrix = self.query_matrix(queries)
+        known = np.asarray(matrix.sum(axis=1)).ravel()
+        gains = (matrix @ self.log_likelihood.T).tocsr()
+        counts = (matrix @ self.presence.T).tocsr()
+        gains.sort_indices()
+        counts.sort_indices()
+
+        results = []
+        for row, query in enumerate(queries):
+            start, end = counts.indptr[row], counts.indptr[row + 1]
+            candidates = counts.indices[start:end]
+            if candidates.size == 0:
+                results.append([])
+                continue
+            base = self.log_base(query.get("age"), query.get("gender"))
+            posterior = self._posterior(base, int(known[row]), candidates, self._row_values(gains, row, candidates))
+            results.append(self._rank(candidates, posterior, counts.data[start:end], limit))
+        return results
+
+
+SCORERS: Dict[str, type] = {
+    RatioScorer.name: RatioScorer,
+    WeightedScorer.name: WeightedScorer,
+    BayesScorer.name: BayesScorer,
+}
+
+
+def get_scorer(index: KnowledgeIndex, name: str):
+    """Get the named scorer compiled for the given index"""
+    scorer_class = SCORERS.get(name)
+    if scorer_class is None:
+        raise ValueError(f"Unknown scorer '{name}'. Available scorers: {', '.join(sorted(SCORERS))}")
+    return index.derived(f"scorer:{name}", scorer_class)
@@ -0,0 +1,180 @@
+"""
+Knowledge Base Semantic Search
+Offline TF-IDF vector index over disease descriptions and guideline content
+"""
+
+import os
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    from scipy import sparse
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+except ImportError:
+    np = None
+    sparse = None
+    HashingVectorizer = None
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from knowledge_base.index import KnowledgeIndex
+from knowledge_base.models import MedicalGuideline
+
+SNIPPET_LENGTH = 200
+
+
+def _vectorizer(n_features: int):
+    # Hashing keeps the vocabulary out of memory and out of the saved index
+    return HashingVectorizer(
+        n_features=n_features, ngram_range=(1, 2), stop_words="english",
+        alternate_sign=False, norm=None
+    )
+
+
+class SemanticIndex:
+    """L2-normalised TF-IDF document matrix queried with one sparse product
+
+    Documents are diseases (name, description and presenting symptoms) and
+    active guidelines (title and content). A query is vectorised the same way
+    and scored against every document as a cosine similarity.
+    """
+
+    def __init__(self, matrix, idf, kinds: List[str], ids: List[str], titles: List[str],
+                 snippets: List[str], version: Optional[str] = None, n_features: int = 2 ** 18):
+        self.matrix = matrix.tocsr()
+        self.idf = idf
+        self.kinds = kinds
+        self.ids = ids
+        self.titles = titles
+        self.snippets = snippets
+        self.version = version
+        self.n_features = n_features
+        self._vectorizer = _vectorizer(n_features)
+
+    @classmethod
+    def build(cls, documents: List[Dict], version: Optional[str] = None, n_features: int = 2 ** 18) -> "SemanticIndex":
+        """Fit IDF weights over documents, each a dict with kind, id, title, text and snippet"""
+        if HashingVectorizer is None:
+            raise RuntimeError("Semantic search requires numpy, scipy and scikit-learn")
+        counts = _vectorizer(n_features).transform([doc["text"] for doc in documents])
+        if not documents:
+            return cls(counts, np.ones(n_features, dtype=np.float32), [], [], [], [],
+                       version=version, n_features=n_features)
+        transformer = TfidfTransformer(sublinear_tf=True).fit(counts)
+        return cls(
+            transformer.transform(counts), transformer.idf_.astype(np.float32),
+            [doc["kind"] for doc in documents], [doc["id"] for doc in documents],
+            [doc["title"] for doc in documents], [doc["snippet"] for doc in documents],
+            version=version, n_features=n_features
+        )
+
+    def query_vector(self, query: str):
+        counts = self._vectorizer.transform([query]).astype(np.float32)
+        counts.data = 1.0 + np.log(counts.data)  # sublinear tf, matching the documents
+        vector = counts.multiply(self.idf).tocsr()
+        norm = np.sqrt(vector.multiply(vector).sum())
+        return vector / norm if norm else vector
+
+    def search(self, query: str, limit: int = 5, kind: Optional[str] = None,
+               min_score: float = 0.05) -> List[Dict]:
+        """Top documents by cosine similarity, optionally restricted to one kind"""
+        if not self.ids:
+            return []
+        vector = self.query_vector(query)
+        if vector.nnz == 0:
+            return []
+        scores = np.asarray((self.matrix @ vector.T).todense()).ravel()
+        if kind is not None:
+            scores[np.asarray(self.kinds) != kind] = 0.0
+
+        candidates = np.flatnonzero(scores >= min_score)
+        if candidates.size > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        order = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [
+            {
+                "kind": self.kinds[i],
+                "id": self.ids[i],
+                "title": self.titles[i],
+                "snippet": self.snippets[i],
+                "score": float(scores[i])
+            }
+            for i in order
+        ]
+
+    def save(self, path: str):
+        """Persist the index as a single .npz file"""
+        matrix = self.matrix.tocsr()
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                shape=np.asarray(matrix.shape), idf=self.idf,
+                kinds=np.asarray(self.kinds, dtype=str), ids=np.asarray(self.ids, dtype=str),
+                titles=np.asarray(self.titles, dtype=str), snippets=np.asarray(self.snippets, dtype=str),
+                version=np.asarray(self.version or ""), n_features=np.asarray(self.n_features)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "SemanticIndex":
+        if HashingVectorizer is None:
+            raise RuntimeError("Semantic search requires numpy, scipy and scikit-learn")
+        with np.load(path) as stored:
+            matrix = sparse.csr_matrix(
+                (stored["data"], stored["indices"], stored["indptr"]), shape=tuple(stored["shape"])
+            )
+            return cls(
+                matrix, stored["idf"], stored["kinds"].tolist(), stored["ids"].tolist(),
+                stored["titles"].tolist(), stored["snippets"].tolist(),
+                version=str(stored["version"]) or None, n_features=int(stored["n_features"])
+            )
+
+
+def collect_documents(db: Session, index: KnowledgeIndex) -> List[Dict]:
+    """Gather the disease and guideline texts to be indexed"""
+    documents = []
+    for disease_id in index.disease_order:
+        disease = index.diseases[disease_id]
+        symptoms = sorted(index.symptoms[sid]["name"] for sid in index.disease_to_symptoms.get(disease_id, ()))
+        description = disease["description"] or ""
+        documents.append({
+            "kind": "disease",
+            "id": disease_id,
+            "title": disease["name"],
+            # The name is repeated so a direct mention outweighs incidental description terms
+            "text": " ".join([disease["name"], disease["name"], description, " ".join(symptoms)]),
+            "snippet": description[:SNIPPET_LENGTH]
+        })
+
+    guidelines = db.execute(
+        select(MedicalGuideline.id, MedicalGuideline.title, MedicalGuideline.content)
+        .where(MedicalGuideline.is_active == True)
+    )
+    for guideline in guidelines:
+        content = guideline.content or ""
+        documents.append({
+            "kind": "guideline",
+            "id": guideline.id,
+            "title": guideline.title,
+            "text": " ".join([guideline.title, content]),
+            "snippet": content[:SNIPPET_LENGTH]
+        })
+    return documents
+
+
+def build_semantic_index(db: Session, index: KnowledgeIndex, path: Optional[str] = None) -> SemanticIndex:
+    """Build the semantic index for the current knowledge base, saving it when a path is given"""
+    semantic_index = SemanticIndex.build(collect_documents(db, index), version=index.version)
+    if path:
+        semantic_index.save(path)
+    return semantic_index
+
+
+def load_semantic_index(path: Optional[str], expected_version: str = None) -> Optional[SemanticIndex]:
+    """Load a saved semantic index, or None when it is missing or was built from another version"""
+    if not path or not os.path.exists(path):
+        return None
+    semantic_index = SemanticIndex.load(path)
+    if expected_version is not None and semantic_index.version != expected_version:
+        return None
+    return semantic_index
@@ -5,9 +5,17 @@ Provides intelligent medical knowledge retrieval and analysis
 
 import sys
 import os
+import asyncio
+import bisect
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
 from typing import List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, and_, or_
+from sqlalchemy import Float, Integer, create_engine, and_, column, or_, select, text
+from sqlalchemy.exc import OperationalError
 
 # Add the parent directory to the path
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -15,8 +23,32 @@ sys.path.insert(0, parent_dir)
 
 from knowledge_base.models import (
     Symptom, Disease, Treatment, Medication, LabMarker, 
-    MedicalGuideline, MedicalKnowledgeSource, symptom_disease_association
+    MedicalGuideline, MedicalKnowledgeSource, DifferentialDiagnosis, symptom_disease_association,
+    disease_treatment_association
 )
+from knowledge_base.index import KnowledgeIndex, load_knowledge_index
+from knowledge_base.scoring import get_scorer
+from knowledge_base.resolver import SymptomResolver
+from knowledge_base.lab_panel import LabPanelInterpreter
+from knowledge_base.interactions import InteractionGraph
+from knowledge_base.clusters import ClusterMatcher, URGENCY_RISK_LEVELS
+from knowledge_base.semantic import SemanticIndex, build_semantic_index, load_semantic_index
+from knowledge_base.version import compute_kb_version
+from knowledge_base.vocabulary import VocabularyEntry, build_entity_vocabulary, load_synonyms
+from knowledge_base.cache import LRUCache, cached_query
+from knowledge_base.pagination import cursor_kind, decode_cursor, encode_cursor, keyset_page
+from knowledge_base.snapshot import SnapshotError, load_snapshot_index, snapshot_version
+from knowledge_base.fts import create_fts_tables, build_match_query, bm25_expression
+
+try:
+    from database import engine as app_engine, kb_read_engine, kb_async_read_engine
+except ImportError:
+    app_engine = kb_read_engine = kb_async_read_engine = None
+
+try:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+except ImportError:
+    async_sessionmaker = None
 
 try:
     from config import settings
@@ -24,278 +56,856 @@ except ImportError:
     # Fallback configuration
     class Settings:
         DATABASE_URL = "sqlite:///./mayberry_medical.db"
+        KB_SYMPTOM_SCORER = "ratio"
+        KB_VERSION_CHECK_SECONDS = 30.0
+        KB_CACHE_MAX_ENTRIES = 2048
+        KB_CACHE_MAX_BYTES = 64 * 1024 * 1024
+        KB_CACHE_TTL_SECONDS = 3600.0
+        KB_SNAPSHOT_PATH = None
+        KB_SEMANTIC_INDEX_PATH = None
+        KB_RELOAD_WATCH_PATH = None
+        KB_RELOAD_WATCH_SECONDS = 5.0
     settings = Settings()
 
+RISK_LEVELS = ["low", "medium", "high", "critical"]
+
+def _emergency_symptoms_by_name(index: KnowledgeIndex) -> Tuple[List[str], Tuple[Dict, ...]]:
+    listing = tuple(sorted(index.emergency_symptoms, key=lambda symptom: symptom["name"]))
+    return [symptom["name"] for symptom in listing], listing
+
+def _find_by_name(records, name: str, *fields: str) -> Optional[Dict]:
+    """Case-insensitive name lookup: an exact match on any field, else the first substring match
+    
+    Resolving names against the loaded index keeps ``%name%`` patterns, which
+    no B-tree index can serve, out of the database.
+    """
+    needle = name.strip().lower()
+    if not needle:
+        return None
+    first_partial = None
+    for record in records:
+        for field in fields:
+            value = (record.get(field) or "").lower()
+            if value == needle:
+                return record
+            if first_partial is None and needle in value:
+                first_partial = record
+    return first_partial
+
 class MedicalKnowledgeService:
     """Service for accessing and analyzing medical knowledge base"""
     
-    def __init__(self):
-        self.engine = create_engine(settings.DATABASE_URL)
+    def __init__(self, engine=None):
+        # Share the application's engines unless given one; lookups go through the read-only pool
+        self.engine = engine or app_engine or create_engine(settings.DATABASE_URL)
+        self.read_engine = engine or kb_read_engine or self.engine
         from sqlalchemy.orm import sessionmaker
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.read_engine)
+        # Set when ASYNC_DB_ENABLED; the *_async methods then query through the async driver
+        self.AsyncSessionLocal = (
+            async_sessionmaker(kb_async_read_engine, autoflush=False)
+            if engine is None and kb_async_read_engine is not None and async_sessionmaker is not None else None
+        )
+        self._index: Optional[KnowledgeIndex] = None
+        self._index_lock = threading.Lock()
+        self._index_checked_at = 0.0
+        self._index_source: Optional[str] = None
+        self._index_loaded_at: Optional[float] = None
+        # Reloads run one at a time on their own thread
+        self._reload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-reload")
+        self._reload_future: Optional[Future] = None
+        self._reload_forced = False
+        self._reload_lock = threading.Lock()
+        self._last_reload_error: Optional[str] = None
+        self._watch_path: Optional[str] = None
+        self._watched_mtime: Optional[int] = None
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+        self._fts_enabled: Optional[bool] = None
+        self.cache = LRUCache(
+            settings.KB_CACHE_MAX_ENTRIES, settings.KB_CACHE_TTL_SECONDS, settings.KB_CACHE_MAX_BYTES
+        )
     
     def get_session(self) -> Session:
         """Get database session"""
         return self.SessionLocal()
     
-    def search_symptoms(self, query: str, limit: int = 10) -> List[Dict]:
-        """Search for symptoms by name or description"""
+    def _read(self, query, *args):
         db = self.get_session()
         try:
-            symptoms = db.query(Symptom).filter(
-                or_(
-                    Symptom.name.ilike(f"%{query}%"),
-                    Symptom.description.ilike(f"%{query}%")
-                )
-            ).limit(limit).all()
-            
-            return [
-                {
-                    "id": symptom.id,
-                    "name": symptom.name,
-                    "description": symptom.description,
-                    "category": symptom.category,
-                    "body_system": symptom.body_system,
-                    "is_emergency": symptom.is_emergency_symptom,
-                    "prevalence_rate": symptom.prevalence_rate
-                }
-                for symptom in symptoms
-            ]
+            return query(db, *args)
         finally:
             db.close()
     
-    def search_diseases(self, query: str, limit: int = 10) -> List[Dict]:
-        """Search for diseases by name or description"""
-        db = self.get_session()
-        try:
-            diseases = db.query(Disease).filter(
-                or_(
-                    Disease.name.ilike(f"%{query}%"),
-                    Disease.description.ilike(f"%{query}%")
-                )
-            ).limit(limit).all()
-            
-            return [
-                {
-                    "id": disease.id,
-                    "name": disease.name,
-                    "icd_10_code": disease.icd_10_code,
-                    "description": disease.description,
-                    "severity_level": disease.severity_level,
-                    "is_contagious": disease.is_contagious,
-                    "prevalence": disease.prevalence
-                }
-                for disease in diseases
-            ]
-        finally:
-            db.close()
+    async def _read_async(self, query, *args):
+        """Run query(session, *args) on the async engine, or on a sync session in a worker thread"""
+        if self.AsyncSessionLocal is None:
+            return await asyncio.to_thread(self._read, query, *args)
+        if self._fts_enabled is None:
+            # FTS table creation goes through the sync engine; keep it off the event loop
+            await asyncio.to_thread(lambda: self.fts_enabled)
+        async with self.AsyncSessionLocal() as session:
+            return await session.run_sync(query, *args)
     
-    def get_diseases_by_symptoms(self, symptom_names: List[str]) -> List[Dict]:
-        """Get possible diseases based on a list of symptoms"""
-        db = self.get_session()
+    def get_index(self) -> KnowledgeIndex:
+        """Get the compiled in-memory index, building it on first use
+        
+        The knowledge base version is re-checked at most every
+        KB_VERSION_CHECK_SECONDS; when it changed, a replacement index is built
+        in the background while requests keep being served from the current one.
+        """
+        index = self._index
+        if index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._install_index(*self._build_index())
+                index = self._index
+        elif time.monotonic() - self._index_checked_at >= settings.KB_VERSION_CHECK_SECONDS:
+            index = self._refresh_if_stale()
+        return index
+    
+    async def get_index_async(self) -> KnowledgeIndex:
+        """get_index for async callers: the first build happens in a worker thread"""
+        if self._index is None:
+            return await asyncio.to_thread(self.get_index)
+        return self.get_index()
+    
+    def refresh_index(self) -> KnowledgeIndex:
+        """Rebuild the in-memory index after the knowledge base has been repopulated"""
+        return self.start_reload(force=True).result()
+    
+    def start_reload(self, force: bool = False) -> Future:
+        """Build a replacement index in the background and swap it in when it is ready
+        
+        Requests already holding the old index finish on it. Unless ``force``
+        is set, nothing is rebuilt when the knowledge base version is unchanged.
+        Returns the reload already in progress, if there is one; a forced
+        request arriving during an unforced reload queues a forced one behind it.
+        """
+        with self._reload_lock:
+            if self._reload_future is None or self._reload_future.done():
+                self._reload_future = self._reload_executor.submit(self._reload, force)
+                self._reload_forced = force
+            elif force and not self._reload_forced:
+                # The running reload may skip the rebuild, so it cannot stand in for a forced one
+                self._reload_future = self._reload_executor.submit(self._reload, True)
+                self._reload_forced = True
+            return self._reload_future
+    
+    def _reload(self, force: bool) -> KnowledgeIndex:
         try:
-            # Find symptoms that match the input
-            symptoms = db.query(Symptom).filter(
-                Symptom.name.in_(symptom_names)
-            ).all()
+            current = self._index
+            if not force and current is not None:
+                version = self._read(compute_kb_version)
+                if version == current.version or self._awaiting_snapshot(version):
+                    return current
             
-            if not symptoms:
-                return []
+            index, source = self._build_index()
+            # Compile the engines most requests need before the index goes live
+            get_scorer(index, settings.KB_SYMPTOM_SCORER)
+            index.derived("symptom_resolver", SymptomResolver)
+            index.derived("entity_vocabulary", self._load_entity_vocabulary)
             
-            # Get diseases associated with these symptoms
-            symptom_ids = [s.id for s in symptoms]
-            
-            # Query diseases with symptom associations
-            diseases_query = db.query(Disease).join(symptom_disease_association).filter(
-                symptom_disease_association.c.symptom_id.in_(symptom_ids)
-            ).all()
-            
-            # Calculate match scores based on number of matching symptoms
-            disease_scores = {}
-            for disease in diseases_query:
-                matching_symptoms = len([s for s in disease.symptoms if s.name in symptom_names])
-                total_symptoms = len(symptom_names)
-                score = matching_symptoms / total_symptoms if total_symptoms > 0 else 0
-                
-                disease_scores[disease.id] = {
-                    "disease": disease,
-                    "match_score": score,
-                    "matching_symptoms": matching_symptoms,
-                    "total_symptoms": total_symptoms
-                }
-            
-            # Sort by match score
-            sorted_diseases = sorted(disease_scores.values(), key=lambda x: x["match_score"], reverse=True)
-            
-            return [
-                {
-                    "id": item["disease"].id,
-                    "name": item["disease"].name,
-                    "description": item["disease"].description,
-                    "icd_10_code": item["disease"].icd_10_code,
-                    "severity_level": item["disease"].severity_level,
-                    "match_score": item["match_score"],
-                    "matching_symptoms": item["matching_symptoms"],
-                    "total_symptoms": item["total_symptoms"],
-                    "prevalence": item["disease"].prevalence,
-                    "is_contagious": item["disease"].is_contagious
-                }
-                for item in sorted_diseases
-            ]
-        finally:
-            db.close()
+            with self._index_lock:
+                self._install_index(index, source)
+            self._last_reload_error = None
+            return index
+        except Exception as e:
+            self._last_reload_error = str(e)
+            raise
     
-    def get_treatments_for_disease(self, disease_name: str) -> List[Dict]:
-        """Get treatment options for a specific disease"""
-        db = self.get_session()
+    def _awaiting_snapshot(self, version: str) -> bool:
+        """Whether the data changed but the snapshot has not been rebuilt for it yet
+        
+        Only the snapshot builder and the bulk loader write the snapshot, so
+        workers keep serving their index until it catches up (the file watch
+        reloads them) rather than each re-reading the whole knowledge base.
+        """
+        if not settings.KB_SNAPSHOT_PATH:
+            return False
         try:
-            disease = db.query(Disease).filter(Disease.name.ilike(f"%{disease_name}%")).first()
-            if not disease:
-                return []
-            
-            treatments = disease.treatments
-            return [
-                {
-                    "id": treatment.id,
-                    "name": treatment.name,
-                    "type": treatment.type,
-                    "description": treatment.description,
-                    "effectiveness_rate": treatment.effectiveness_rate,
-                    "requires_prescription": treatment.requires_prescription,
-                    "cost_category": treatment.cost_category
-                }
-                for treatment in treatments
-            ]
-        finally:
-            db.close()
+            published = snapshot_version(settings.KB_SNAPSHOT_PATH)
+        except (OSError, SnapshotError, RuntimeError) as e:
+            print(f"Ignoring knowledge base snapshot: {e}")
+            return False
+        return published is not None and published != version
     
-    def get_medication_info(self, medication_name: str) -> Optional[Dict]:
-        """Get detailed information about a medication"""
+    def _install_index(self, index: KnowledgeIndex, source: str):
+        # Callers hold _index_lock
+        self._index = index
+        self._index_source = source
+        self._index_loaded_at = time.time()
+        self._index_checked_at = time.monotonic()
+    
+    def _refresh_if_stale(self) -> KnowledgeIndex:
+        with self._index_lock:
+            due = time.monotonic() - self._index_checked_at >= settings.KB_VERSION_CHECK_SECONDS
+            if due:
+                self._index_checked_at = time.monotonic()
+        if due:
+            # The version query and any rebuild run on the reload thread
+            self.start_reload()
+        return self._index
+    
+    def _build_index(self) -> Tuple[KnowledgeIndex, str]:
         db = self.get_session()
         try:
-            medication = db.query(Medication).filter(
-                or_(
-                    Medication.generic_name.ilike(f"%{medication_name}%"),
-                    Medication.brand_names.ilike(f"%{medication_name}%")
-                )
-            ).first()
-            
-            if not medication:
-                return None
-            
-            return {
-                "id": medication.id,
-                "generic_name": medication.generic_name,
-                "brand_names": medication.brand_names,
-                "drug_class": medication.drug_class,
-                "mechanism_of_action": medication.mechanism_of_action,
-                "indications": medication.indications,
-                "contraindications": medication.contraindications,
-                "side_effects": medication.side_effects,
-                "pregnancy_category": medication.pregnancy_category,
-                "requires_monitoring": medication.requires_monitoring,
-                "is_controlled_substance": medication.is_controlled_substance
-            }
+            # Prefer the snapshot when it was built from the current data
+            if settings.KB_SNAPSHOT_PATH:
+                try:
+                    index = load_snapshot_index(settings.KB_SNAPSHOT_PATH, compute_kb_version(db))
+                    if index is not None:
+                        return index, "snapshot"
+                except (OSError, SnapshotError, RuntimeError) as e:
+                    print(f"Ignoring knowledge base snapshot: {e}")
+            return load_knowledge_index(db), "database"
         finally:
             db.close()
     
-    def get_lab_marker_interpretation(self, marker_name: str, value: float) -> Optional[Dict]:
-        """Interpret lab test results"""
+    def start_file_watch(self, path: str = None, interval: float = None) -> bool:
+        """Reload whenever ``path`` (default KB_RELOAD_WATCH_PATH, then KB_SNAPSHOT_PATH) is modified
+        
+        The file is polled for a new modification time every ``interval``
+        seconds on a daemon thread. Returns False when there is nothing to watch.
+        """
+        path = path or settings.KB_RELOAD_WATCH_PATH or settings.KB_SNAPSHOT_PATH
+        interval = interval if interval is not None else settings.KB_RELOAD_WATCH_SECONDS
+        if not path or interval <= 0:
+            return False
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return True
+        
+        self._watch_path = path
+        self._watched_mtime = self._watch_mtime()
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(
+            target=self._watch_loop, args=(interval,), name="kb-file-watch", daemon=True
+        )
+        self._watch_thread.start()
+        return True
+    
+    def stop_file_watch(self):
+        self._watch_stop.set()
+    
+    def _watch_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self._watch_path).st_mtime_ns if self._watch_path else None
+        except OSError:
+            return None
+    
+    def _watch_loop(self, interval: float):
+        while not self._watch_stop.wait(interval):
+            mtime = self._watch_mtime()
+            if mtime is not None and mtime != self._watched_mtime:
+                self._watched_mtime = mtime
+                self.start_reload()
+    
+    def get_reload_status(self) -> Dict:
+        """Version and provenance of the live index, and whether a reload is running"""
+        index = self._index
+        return {
+            "knowledge_base_version": index.version if index is not None else None,
+            "source": self._index_source,
+            "loaded_at": (
+                datetime.fromtimestamp(self._index_loaded_at, tz=timezone.utc).isoformat()
+                if self._index_loaded_at else None
+            ),
+            "reload_in_progress": self._reload_future is not None and not self._reload_future.done(),
+            "last_reload_error": self._last_reload_error,
+            "watching": self._watch_path if self._watch_thread is not None and self._watch_thread.is_alive() else None
+        }
+    
+    def get_scorer(self, name: str = None):
+        """Get a scoring engine compiled for the current index (raises ValueError for unknown names)"""
+        return get_scorer(self.get_index(), name or settings.KB_SYMPTOM_SCORER)
+    
+    def get_symptom_resolver(self) -> SymptomResolver:
+        """Get the fuzzy symptom-name resolver compiled for the current index"""
+        return self.get_index().derived("symptom_resolver", SymptomResolver)
+    
+    def resolve_symptom_names(self, symptom_names: List[str]) -> Dict[str, Optional[str]]:
+        """Map free-text symptom names to canonical knowledge-base names (None when unresolved)"""
+        index = self.get_index()
+        resolver = index.derived("symptom_resolver", SymptomResolver)
+        resolved = {}
+        for name in symptom_names:
+            symptom_id = resolver.resolve(name)
+            resolved[name] = index.symptoms[symptom_id]["name"] if symptom_id else None
+        return resolved
+    
+    def get_entity_vocabulary(self) -> Tuple[VocabularyEntry, ...]:
+        """Get the (term, category, canonical name) entries chat extraction matches, for the current index
+        
+        A new tuple is returned only after the knowledge base version changes,
+        so callers can key compiled matchers on its identity.
+        """
+        return self.get_index().derived("entity_vocabulary", self._load_entity_vocabulary)
+    
+    def _load_entity_vocabulary(self, index: KnowledgeIndex) -> Tuple[VocabularyEntry, ...]:
+        return build_entity_vocabulary(index, self._read(load_synonyms))
+    
+    def get_semantic_index(self) -> SemanticIndex:
+        """Get the semantic search index for the current knowledge base version"""
+        return self.get_index().derived("semantic_index", self._load_semantic_index)
+    
+    def _load_semantic_index(self, index: KnowledgeIndex) -> SemanticIndex:
+        # Use the index saved at populate time when it matches, otherwise build it here
+        semantic_index = load_semantic_index(settings.KB_SEMANTIC_INDEX_PATH, index.version)
+        if semantic_index is not None:
+            return semantic_index
         db = self.get_session()
         try:
-            marker = db.query(LabMarker).filter(
-                LabMarker.name.ilike(f"%{marker_name}%")
-            ).first()
-            
-            if not marker:
-                return None
-            
-            interpretation = "normal"
-            status = "within_range"
-            
-            if marker.critical_low and value < marker.critical_low:
-                interpretation = "critically_low"
-                status = "critical"
-            elif marker.critical_high and value > marker.critical_high:
-                interpretation = "critically_high"
-                status = "critical"
-            elif marker.normal_range_min and value < marker.normal_range_min:
-                interpretation = "low"
-                status = "abnormal"
-            elif marker.normal_range_max and value > marker.normal_range_max:
-                interpretation = "high"
-                status = "abnormal"
-            
-            return {
-                "marker_name": marker.name,
-                "value": value,
-                "units": marker.units,
-                "normal_range": f"{marker.normal_range_min}-{marker.normal_range_max}",
-                "interpretation": interpretation,
-                "status": status,
-                "clinical_significance": marker.clinical_significance
-            }
+            return build_semantic_index(db, index)
         finally:
             db.close()
     
-    def get_medical_guidelines(self, topic: str, organization: str = None) -> List[Dict]:
-        """Get medical guidelines for a specific topic"""
-        db = self.get_session()
+    @cached_query
+    def semantic_search(self, query: str, limit: int = 5, kind: str = None) -> List[Dict]:
+        """Find diseases and guidelines related to free text such as a chat message"""
+        return self.get_semantic_index().search(query, limit=limit, kind=kind)
+    
+    async def semantic_search_async(self, query: str, limit: int = 5, kind: str = None) -> List[Dict]:
+        # The first search may build the index from the database
+        return await asyncio.to_thread(self.semantic_search, query, limit, kind)
+    
+    @property
+    def fts_enabled(self) -> bool:
+        """Whether FTS5 search is available, creating the FTS tables on first check"""
+        if self._fts_enabled is None:
+            try:
+                self._fts_enabled = create_fts_tables(self.engine)
+            except Exception:
+                self._fts_enabled = False
+        return self._fts_enabled
+    
+    def _fts_page(self, db: Session, model, source: str, query: str, limit: Optional[int],
+                  after: Optional[Tuple] = None, filters: str = "", params: Dict = None,
+                  match_any: bool = False) -> Optional[List]:
+        """Run a BM25-ranked FTS5 search as (row, score, rowid) tuples, or None when FTS cannot serve it
+        
+        Results are ordered by (score, rowid); ``after`` is that key for the
+        last row of the previous page.
+        """
+        if not self.fts_enabled:
+            return None
+        match = build_match_query(query, match_any=match_any)
+        if match is None:
+            return None
+        
+        table = model.__tablename__
+        fts_table = f"{table}_fts"
+        statement = text(
+            f"SELECT * FROM (SELECT {table}.*, {bm25_expression(source)} AS kb_score, {fts_table}.rowid AS kb_rowid "
+            f"FROM {fts_table} JOIN {fts_table}_keys ON {fts_table}_keys.fts_rowid = {fts_table}.rowid "
+            f"JOIN {table} ON {table}.id = {fts_table}_keys.id "
+            f"WHERE {fts_table} MATCH :match {filters}) "
+            f"WHERE :after_score IS NULL OR kb_score > :after_score "
+            f"OR (kb_score = :after_score AND kb_rowid > :after_rowid) "
+            f"ORDER BY kb_score, kb_rowid LIMIT :limit"
+        )
+        after_score, after_rowid = after or (None, None)
         try:
-            query = db.query(MedicalGuideline).filter(
-                MedicalGuideline.title.ilike(f"%{topic}%"),
-                MedicalGuideline.is_active == True
+            return db.execute(
+                select(model, column("kb_score", Float), column("kb_rowid", Integer)).from_statement(statement),
+                {"match": match, "limit": limit if limit is not None else -1,
+                 "after_score": after_score, "after_rowid": after_rowid, **(params or {})}
+            ).all()
+        except OperationalError:
+            db.rollback()
+            return None
+    
+    def _fts_search(self, db: Session, model, source: str, query: str, limit: int, filters: str = "",
+                    params: Dict = None, match_any: bool = False) -> Optional[List]:
+        """Run a BM25-ranked FTS5 search, returning None when FTS cannot serve the query"""
+        rows = self._fts_page(db, model, source, query, limit, None, filters, params, match_any)
+        return None if rows is None else [row[0] for row in rows]
+    
+    def _keyset_search(self, db: Session, model, source: str, query: str, limit: Optional[int],
+                       cursor: Optional[str], to_dict, fallback, sort_column,
+                       filters: str = "", params: Dict = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of a search plus the cursor of the next page
+        
+        FTS results are keyed on (bm25 score, rowid); the substring
+        ``fallback`` query is keyed on (sort_column, id). The fallback also
+        serves queries FTS finds nothing for, such as 'ache' inside 'headache'.
+        """
+        fetch = limit + 1 if limit is not None else None
+        if self.fts_enabled and cursor_kind(cursor) != "sorted":
+            rows = self._fts_page(db, model, source, query, fetch, decode_cursor(cursor, "rank", 2), filters, params)
+            if rows or (rows is not None and cursor):
+                return keyset_page(rows, limit, lambda row: to_dict(row[0]), lambda row: (row[1], row[2]), "rank")
+        
+        # Substring fallback for backends without FTS5 and for word fragments
+        after = decode_cursor(cursor, "sorted", 2)
+        fallback = fallback.order_by(sort_column, model.id)
+        if after:
+            fallback = fallback.filter(or_(sort_column > after[0], and_(sort_column == after[0], model.id > after[1])))
+        if fetch is not None:
+            fallback = fallback.limit(fetch)
+        return keyset_page(
+            fallback.all(), limit, to_dict, lambda row: (getattr(row, sort_column.key), row.id), "sorted"
+        )
+    
+    @staticmethod
+    def _symptom_result(symptom: Symptom) -> Dict:
+        return {
+            "id": symptom.id,
+            "name": symptom.name,
+            "description": symptom.description,
+            "category": symptom.category,
+            "body_system": symptom.body_system,
+            "is_emergency": symptom.is_emergency_symptom,
+            "prevalence_rate": symptom.prevalence_rate
+        }
+    
+    @staticmethod
+    def _disease_search_result(disease: Disease) -> Dict:
+        return {
+            "id": disease.id,
+            "name": disease.name,
+            "icd_10_code": disease.icd_10_code,
+            "description": disease.description,
+            "severity_level": disease.severity_level,
+            "is_contagious": disease.is_contagious,
+            "prevalence": disease.prevalence
+        }
+    
+    @cached_query
+    def search_symptoms(self, query: str, limit: int = 10) -> List[Dict]:
+        """Search for symptoms by name or description"""
+        return self._read(self._search_symptoms, query, limit)[0]
+    
+    @cached_query
+    async def search_symptoms_async(self, query: str, limit: int = 10) -> List[Dict]:
+        return (await self._read_async(self._search_symptoms, query, limit))[0]
+    
+    @cached_query
+    def page_symptoms(self, query: str, limit: int = 10, cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of symptom search results and the cursor of the next page (raises ValueError for bad cursors)"""
+        return self._read(self._search_symptoms, query, limit, cursor)
+    
+    @cached_query
+    async def page_symptoms_async(self, query: str, limit: int = 10, cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        return await self._read_async(self._search_symptoms, query, limit, cursor)
+    
+    def _search_symptoms(self, db: Session, query: str, limit: Optional[int],
+                         cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        fallback = db.query(Symptom).filter(
+            or_(
+                Symptom.name.ilike(f"%{query}%"),
+                Symptom.description.ilike(f"%{query}%")
             )
-            
-            if organization:
-                query = query.filter(MedicalGuideline.organization.ilike(f"%{organization}%"))
-            
-            guidelines = query.all()
-            
-            return [
-                {
-                    "id": guideline.id,
-                    "title": guideline.title,
-                    "organization": guideline.organization,
-                    "version": guideline.version,
-                    "evidence_level": guideline.evidence_level,
-                    "guideline_type": guideline.guideline_type,
-                    "content": guideline.content,
-                    "publication_date": guideline.publication_date.isoformat() if guideline.publication_date else None
-                }
-                for guideline in guidelines
+        )
+        return self._keyset_search(db, Symptom, "symptoms", query, limit, cursor,
+                                   self._symptom_result, fallback, Symptom.name)
+    
+    @cached_query
+    def search_diseases(self, query: str, limit: int = 10) -> List[Dict]:
+        """Search for diseases by name or description"""
+        return self._read(self._search_diseases, query, limit)[0]
+    
+    @cached_query
+    async def search_diseases_async(self, query: str, limit: int = 10) -> List[Dict]:
+        return (await self._read_async(self._search_diseases, query, limit))[0]
+    
+    @cached_query
+    def page_diseases(self, query: str, limit: int = 10, cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of disease search results and the cursor of the next page (raises ValueError for bad cursors)"""
+        return self._read(self._search_diseases, query, limit, cursor)
+    
+    @cached_query
+    async def page_diseases_async(self, query: str, limit: int = 10, cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        return await self._read_async(self._search_diseases, query, limit, cursor)
+    
+    def _search_diseases(self, db: Session, query: str, limit: Optional[int],
+                         cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        fallback = db.query(Disease).filter(
+            or_(
+                Disease.name.ilike(f"%{query}%"),
+                Disease.description.ilike(f"%{query}%")
+            )
+        )
+        return self._keyset_search(db, Disease, "diseases", query, limit, cursor,
+                                   self._disease_search_result, fallback, Disease.name)
+    
+    def get_diseases_by_symptoms(self, symptom_names: List[str], scorer: str = None,
+                                 limit: int = None, age: int = None, gender: str = None) -> List[Dict]:
+        """Get possible diseases based on a list of symptoms"""
+        index = self.get_index()
+        resolver = index.derived("symptom_resolver", SymptomResolver)
+        terms, symptom_ids = resolver.resolve_phrases(symptom_names)
+        return self._score_diseases(index, symptom_ids, len(terms), scorer, limit, age, gender)
+    
+    async def get_diseases_by_symptoms_async(self, symptom_names: List[str], scorer: str = None,
+                                             limit: int = None, age: int = None, gender: str = None) -> List[Dict]:
+        await self.get_index_async()
+        return self.get_diseases_by_symptoms(symptom_names, scorer, limit, age, gender)
+    
+    def _score_diseases(self, index: KnowledgeIndex, symptom_ids: List[Optional[str]], total_symptoms: int,
+                        scorer: str = None, limit: int = None, age: int = None, gender: str = None) -> List[Dict]:
+        # Drop unresolved names and duplicates
+        symptom_ids = list(dict.fromkeys(symptom_id for symptom_id in symptom_ids if symptom_id))
+        if not symptom_ids:
+            return []
+        
+        engine = get_scorer(index, scorer or settings.KB_SYMPTOM_SCORER)
+        scored = engine.score(symptom_ids, total_symptoms, limit=limit, age=age, gender=gender)
+        
+        return [
+            self._disease_result(index.diseases[disease_id], score, matching_symptoms, total_symptoms,
+                                 engine.score_field)
+            for disease_id, score, matching_symptoms in scored
+        ]
+    
+    @staticmethod
+    def _disease_result(disease: Dict, score: float, matching_symptoms: int, total_symptoms: int,
+                        score_field: str = "match_score") -> Dict:
+        result = {
+            "id": disease["id"],
+            "name": disease["name"],
+            "description": disease["description"],
+            "icd_10_code": disease["icd_10_code"],
+            "severity_level": disease["severity_level"],
+            "match_score": score,
+            "matching_symptoms": matching_symptoms,
+            "total_symptoms": total_symptoms,
+            "prevalence": disease["prevalence"],
+            "is_contagious": disease["is_contagious"]
+        }
+        if score_field != "match_score":
+            # Scores on another scale (e.g. posteriors) get their own field; match_score stays the matched fraction
+            result["match_score"] = matching_symptoms / total_symptoms if total_symptoms else 0.0
+            result[score_field] = score
+        return result
+    
+    @staticmethod
+    def _differential_result(disease: Dict, row: DifferentialDiagnosis) -> Dict:
+        return {
+            "id": disease["id"],
+            "name": disease["name"],
+            "icd_10_code": disease["icd_10_code"],
+            "severity_level": disease["severity_level"],
+            "similarity_score": row.similarity_score,
+            "distinguishing_features": json.loads(row.distinguishing_features) if row.distinguishing_features else {},
+            "key_differences": row.key_differences,
+            "diagnostic_tests": row.diagnostic_tests
+        }
+    
+    @cached_query
+    def get_differentials(self, disease_name: str, limit: int = 10) -> Optional[Dict]:
+        """Get the precomputed differential diagnoses for a disease"""
+        return self._read(self._get_differentials, self.get_index(), disease_name, limit)
+    
+    @cached_query
+    async def get_differentials_async(self, disease_name: str, limit: int = 10) -> Optional[Dict]:
+        return await self._read_async(self._get_differentials, await self.get_index_async(), disease_name, limit)
+    
+    def _get_differentials(self, db: Session, index: KnowledgeIndex, disease_name: str, limit: int) -> Optional[Dict]:
+        disease = _find_by_name(index.diseases.values(), disease_name, "name")
+        if not disease:
+            return None
+        
+        rows = db.query(DifferentialDiagnosis).filter(
+            DifferentialDiagnosis.primary_disease_id == disease["id"]
+        ).order_by(DifferentialDiagnosis.similarity_score.desc()).limit(limit).all()
+        
+        return {
+            "disease": {"id": disease["id"], "name": disease["name"], "icd_10_code": disease["icd_10_code"]},
+            "differentials": [
+                self._differential_result(index.diseases[row.differential_disease_id], row)
+                for row in rows if row.differential_disease_id in index.diseases
             ]
-        finally:
-            db.close()
+        }
+    
+    @cached_query
+    def get_differentials_for_symptoms(self, symptoms: Tuple[str, ...], limit: int = 10,
+                                       candidates: int = 3) -> Dict:
+        """Rank differentials of the best-matching diseases for a symptom set
+        
+        Each stored differential is weighted by the score (or posterior) of the disease
+        it was reached from; the matched diseases themselves are listed separately.
+        """
+        index = self.get_index()
+        matched = self.get_diseases_by_symptoms(list(symptoms), limit=candidates)
+        return self._read(self._rank_differentials, index, symptoms, matched, limit)
+    
+    @cached_query
+    async def get_differentials_for_symptoms_async(self, symptoms: Tuple[str, ...], limit: int = 10,
+                                                   candidates: int = 3) -> Dict:
+        index = await self.get_index_async()
+        matched = self.get_diseases_by_symptoms(list(symptoms), limit=candidates)
+        return await self._read_async(self._rank_differentials, index, symptoms, matched, limit)
+    
+    def _rank_differentials(self, db: Session, index: KnowledgeIndex, symptoms: Tuple[str, ...],
+                            matched: List[Dict], limit: int) -> Dict:
+        matched_scores = {disease["id"]: disease.get("posterior", disease["match_score"]) for disease in matched}
+        if not matched_scores:
+            return {"symptoms": list(symptoms), "candidate_diseases": [], "differentials": []}
+        
+        rows = db.query(DifferentialDiagnosis).filter(
+            DifferentialDiagnosis.primary_disease_id.in_(list(matched_scores))
+        ).all()
+        
+        best: Dict[str, Tuple[float, DifferentialDiagnosis]] = {}
+        for row in rows:
+            differential_id = row.differential_disease_id
+            if differential_id in matched_scores or differential_id not in index.diseases:
+                continue
+            score = matched_scores[row.primary_disease_id] * (row.similarity_score or 0.0)
+            if differential_id not in best or score > best[differential_id][0]:
+                best[differential_id] = (score, row)
+        
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], index.disease_position[item[0]]))[:limit]
+        differentials = []
+        for differential_id, (score, row) in ranked:
+            result = self._differential_result(index.diseases[differential_id], row)
+            result["reached_from"] = index.diseases[row.primary_disease_id]["name"]
+            result["differential_score"] = score
+            differentials.append(result)
+        
+        return {"symptoms": list(symptoms), "candidate_diseases": matched, "differentials": differentials}
+    
+    @cached_query
+    def get_treatments_for_disease(self, disease_name: str) -> List[Dict]:
+        """Get treatment options for a specific disease"""
+        return self._read(self._get_treatments_for_disease, self.get_index(), disease_name)
+    
+    @cached_query
+    async def get_treatments_for_disease_async(self, disease_name: str) -> List[Dict]:
+        return await self._read_async(self._get_treatments_for_disease, await self.get_index_async(), disease_name)
+    
+    def _get_treatments_for_disease(self, db: Session, index: KnowledgeIndex, disease_name: str) -> List[Dict]:
+        disease = _find_by_name(index.diseases.values(), disease_name, "name")
+        if not disease:
+            return []
+
+        treatments = db.query(Treatment).join(
+            disease_treatment_association, disease_treatment_association.c.treatment_id == Treatment.id
+        ).filter(disease_treatment_association.c.disease_id == disease["id"]).all()
+        return [
+            {
+                "id": treatment.id,
+                "name": treatment.name,
+                "type": treatment.type,
+                "description": treatment.description,
+                "effectiveness_rate": treatment.effectiveness_rate,
+                "requires_prescription": treatment.requires_prescription,
+                "cost_category": treatment.cost_category
+            }
+            for treatment in treatments
+        ]
+    
+    @cached_query
+    def get_medication_info(self, medication_name: str) -> Optional[Dict]:
+        """Get detailed information about a medication"""
+        return self._medication_info(self.get_index(), medication_name)
+    
+    @cached_query
+    async def get_medication_info_async(self, medication_name: str) -> Optional[Dict]:
+        return self._medication_info(await self.get_index_async(), medication_name)
+    
+    def _medication_info(self, index: KnowledgeIndex, medication_name: str) -> Optional[Dict]:
+        # The index already holds every column this returns; brand_names is matched as stored text
+        medication = _find_by_name(index.medications, medication_name, "generic_name", "brand_names")
+        return dict(medication) if medication else None
+    
+    def get_interaction_graph(self) -> InteractionGraph:
+        """Get the drug interaction graph compiled for the current index"""
+        return self.get_index().derived("interaction_graph", InteractionGraph)
+    
+    def check_drug_interactions(self, medication_names: List[str]) -> Dict:
+        """Check a medication list for pairwise drug interactions, most severe first"""
+        return self.get_interaction_graph().check(medication_names)
+    
+    async def check_drug_interactions_async(self, medication_names: List[str]) -> Dict:
+        await self.get_index_async()
+        return self.check_drug_interactions(medication_names)
+    
+    def get_lab_interpreter(self) -> LabPanelInterpreter:
+        """Get the lab panel interpreter compiled for the current index"""
+        return self.get_index().derived("lab_interpreter", LabPanelInterpreter)
+    
+    def get_lab_marker_interpretation(self, marker_name: str, value: float) -> Optional[Dict]:
+        """Interpret lab test results"""
+        return self.get_lab_interpreter().interpret(marker_name, value)
+    
+    def interpret_lab_panel(self, results: List[Tuple[str, float]]) -> Dict:
+        """Interpret a panel of (marker name, value) results in one pass"""
+        return self.get_lab_interpreter().interpret_panel(results)
+    
+    async def get_lab_marker_interpretation_async(self, marker_name: str, value: float) -> Optional[Dict]:
+        await self.get_index_async()
+        return self.get_lab_marker_interpretation(marker_name, value)
+    
+    async def interpret_lab_panel_async(self, results: List[Tuple[str, float]]) -> Dict:
+        await self.get_index_async()
+        return self.interpret_lab_panel(results)
+    
+    @staticmethod
+    def _guideline_result(guideline: MedicalGuideline, include_content: bool = True) -> Dict:
+        result = {
+            "id": guideline.id,
+            "title": guideline.title,
+            "organization": guideline.organization,
+            "version": guideline.version,
+            "evidence_level": guideline.evidence_level,
+            "guideline_type": guideline.guideline_type,
+            "publication_date": guideline.publication_date.isoformat() if guideline.publication_date else None
+        }
+        if include_content:
+            result["content"] = guideline.content
+        return result
+    
+    @cached_query
+    def get_medical_guidelines(self, topic: str, organization: str = None, limit: int = None) -> List[Dict]:
+        """Get medical guidelines for a specific topic"""
+        return self._read(self._get_medical_guidelines, topic, organization, limit)[0]
+    
+    @cached_query
+    async def get_medical_guidelines_async(self, topic: str, organization: str = None, limit: int = None) -> List[Dict]:
+        return (await self._read_async(self._get_medical_guidelines, topic, organization, limit))[0]
+    
+    @cached_query
+    def page_medical_guidelines(self, topic: str, organization: str = None, limit: int = None, cursor: str = None,
+                                include_content: bool = True) -> Tuple[List[Dict], Optional[str]]:
+        """One page of guideline search results and the cursor of the next page (raises ValueError for bad cursors)"""
+        return self._read(self._get_medical_guidelines, topic, organization, limit, cursor, include_content)
+    
+    @cached_query
+    async def page_medical_guidelines_async(self, topic: str, organization: str = None, limit: int = None,
+                                            cursor: str = None, include_content: bool = True) -> Tuple[List[Dict], Optional[str]]:
+        return await self._read_async(self._get_medical_guidelines, topic, organization, limit, cursor, include_content)
+    
+    def _get_medical_guidelines(self, db: Session, topic: str, organization: str = None, limit: int = None,
+                                cursor: str = None, include_content: bool = True) -> Tuple[List[Dict], Optional[str]]:
+        filters = "AND medical_guidelines.is_active = 1"
+        params = {}
+        fallback = db.query(MedicalGuideline).filter(
+            MedicalGuideline.title.ilike(f"%{topic}%"),
+            MedicalGuideline.is_active == True
+        )
+        if organization:
+            filters += " AND medical_guidelines.organization LIKE :organization"
+            params["organization"] = f"%{organization}%"
+            fallback = fallback.filter(MedicalGuideline.organization.ilike(f"%{organization}%"))
+        
+        return self._keyset_search(
+            db, MedicalGuideline, "medical_guidelines", topic, limit or None, cursor,
+            lambda guideline: self._guideline_result(guideline, include_content),
+            fallback, MedicalGuideline.title, filters, params
+        )
+    
+    def get_cache_stats(self) -> Dict:
+        """Hit/miss counters and occupancy of the query result cache"""
+        stats = self.cache.stats()
+        stats["knowledge_base_version"] = self.get_index().version
+        return stats
+    
+    async def get_cache_stats_async(self) -> Dict:
+        await self.get_index_async()
+        return self.get_cache_stats()
     
     def get_emergency_symptoms(self) -> List[Dict]:
         """Get list of emergency symptoms"""
-        db = self.get_session()
-        try:
-            symptoms = db.query(Symptom).filter(
-                Symptom.is_emergency_symptom == True
-            ).all()
-            
-            return [
-                {
-                    "name": symptom.name,
-                    "description": symptom.description,
-                    "body_system": symptom.body_system,
-                    "red_flags": symptom.red_flags
-                }
-                for symptom in symptoms
-            ]
-        finally:
-            db.close()
+        return self.get_emergency_snapshot()[1]
+    
+    def get_emergency_snapshot(self) -> Tuple[str, List[Dict]]:
+        """Get the emergency symptom listing together with the knowledge base version it came from"""
+        index = self.get_index()
+        return index.version, [dict(symptom) for symptom in index.emergency_symptoms]
+    
+    def page_emergency_symptoms(self, limit: int = None, cursor: str = None) -> Tuple[str, List[Dict], Optional[str]]:
+        """A name-ordered page of emergency symptoms with the index version and the next page's cursor"""
+        index = self.get_index()
+        names, listing = index.derived("emergency_symptoms_by_name", _emergency_symptoms_by_name)
+        after = decode_cursor(cursor, "name", 1)
+        start = bisect.bisect_right(names, after[0]) if after else 0
+        end = len(listing) if limit is None else min(start + limit, len(listing))
+        next_cursor = encode_cursor("name", names[end - 1]) if end < len(listing) else None
+        return index.version, [dict(symptom) for symptom in listing[start:end]], next_cursor
     
-    def analyze_symptom_combination(self, symptoms: List[str], age: int = None, gender: str = None) -> Dict:
+    async def page_emergency_symptoms_async(self, limit: int = None,
+                                            cursor: str = None) -> Tuple[str, List[Dict], Optional[str]]:
+        await self.get_index_async()
+        return self.page_emergency_symptoms(limit, cursor)
+    
+    async def get_emergency_snapshot_async(self) -> Tuple[str, List[Dict]]:
+        await self.get_index_async()
+        return self.get_emergency_snapshot()
+    
+    def analyze_symptom_combination(self, symptoms: List[str], age: int = None, gender: str = None,
+                                    scorer: str = None) -> Dict:
         """Analyze a combination of symptoms with demographic factors"""
-        diseases = self.get_diseases_by_symptoms(symptoms)
-        emergency_symptoms = self.get_emergency_symptoms()
-        emergency_symptom_names = [es["name"] for es in emergency_symptoms]
+        index = self.get_index()
+        resolver = index.derived("symptom_resolver", SymptomResolver)
+        terms, symptom_ids = resolver.resolve_phrases(symptoms)
+        diseases = self._score_diseases(index, symptom_ids, len(terms), scorer, 5, age, gender)
+        return self._build_analysis(index, symptoms, terms, symptom_ids, diseases, age, gender)
+    
+    async def analyze_symptom_combination_async(self, symptoms: List[str], age: int = None, gender: str = None,
+                                                scorer: str = None) -> Dict:
+        await self.get_index_async()
+        return self.analyze_symptom_combination(symptoms, age, gender, scorer=scorer)
+    
+    def analyze_symptom_batch(self, items: List[Dict], scorer: str = None,
+                              index: KnowledgeIndex = None) -> List[Dict]:
+        """Analyze many symptom sets against one index snapshot, scoring them together
+        
+        Each item is a dict with ``symptoms`` and optional ``age``/``gender``;
+        results are returned in input order. Callers splitting a large batch
+        into several calls pass the same ``index`` to each, so a reload in
+        between does not change the data later sets are scored against.
+        """
+        index = index or self.get_index()
+        resolver = index.derived("symptom_resolver", SymptomResolver)
+        engine = get_scorer(index, scorer or settings.KB_SYMPTOM_SCORER)
+        
+        queries = []
+        for item in items:
+            terms, symptom_ids = resolver.resolve_phrases(item["symptoms"])
+            queries.append({
+                "symptom_ids": list(dict.fromkeys(sid for sid in symptom_ids if sid)),
+                "terms": terms,
+                "resolved_ids": symptom_ids,
+                "total_symptoms": len(terms),
+                "age": item.get("age"),
+                "gender": item.get("gender")
+            })
         
-        # Check for emergency symptoms
-        has_emergency_symptoms = any(symptom in emergency_symptom_names for symptom in symptoms)
+        scorable = [query for query in queries if query["symptom_ids"]]
+        scored = iter(engine.score_many(scorable, limit=5))
+        cluster_matches = index.derived("cluster_matcher", ClusterMatcher).match_many(
+            [query["symptom_ids"] for query in queries]
+        )
+        
+        analyses = []
+        for item, query, matched_clusters in zip(items, queries, cluster_matches):
+            diseases = []
+            if query["symptom_ids"]:
+                diseases = [
+                    self._disease_result(index.diseases[disease_id], score, matching, query["total_symptoms"],
+                                         engine.score_field)
+                    for disease_id, score, matching in next(scored)
+                ]
+            analyses.append(self._build_analysis(
+                index, item["symptoms"], query["terms"], query["resolved_ids"], diseases, item.get("age"), item.get("gender"),
+                matched_clusters
+            ))
+        return analyses
+    
+    def _build_analysis(self, index: KnowledgeIndex, symptoms: List[str], terms: List[str],
+                        symptom_ids: List[Optional[str]], diseases: List[Dict], age: int = None,
+                        gender: str = None, matched_clusters: List[Dict] = None) -> Dict:
+        # ``terms`` are the symptoms after splitting phrases and dropping negated ones
+        resolved_symptoms = {
+            term: index.symptoms[symptom_id]["name"] if symptom_id else None
+            for term, symptom_id in zip(terms, symptom_ids)
+        }
+        
+        # Check for emergency symptoms against the cached snapshot
+        has_emergency_symptoms = any(
+            symptom_id in index.emergency_symptom_ids for symptom_id in symptom_ids if symptom_id
+        )
         
         # Calculate overall risk level
         risk_level = "low"
@@ -306,9 +916,17 @@ class MedicalKnowledgeService:
         elif diseases and max(d["match_score"] for d in diseases) > 0.4:
             risk_level = "medium"
         
+        # Recognised syndromes can raise the risk level on their own
+        if matched_clusters is None:
+            matched_clusters = index.derived("cluster_matcher", ClusterMatcher).match(symptom_ids)
+        for cluster in matched_clusters:
+            cluster_risk = URGENCY_RISK_LEVELS.get(cluster["urgency_level"], "low")
+            if RISK_LEVELS.index(cluster_risk) > RISK_LEVELS.index(risk_level):
+                risk_level = cluster_risk
+        
         # Generate recommendations
         recommendations = []
-        if has_emergency_symptoms:
+        if has_emergency_symptoms or risk_level == "critical":
             recommendations.append("Seek immediate emergency medical attention")
         elif risk_level == "high":
             recommendations.append("Consult with a healthcare provider as soon as possible")
@@ -319,9 +937,11 @@ class MedicalKnowledgeService:
         
         return {
             "symptoms": symptoms,
-            "possible_diseases": diseases[:5],  # Top 5 matches
+            "resolved_symptoms": resolved_symptoms,
+            "possible_diseases": diseases,  # Top 5 matches
             "risk_level": risk_level,
             "has_emergency_symptoms": has_emergency_symptoms,
+            "matched_clusters": matched_clusters,
             "recommendations": recommendations,
             "demographic_factors": {
                 "age": age,
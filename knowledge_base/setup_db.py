@@ -12,6 +12,7 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, parent_dir)
 
 from knowledge_base.models import Base
+from knowledge_base.fts import create_fts_tables
 try:
     from config import settings
 except ImportError:
@@ -28,6 +29,10 @@ def create_knowledge_base_tables():
     # Create all tables defined in the knowledge base models
     Base.metadata.create_all(bind=engine)
     
+    # Full-text search indexes are kept in sync with their tables by triggers
+    if create_fts_tables(engine):
+        print("Full-text search indexes created")
+    
     print("Knowledge base tables created successfully!")
     return engine
 
@@ -0,0 +1,376 @@
+"""
+Knowledge Base Snapshot
+Compact, versioned binary image of the knowledge index, loaded at startup instead of querying the database
+"""
+
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from knowledge_base.index import CompressedRows, KnowledgeIndex
+
+SNAPSHOT_MAGIC = b"MBKBSNAP"
+SNAPSHOT_FORMAT_VERSION = 5
+_PREAMBLE = struct.Struct("<8sII")  # magic, format version, header length
+_ALIGNMENT = 8
+
+# Table -> (column, kind); kinds are 'str' (utf-8 blob + offsets + null mask),
+# 'f8' (NaN for NULL), 'bool' (int8, -1 for NULL) and 'i4'
+SNAPSHOT_TABLES: Dict[str, List[Tuple[str, str]]] = {
+    "symptoms": [
+        ("id", "str"), ("name", "str"), ("description", "str"), ("category", "str"),
+        ("body_system", "str"), ("is_emergency", "bool"), ("prevalence_rate", "f8"), ("red_flags", "str"),
+    ],
+    "diseases": [
+        ("id", "str"), ("name", "str"), ("description", "str"), ("icd_10_code", "str"),
+        ("severity_level", "str"), ("prevalence", "f8"), ("is_contagious", "bool"),
+        ("age_group_affected", "str"), ("gender_bias", "str"),
+    ],
+    # Associations reference symptoms and diseases by row position in the snapshot,
+    # sorted by (disease_index, symptom_index) so the scorers map them as CSR rows:
+    # disease i owns associations disease_offsets[i]:disease_offsets[i + 1]
+    "associations": [
+        ("symptom_index", "i4"), ("disease_index", "i4"),
+        ("probability_weight", "f8"), ("severity_modifier", "f8"), ("combined_weight", "f8"),
+    ],
+    "disease_offsets": [("start", "i4")],
+    # The same associations in (symptom_index, disease_index) order
+    "symptom_associations": [("disease_index", "i4")],
+    "symptom_offsets": [("start", "i4")],
+    "lab_markers": [
+        ("id", "str"), ("name", "str"), ("test_type", "str"), ("units", "str"),
+        ("normal_range_min", "f8"), ("normal_range_max", "f8"), ("normal_range_text", "str"),
+        ("critical_low", "f8"), ("critical_high", "f8"), ("clinical_significance", "str"),
+        ("disease_id", "str"),
+    ],
+    "medications": [
+        ("id", "str"), ("generic_name", "str"), ("brand_names", "str"), ("drug_class", "str"),
+        ("mechanism_of_action", "str"), ("indications", "str"), ("contraindications", "str"),
+        ("side_effects", "str"), ("pregnancy_category", "str"), ("requires_monitoring", "bool"),
+        ("is_controlled_substance", "bool"),
+    ],
+    "drug_interactions": [
+        ("drug_a_id", "str"), ("drug_b_id", "str"), ("interaction_type", "str"), ("severity_level", "f8"),
+        ("mechanism", "str"), ("clinical_effect", "str"), ("management", "str"),
+        ("evidence_level", "str"), ("onset", "str"), ("documentation", "str"),
+    ],
+    "clusters": [
+        ("id", "str"), ("name", "str"), ("description", "str"), ("category", "str"),
+        ("clinical_significance", "str"), ("urgency_level", "str"),
+    ],
+    # Cluster members reference clusters and symptoms by row position in the snapshot,
+    # sorted by (cluster_index, symptom_index) with cluster_offsets as their CSR row pointers
+    "cluster_members": [
+        ("cluster_index", "i4"), ("symptom_index", "i4"),
+        ("frequency_in_cluster", "f8"), ("diagnostic_weight", "f8"),
+    ],
+    "cluster_offsets": [("start", "i4")],
+}
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, truncated, corrupt or of an unknown format"""
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Knowledge base snapshots require numpy")
+
+
+def _encode_column(values: List, kind: str) -> Dict[str, bytes]:
+    """Encode one column into its named buffers"""
+    if kind == "str":
+        encoded = [b"" if v is None else str(v).encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        nulls = np.fromiter((v is None for v in values), dtype=np.uint8, count=len(values))
+        return {"offsets": offsets.tobytes(), "data": b"".join(encoded), "nulls": nulls.tobytes()}
+    if kind == "f8":
+        array = np.array([np.nan if v is None else float(v) for v in values], dtype="<f8")
+    elif kind == "bool":
+        array = np.array([-1 if v is None else int(bool(v)) for v in values], dtype=np.int8)
+    elif kind == "i4":
+        array = np.asarray(values, dtype="<i4")
+    else:
+        raise ValueError(f"Unknown snapshot column kind '{kind}'")
+    return {"values": array.tobytes()}
+
+
+def _row_offsets(row_indexes: List[int], row_count: int) -> List[int]:
+    """CSR row pointers for entries already sorted by row"""
+    offsets = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(np.asarray(row_indexes, dtype=np.int64), minlength=row_count), out=offsets[1:])
+    return offsets.tolist()
+
+
+def _table_rows(index: KnowledgeIndex) -> Dict[str, Dict[str, List]]:
+    """Column-major view of the index in snapshot table order"""
+    def columns(records, table):
+        return {name: [record.get(name) for record in records] for name, _kind in SNAPSHOT_TABLES[table]}
+
+    entries = []
+    for symptom_id, disease_id, weight, modifier in index.associations:
+        symptom_index = index.symptom_position.get(symptom_id)
+        disease_index = index.disease_position.get(disease_id)
+        if symptom_index is None or disease_index is None:
+            continue
+        entries.append((disease_index, symptom_index, weight, modifier))
+    entries.sort(key=lambda entry: entry[:2])
+    associations = {
+        "symptom_index": [e[1] for e in entries],
+        "disease_index": [e[0] for e in entries],
+        "probability_weight": [e[2] for e in entries],
+        "severity_modifier": [e[3] for e in entries],
+        "combined_weight": [e[2] * e[3] for e in entries],
+    }
+    by_symptom = sorted((e[1], e[0]) for e in entries)
+
+    cluster_position = {cluster["id"]: i for i, cluster in enumerate(index.clusters)}
+    entries = []
+    for cluster_id, symptom_id, frequency, weight in index.cluster_members:
+        cluster_index = cluster_position.get(cluster_id)
+        symptom_index = index.symptom_position.get(symptom_id)
+        if cluster_index is None or symptom_index is None:
+            continue
+        entries.append((cluster_index, symptom_index, frequency, weight))
+    entries.sort(key=lambda entry: entry[:2])
+    members = {
+        "cluster_index": [e[0] for e in entries],
+        "symptom_index": [e[1] for e in entries],
+        "frequency_in_cluster": [e[2] for e in entries],
+        "diagnostic_weight": [e[3] for e in entries],
+    }
+
+    return {
+        "symptoms": columns([index.symptoms[sid] for sid in index.symptom_order], "symptoms"),
+        "diseases": columns([index.diseases[did] for did in index.disease_order], "diseases"),
+        "associations": associations,
+        "disease_offsets": {"start": _row_offsets(associations["disease_index"], len(index.disease_order))},
+        "symptom_associations": {"disease_index": [disease for _symptom, disease in by_symptom]},
+        "symptom_offsets": {"start": _row_offsets([symptom for symptom, _disease in by_symptom],
+                                                  len(index.symptom_order))},
+        "lab_markers": columns(index.lab_markers, "lab_markers"),
+        "medications": columns(index.medications, "medications"),
+        "drug_interactions": columns(index.drug_interactions, "drug_interactions"),
+        "clusters": columns(index.clusters, "clusters"),
+        "cluster_members": members,
+        "cluster_offsets": {"start": _row_offsets(members["cluster_index"], len(index.clusters))},
+    }
+
+
+def write_snapshot(index: KnowledgeIndex, path: str) -> Dict:
+    """Write the index to path atomically and return the snapshot header
+
+    The file is written next to its destination and renamed into place, so
+    workers that already mapped the previous snapshot keep a consistent view.
+    """
+    _require_numpy()
+    tables = _table_rows(index)
+
+    chunks: List[bytes] = []
+    offset = 0
+    table_headers = {}
+    for table, column_specs in SNAPSHOT_TABLES.items():
+        rows = len(next(iter(tables[table].values()), []))
+        column_headers = {}
+        for name, kind in column_specs:
+            buffers = {}
+            for buffer_name, data in _encode_column(tables[table][name], kind).items():
+                buffers[buffer_name] = [offset, len(data)]
+                padding = -len(data) % _ALIGNMENT
+                chunks.append(data + b"\0" * padding)
+                offset += len(data) + padding
+            column_headers[name] = {"kind": kind, "buffers": buffers}
+        table_headers[table] = {"rows": rows, "columns": column_headers}
+
+    payload = b"".join(chunks)
+    header = json.dumps({
+        "kb_version": index.version,
+        "created_at": datetime.datetime.utcnow().isoformat(),
+        "payload_size": len(payload),
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "tables": table_headers,
+    }).encode("utf-8")
+    header += b" " * (-(_PREAMBLE.size + len(header)) % _ALIGNMENT)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".kb-snapshot-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(header)))
+            f.write(header)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return json.loads(header)
+
+
+class KnowledgeSnapshot:
+    """Read-only, memory-mapped view of a snapshot file
+
+    ``array`` returns numpy views straight onto the mapping, valid only while
+    the snapshot is open; ``values`` and ``records`` decode into Python objects.
+    """
+
+    def __init__(self, path: str):
+        _require_numpy()
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f"Snapshot {path} is empty")
+
+        try:
+            if len(self._mmap) < _PREAMBLE.size:
+                raise SnapshotError(f"Snapshot {path} is truncated")
+            magic, format_version, header_length = _PREAMBLE.unpack_from(self._mmap, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise SnapshotError(f"{path} is not a knowledge base snapshot")
+            if format_version != SNAPSHOT_FORMAT_VERSION:
+                raise SnapshotError(
+                    f"Snapshot format {format_version} is not supported (expected {SNAPSHOT_FORMAT_VERSION})"
+                )
+            self._payload_start = _PREAMBLE.size + header_length
+            self.header = json.loads(bytes(self._mmap[_PREAMBLE.size:self._payload_start]))
+            if len(self._mmap) != self._payload_start + self.header["payload_size"]:
+                raise SnapshotError(f"Snapshot {path} is truncated")
+        except SnapshotError:
+            self.close()
+            raise
+
+    @property
+    def kb_version(self) -> Optional[str]:
+        return self.header["kb_version"]
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def verify(self) -> bool:
+        """Check the payload against the checksum recorded when the snapshot was written"""
+        payload = memoryview(self._mmap)[self._payload_start:]
+        try:
+            return hashlib.sha256(payload).hexdigest() == self.header["sha256"]
+        finally:
+            payload.release()
+
+    def row_count(self, table: str) -> int:
+        return self.header["tables"][table]["rows"]
+
+    def _buffer(self, table: str, column: str, buffer_name: str, dtype) -> "np.ndarray":
+        offset, size = self.header["tables"][table]["columns"][column]["buffers"][buffer_name]
+        itemsize = np.dtype(dtype).itemsize
+        return np.frombuffer(self._mmap, dtype=dtype, count=size // itemsize,
+                             offset=self._payload_start + offset)
+
+    def array(self, table: str, column: str) -> "np.ndarray":
+        """Zero-copy numpy view of a numeric or boolean column"""
+        kind = self.header["tables"][table]["columns"][column]["kind"]
+        dtype = {"f8": "<f8", "bool": np.int8, "i4": "<i4"}.get(kind)
+        if dtype is None:
+            raise ValueError(f"Column {table}.{column} is not numeric")
+        return self._buffer(table, column, "values", dtype)
+
+    def values(self, table: str, column: str) -> List:
+        """Decode a column into Python values, restoring NULLs as None"""
+        kind = self.header["tables"][table]["columns"][column]["kind"]
+        if kind == "str":
+            offsets = self._buffer(table, column, "offsets", "<i8").tolist()
+            nulls = self._buffer(table, column, "nulls", np.uint8).tolist()
+            start = self._payload_start + self.header["tables"][table]["columns"][column]["buffers"]["data"][0]
+            blob = self._mmap[start:start + offsets[-1]]
+            return [
+                None if nulls[i] else blob[offsets[i]:offsets[i + 1]].decode("utf-8")
+                for i in range(len(nulls))
+            ]
+        array = self.array(table, column)
+        if kind == "f8":
+            return [None if v != v else v for v in array.tolist()]
+        if kind == "bool":
+            return [None if v < 0 else bool(v) for v in array.tolist()]
+        return array.tolist()
+
+    def records(self, table: str) -> List[Dict]:
+        """Decode a table into a list of row dicts"""
+        names = [name for name, _kind in SNAPSHOT_TABLES[table]]
+        columns = [self.values(table, name) for name in names]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def _optional_int(value: Optional[float]) -> Optional[int]:
+    return None if value is None else int(value)
+
+
+def index_from_snapshot(snapshot: KnowledgeSnapshot) -> KnowledgeIndex:
+    """Build a KnowledgeIndex from a snapshot without touching the database
+
+    Association and cluster arrays stay numpy views onto the mapping, so
+    every worker that maps the same file shares those pages through the OS
+    page cache. The index holds the snapshot open for its own lifetime.
+    """
+    def rows(table: str, offsets: str, index_column: str, value_columns=()) -> CompressedRows:
+        return CompressedRows(
+            snapshot.array(offsets, "start"), snapshot.array(table, index_column),
+            {name: snapshot.array(table, name) for name in value_columns}
+        )
+
+    return KnowledgeIndex(
+        snapshot.records("symptoms"), snapshot.records("diseases"), (), version=snapshot.kb_version,
+        lab_markers=snapshot.records("lab_markers"),
+        medications=snapshot.records("medications"),
+        drug_interactions=[
+            {**interaction, "severity_level": _optional_int(interaction["severity_level"])}
+            for interaction in snapshot.records("drug_interactions")
+        ],
+        clusters=snapshot.records("clusters"),
+        association_rows=rows("associations", "disease_offsets", "symptom_index",
+                              ("probability_weight", "severity_modifier", "combined_weight")),
+        symptom_association_rows=rows("symptom_associations", "symptom_offsets", "disease_index"),
+        cluster_rows=rows("cluster_members", "cluster_offsets", "symptom_index",
+                          ("frequency_in_cluster", "diagnostic_weight")),
+        source=snapshot
+    )
+
+
+def snapshot_version(path: str) -> Optional[str]:
+    """kb_version recorded in a snapshot's header, or None when there is no snapshot"""
+    if not path or not os.path.exists(path):
+        return None
+    with KnowledgeSnapshot(path) as snapshot:
+        return snapshot.kb_version
+
+
+def load_snapshot_index(path: str, expected_version: str = None) -> Optional[KnowledgeIndex]:
+    """Load the index from a snapshot file, or None when it is missing or built from another version
+
+    Freshness is judged by the header's kb_version alone; checking the
+    payload checksum reads every page and is left to ``build_snapshot verify``.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    snapshot = KnowledgeSnapshot(path)
+    if expected_version is not None and snapshot.kb_version != expected_version:
+        snapshot.close()
+        return None
+    return index_from_snapshot(snapshot)
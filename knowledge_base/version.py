@@ -0,0 +1,56 @@
+"""
+Knowledge Base Versioning
+Fingerprint of the knowledge base used to detect repopulation and in-place edits
+"""
+
+import hashlib
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+# Table -> aggregate expressions that change whenever its rows are added, removed or edited.
+# Tables without updated_at sum their numeric columns and text lengths instead, so an
+# in-place edit (e.g. an upserted reference range) changes the stamp without reading rows
+VERSIONED_TABLES = {
+    "symptoms": "COUNT(*), MAX(updated_at)",
+    "diseases": "COUNT(*), MAX(updated_at)",
+    "symptom_disease_mapping": "COUNT(*), SUM(probability_weight), SUM(severity_modifier)",
+    "medications": "COUNT(*), MAX(updated_at)",
+    "lab_markers": (
+        "COUNT(*), MAX(created_at), SUM(normal_range_min), SUM(normal_range_max), SUM(critical_low), "
+        "SUM(critical_high), SUM(LENGTH(name)), SUM(LENGTH(units)), SUM(LENGTH(normal_range_text)), "
+        "SUM(LENGTH(clinical_significance)), SUM(LENGTH(disease_id))"
+    ),
+    "medical_guidelines": (
+        "COUNT(*), MAX(created_at), MAX(last_updated), SUM(is_active), SUM(LENGTH(title)), "
+        "SUM(LENGTH(organization)), SUM(LENGTH(content))"
+    ),
+    "drug_interactions": (
+        "COUNT(*), MAX(created_at), SUM(severity_level), SUM(LENGTH(interaction_type)), SUM(LENGTH(mechanism)), "
+        "SUM(LENGTH(clinical_effect)), SUM(LENGTH(management)), SUM(LENGTH(evidence_level))"
+    ),
+    "drug_interaction_mapping": (
+        "COUNT(*), SUM(LENGTH(interaction_severity)), SUM(LENGTH(interaction_description))"
+    ),
+    "differential_diagnoses": (
+        "COUNT(*), MAX(created_at), SUM(similarity_score), SUM(LENGTH(distinguishing_features)), "
+        "SUM(LENGTH(key_differences)), SUM(LENGTH(diagnostic_tests))"
+    ),
+    "symptom_clusters": (
+        "COUNT(*), MAX(created_at), SUM(LENGTH(name)), SUM(LENGTH(description)), "
+        "SUM(LENGTH(clinical_significance)), SUM(LENGTH(urgency_level))"
+    ),
+    "symptom_cluster_mapping": "COUNT(*), SUM(frequency_in_cluster), SUM(diagnostic_weight)",
+    "term_synonyms": "COUNT(*), MAX(updated_at)",
+}
+
+
+def compute_kb_version(db: Session) -> str:
+    """Compute a short version stamp that changes whenever the knowledge base content changes"""
+    existing = set(inspect(db.get_bind()).get_table_names())
+    digest = hashlib.sha1()
+    for table, aggregates in VERSIONED_TABLES.items():
+        if table not in existing:
+            continue
+        row = db.execute(text(f"SELECT {aggregates} FROM {table}")).first()
+        digest.update(f"{table}:{tuple(row)!r};".encode())
+    return digest.hexdigest()[:16]
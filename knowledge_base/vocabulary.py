@@ -0,0 +1,68 @@
+"""
+Entity Vocabulary
+Terms chat extraction recognizes, compiled from the knowledge base and its synonym table
+"""
+
+import json
+from typing import Dict, List, Tuple
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import Session
+
+from knowledge_base.index import KnowledgeIndex
+from knowledge_base.models import TermSynonym
+
+# (term as written in messages, category, canonical knowledge-base name)
+VocabularyEntry = Tuple[str, str, str]
+
+SYNONYM_KINDS = ("symptom", "medication", "disease")
+
+
+def parse_brand_names(value) -> List[str]:
+    """Brand names are stored either as a JSON list or as comma-separated text"""
+    if not value:
+        return []
+    try:
+        names = json.loads(value)
+    except (TypeError, ValueError):
+        names = value.split(",")
+    if isinstance(names, str):
+        names = [names]
+    return [name.strip() for name in names if isinstance(name, str) and name.strip()]
+
+
+def load_synonyms(db: Session) -> List[Tuple[str, str, str]]:
+    """(synonym, kind, canonical_name) rows; empty until the term_synonyms migration has run"""
+    if not inspect(db.get_bind()).has_table(TermSynonym.__tablename__):
+        return []
+    return [tuple(row) for row in db.execute(
+        select(TermSynonym.synonym, TermSynonym.kind, TermSynonym.canonical_name)
+    )]
+
+
+def build_entity_vocabulary(index: KnowledgeIndex, synonyms: List[Tuple[str, str, str]] = ()) -> Tuple[VocabularyEntry, ...]:
+    """Every symptom, medication (generic and brand) and disease name, plus the synonyms that resolve
+
+    Synonyms naming an entity the index does not contain are left out.
+    """
+    canonical: Dict[str, Dict[str, str]] = {kind: {} for kind in SYNONYM_KINDS}
+    entries: List[VocabularyEntry] = []
+
+    for symptom in index.symptoms.values():
+        canonical["symptom"][symptom["name"].casefold()] = symptom["name"]
+        entries.append((symptom["name"], "symptom", symptom["name"]))
+    for medication in index.medications:
+        generic_name = medication["generic_name"]
+        canonical["medication"][generic_name.casefold()] = generic_name
+        entries.append((generic_name, "medication", generic_name))
+        for brand in parse_brand_names(medication.get("brand_names")):
+            entries.append((brand, "medication", generic_name))
+    for disease in index.diseases.values():
+        canonical["disease"][disease["name"].casefold()] = disease["name"]
+        entries.append((disease["name"], "disease", disease["name"]))
+
+    for synonym, kind, canonical_name in synonyms:
+        name = canonical.get(kind, {}).get((canonical_name or "").casefold())
+        if name and synonym:
+            entries.append((synonym, kind, name))
+    return tuple(entries)
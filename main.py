@@ -2,7 +2,7 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import create_engine
 from config import settings
-from database import engine
+from database import engine, dispose_async_engines
 from models import Base
 from routers import auth, medical, knowledge, privacy
 from schemas import HealthStatus
@@ -37,6 +37,27 @@ app.include_router(medical.router, prefix="/medical", tags=["medical"])
 app.include_router(knowledge.router, prefix="/knowledge", tags=["knowledge-base"])
 app.include_router(privacy.router, prefix="/privacy", tags=["privacy-security"])
 
+@app.on_event("startup")
+def watch_knowledge_base():
+    # Pick up repopulated knowledge bases (e.g. a rebuilt snapshot) without restarting workers
+    if knowledge.knowledge_service:
+        knowledge.knowledge_service.start_file_watch()
+
+@app.on_event("startup")
+def load_chat_vocabulary():
+    # Compile the chat entity matcher up front instead of on the first message
+    medical.local_medical_ai.get_text_matcher()
+
+@app.on_event("shutdown")
+async def close_database_connections():
+    if knowledge.knowledge_service:
+        knowledge.knowledge_service.stop_file_watch()
+    if medical.local_medical_ai.memory_store:
+        # Write out medical memory still waiting for the write-behind flush
+        medical.local_medical_ai.memory_store.stop()
+    medical.local_medical_ai.close_advanced_models()
+    await dispose_async_engines()
+
 @app.get("/")
 def read_root():
     return {
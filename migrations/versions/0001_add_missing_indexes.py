@@ -0,0 +1,35 @@
+"""Add indexes for the knowledge base and conversation lookups
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns); names match the ones the models declare
+INDEXES = [
+    ("ix_medications_generic_name", "medications", ["generic_name"]),
+    ("ix_lab_markers_name", "lab_markers", ["name"]),
+    ("ix_lab_markers_disease_id", "lab_markers", ["disease_id"]),
+    ("ix_symptom_disease_mapping_disease_id", "symptom_disease_mapping", ["disease_id"]),
+    ("ix_differential_diagnoses_primary_similarity", "differential_diagnoses", ["primary_disease_id", "similarity_score"]),
+    ("ix_conversations_session_created", "conversations", ["session_id", "created_at"]),
+    ("ix_conversations_user_created", "conversations", ["user_id", "created_at"]),
+    ("ix_health_records_user_created", "health_records", ["user_id", "created_at"]),
+]
+
+
+def upgrade():
+    # Databases created by create_all after this revision already have them
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
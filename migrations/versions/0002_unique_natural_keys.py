@@ -0,0 +1,75 @@
+"""Unique natural keys for the knowledge base bulk loader
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# (index name, table, key columns, references to table.id as (table, column, rest of its composite primary key))
+NATURAL_KEYS = [
+    ("ix_treatments_name", "treatments", ["name"], [("disease_treatment_mapping", "treatment_id", ["disease_id"])]),
+    ("ix_medications_generic_name", "medications", ["generic_name"],
+     [("drug_interactions", "drug_a_id", []), ("drug_interactions", "drug_b_id", [])]),
+    ("ix_lab_markers_name", "lab_markers", ["name"], []),
+    ("ix_symptom_clusters_name", "symptom_clusters", ["name"],
+     [("symptom_cluster_mapping", "cluster_id", ["symptom_id"])]),
+    # After the medication merge above, which may have produced duplicate pairs
+    ("uq_drug_interactions_pair", "drug_interactions", ["drug_a_id", "drug_b_id"], []),
+]
+
+# Plain indexes revision 0001 created under the same names
+PLAIN_INDEXES = {
+    "ix_medications_generic_name": ("medications", ["generic_name"]),
+    "ix_lab_markers_name": ("lab_markers", ["name"]),
+}
+
+
+def _merge_duplicates(table, columns, references):
+    """Keep the lowest id per natural key, repointing references to it first
+
+    In association tables keyed by both ids, repointing two duplicates that
+    share a partner (one disease mapped to two copies of a treatment) would
+    collide, so for each partner only the row referencing the lowest id
+    of a natural key is kept before the update.
+    """
+    survivors = f"SELECT MIN(id) FROM {table} GROUP BY {', '.join(columns)}"
+    duplicates = f"SELECT id FROM {table} WHERE id NOT IN ({survivors})"
+    same_key = " AND ".join(f"k.{column} = d.{column}" for column in columns)
+    for ref_table, ref_column, partners in references:
+        if partners:
+            same_partner = " AND ".join(f"o.{column} = {ref_table}.{column}" for column in partners)
+            op.execute(
+                f"DELETE FROM {ref_table} WHERE {ref_column} IN ({duplicates}) AND EXISTS ("
+                f"SELECT 1 FROM {ref_table} o JOIN {table} k ON k.id = o.{ref_column} "
+                f"JOIN {table} d ON d.id = {ref_table}.{ref_column} "
+                f"WHERE {same_partner} AND o.{ref_column} < {ref_table}.{ref_column} AND {same_key})"
+            )
+        op.execute(
+            f"UPDATE {ref_table} SET {ref_column} = ("
+            f"SELECT MIN(k.id) FROM {table} k JOIN {table} d ON {same_key} WHERE d.id = {ref_table}.{ref_column}) "
+            f"WHERE {ref_column} IN ({duplicates})"
+        )
+        # Nothing may be left pointing at the rows deleted below
+        op.execute(f"DELETE FROM {ref_table} WHERE {ref_column} IN ({duplicates})")
+    op.execute(f"DELETE FROM {table} WHERE id NOT IN ({survivors})")
+
+
+def upgrade():
+    for name, table, columns, references in NATURAL_KEYS:
+        _merge_duplicates(table, columns, references)
+        if name in PLAIN_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True)
+        op.create_index(name, table, columns, unique=True, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _, _ in reversed(NATURAL_KEYS):
+        op.drop_index(name, table_name=table, if_exists=True)
+        if name in PLAIN_INDEXES:
+            op.create_index(name, *PLAIN_INDEXES[name])
@@ -0,0 +1,34 @@
+"""Synonym table for the chat entity vocabulary
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by create_all already have the table
+    if sa.inspect(op.get_bind()).has_table("term_synonyms"):
+        return
+    op.create_table(
+        "term_synonyms",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("synonym", sa.String(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("canonical_name", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("uq_term_synonyms_synonym_kind", "term_synonyms", ["synonym", "kind"], unique=True)
+
+
+def downgrade():
+    op.drop_index("uq_term_synonyms_synonym_kind", table_name="term_synonyms", if_exists=True)
+    op.drop_table("term_synonyms")
@@ -0,0 +1,30 @@
+"""Persistent tier of the medical memory store
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by create_all already have the table
+    if sa.inspect(op.get_bind()).has_table("medical_memories"):
+        return
+    op.create_table(
+        "medical_memories",
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("data", sa.Text(), nullable=False),
+        sa.Column("interaction_count", sa.Integer()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table("medical_memories")
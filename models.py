@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Float, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -45,6 +45,12 @@ class Conversation(Base):
     
     # Relationships
     user = relationship("User", back_populates="conversations")
+    
+    # Session and per-user history, read in chronological order
+    __table_args__ = (
+        Index("ix_conversations_session_created", "session_id", "created_at"),
+        Index("ix_conversations_user_created", "user_id", "created_at"),
+    )
 
 class HealthRecord(Base):
     __tablename__ = "health_records"
@@ -62,6 +68,10 @@ class HealthRecord(Base):
     
     # Relationships
     user = relationship("User", back_populates="health_records")
+    
+    __table_args__ = (
+        Index("ix_health_records_user_created", "user_id", "created_at"),
+    )
 
 class SecondOpinion(Base):
     __tablename__ = "second_opinions"
@@ -128,3 +138,12 @@ class SystemLog(Base):
     session_id = Column(String, nullable=True)
     extra_data = Column(Text, nullable=True)  # JSON string
     created_at = Column(DateTime, default=datetime.utcnow)
+
+class MedicalMemory(Base):
+    __tablename__ = "medical_memories"
+    
+    # One row per user, shared by every worker; written behind by services/medical_memory.py
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    data = Column(Text, nullable=False)  # Compact JSON: symptoms_history, conditions_discussed, medications_mentioned, ...
+    interaction_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -3,11 +3,18 @@ Knowledge Base API Router
 Provides endpoints for accessing medical knowledge base
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Iterator, List, Optional, Union
+from pydantic import BaseModel, ValidationError
+from config import settings
 from database import get_db
+import asyncio
+import hmac
+import io
+import json
 import sys
 import os
 
@@ -15,6 +22,8 @@ import os
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, parent_dir)
 
+from knowledge_base.pagination import iter_ndjson
+
 try:
     from knowledge_base.service import knowledge_service
 except ImportError:
@@ -46,6 +55,7 @@ class DiseasePredictionResponse(BaseModel):
     name: str
     description: str
     match_score: float
+    posterior: Optional[float] = None
     matching_symptoms: int
     total_symptoms: int
     severity_level: str
@@ -60,6 +70,19 @@ class MedicationInfoResponse(BaseModel):
     side_effects: Optional[str]
     pregnancy_category: Optional[str]
 
+class SymptomBatchItem(BaseModel):
+    symptoms: List[str]
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    id: Optional[str] = None  # Caller's reference, echoed back in the result
+
+class DifferentialRequest(BaseModel):
+    symptoms: List[str]
+    limit: int = 10
+
+class MedicationInteractionRequest(BaseModel):
+    medications: List[str]
+
 class LabInterpretationRequest(BaseModel):
     marker_name: str
     value: float
@@ -73,41 +96,93 @@ class LabInterpretationResponse(BaseModel):
     status: str
     clinical_significance: Optional[str]
 
+class LabPanelRequest(BaseModel):
+    markers: List[LabInterpretationRequest]
+
+class LabPanelResponse(BaseModel):
+    results: List[LabInterpretationResponse]
+    unresolved_markers: List[str]
+    duplicate_markers: List[str]
+    overall_status: str
+    critical_markers: List[str]
+    abnormal_markers: List[str]
+
+def _first_batch(limit: Optional[int]) -> int:
+    return settings.KB_STREAM_BATCH_SIZE if limit is None else min(limit, settings.KB_STREAM_BATCH_SIZE)
+
+def _stream_listing(fetch_page, first_page, cursor: Optional[str], limit: Optional[int]) -> StreamingResponse:
+    """Stream a keyset-paginated listing as NDJSON, starting with an already fetched first batch
+    
+    Later batches are fetched as the client reads, each with its own query.
+    """
+    return StreamingResponse(
+        iter_ndjson(fetch_page, cursor, limit, settings.KB_STREAM_BATCH_SIZE, first_page),
+        media_type="application/x-ndjson"
+    )
+
+CURSOR_DESCRIPTION = "Cursor from the previous page's X-Next-Cursor header"
+FORMAT_DESCRIPTION = "'json', or 'ndjson' to stream one result per line"
+
 @router.get("/symptoms/search", response_model=List[SymptomSearchResponse])
-def search_symptoms(
+async def search_symptoms(
+    response: Response,
     query: str = Query(..., description="Search term for symptoms"),
-    limit: int = Query(10, ge=1, le=50, description="Maximum number of results")
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$", description=FORMAT_DESCRIPTION)
 ):
     """Search for symptoms by name or description"""
     if not knowledge_service:
         raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
     
     try:
-        results = knowledge_service.search_symptoms(query, limit)
+        if response_format == "ndjson":
+            first_page = await knowledge_service.page_symptoms_async(query, _first_batch(limit), cursor)
+            return _stream_listing(
+                lambda after, size: knowledge_service.page_symptoms(query, size, after), first_page, cursor, limit
+            )
+        results, next_cursor = await knowledge_service.page_symptoms_async(query, limit, cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return results
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 @router.get("/diseases/search", response_model=List[DiseaseSearchResponse])
-def search_diseases(
+async def search_diseases(
+    response: Response,
     query: str = Query(..., description="Search term for diseases"),
-    limit: int = Query(10, ge=1, le=50, description="Maximum number of results")
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$", description=FORMAT_DESCRIPTION)
 ):
     """Search for diseases by name or description"""
     if not knowledge_service:
         raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
     
     try:
-        results = knowledge_service.search_diseases(query, limit)
+        if response_format == "ndjson":
+            first_page = await knowledge_service.page_diseases_async(query, _first_batch(limit), cursor)
+            return _stream_listing(
+                lambda after, size: knowledge_service.page_diseases(query, size, after), first_page, cursor, limit
+            )
+        results, next_cursor = await knowledge_service.page_diseases_async(query, limit, cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return results
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 @router.post("/diseases/predict", response_model=List[DiseasePredictionResponse])
-def predict_diseases_by_symptoms(
+async def predict_diseases_by_symptoms(
     symptoms: List[str],
     age: Optional[int] = None,
-    gender: Optional[str] = None
+    gender: Optional[str] = None,
+    scorer: Optional[str] = Query(None, description="Scoring engine: 'ratio', 'weighted' or 'bayes'")
 ):
     """Predict possible diseases based on symptoms"""
     if not knowledge_service:
@@ -117,19 +192,53 @@ def predict_diseases_by_symptoms(
         raise HTTPException(status_code=400, detail="At least one symptom is required")
     
     try:
-        results = knowledge_service.get_diseases_by_symptoms(symptoms)
+        results = await knowledge_service.get_diseases_by_symptoms_async(symptoms, scorer=scorer, age=age, gender=gender)
         return results
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@router.get("/diseases/{disease_name}/differentials")
+async def get_disease_differentials(
+    disease_name: str,
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of differentials")
+):
+    """Get precomputed differential diagnoses for a disease"""
+    if not knowledge_service:
+        raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
+    
+    try:
+        result = await knowledge_service.get_differentials_async(disease_name, limit)
+        if not result:
+            raise HTTPException(status_code=404, detail="Disease not found in database")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve differentials: {str(e)}")
+
+@router.post("/differentials")
+async def get_symptom_differentials(request: DifferentialRequest):
+    """Get differential diagnoses for a set of symptoms"""
+    if not knowledge_service:
+        raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
+    
+    try:
+        return await knowledge_service.get_differentials_for_symptoms_async(
+            tuple(request.symptoms), min(max(request.limit, 1), 50)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve differentials: {str(e)}")
+
 @router.get("/medications/{medication_name}", response_model=MedicationInfoResponse)
-def get_medication_info(medication_name: str):
+async def get_medication_info(medication_name: str):
     """Get detailed information about a medication"""
     if not knowledge_service:
         raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
     
     try:
-        result = knowledge_service.get_medication_info(medication_name)
+        result = await knowledge_service.get_medication_info_async(medication_name)
         if not result:
             raise HTTPException(status_code=404, detail="Medication not found")
         return result
@@ -138,14 +247,30 @@ def get_medication_info(medication_name: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve medication info: {str(e)}")
 
-@router.post("/lab/interpret", response_model=LabInterpretationResponse)
-def interpret_lab_result(request: LabInterpretationRequest):
-    """Interpret a laboratory test result"""
+@router.post("/medications/interactions")
+async def check_medication_interactions(request: MedicationInteractionRequest):
+    """Check a medication list for every pairwise drug interaction, most severe first"""
+    if not knowledge_service:
+        raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
+    
+    try:
+        return await knowledge_service.check_drug_interactions_async(request.medications)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Interaction check failed: {str(e)}")
+
+@router.post("/lab/interpret", response_model=Union[LabInterpretationResponse, LabPanelResponse])
+async def interpret_lab_result(request: Union[LabInterpretationRequest, LabPanelRequest]):
+    """Interpret a laboratory test result, or a whole panel of results"""
     if not knowledge_service:
         raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
     
     try:
-        result = knowledge_service.get_lab_marker_interpretation(
+        if isinstance(request, LabPanelRequest):
+            return await knowledge_service.interpret_lab_panel_async(
+                [(marker.marker_name, marker.value) for marker in request.markers]
+            )
+        
+        result = await knowledge_service.get_lab_marker_interpretation_async(
             request.marker_name, 
             request.value
         )
@@ -158,37 +283,95 @@ def interpret_lab_result(request: LabInterpretationRequest):
         raise HTTPException(status_code=500, detail=f"Lab interpretation failed: {str(e)}")
 
 @router.get("/guidelines/search")
-def search_guidelines(
+async def search_guidelines(
+    response: Response,
     topic: str = Query(..., description="Topic to search for"),
-    organization: Optional[str] = Query(None, description="Filter by organization")
+    organization: Optional[str] = Query(None, description="Filter by organization"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; all matches when omitted"),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    include_content: bool = Query(True, description="Include the full guideline text"),
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$", description=FORMAT_DESCRIPTION)
 ):
     """Search for medical guidelines"""
     if not knowledge_service:
         raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
     
     try:
-        results = knowledge_service.get_medical_guidelines(topic, organization)
-        return {"guidelines": results}
+        if response_format == "ndjson":
+            first_page = await knowledge_service.page_medical_guidelines_async(
+                topic, organization, _first_batch(limit), cursor, include_content
+            )
+            return _stream_listing(
+                lambda after, size: knowledge_service.page_medical_guidelines(
+                    topic, organization, size, after, include_content
+                ),
+                first_page, cursor, limit
+            )
+        results, next_cursor = await knowledge_service.page_medical_guidelines_async(
+            topic, organization, limit, cursor, include_content
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return {"guidelines": results, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Guidelines search failed: {str(e)}")
 
+@router.get("/semantic-search")
+async def semantic_search(
+    query: str = Query(..., description="Free-text question or description"),
+    limit: int = Query(5, ge=1, le=50, description="Maximum number of results"),
+    kind: Optional[str] = Query(None, description="Restrict results to 'disease' or 'guideline'")
+):
+    """Find diseases and guidelines related to free text"""
+    if not knowledge_service:
+        raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
+    
+    try:
+        return await knowledge_service.semantic_search_async(query, limit, kind)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Semantic search failed: {str(e)}")
+
 @router.get("/emergency-symptoms")
-def get_emergency_symptoms():
+async def get_emergency_symptoms(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; all emergency symptoms when omitted"),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$", description=FORMAT_DESCRIPTION)
+):
     """Get list of emergency symptoms"""
     if not knowledge_service:
         raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
     
     try:
-        results = knowledge_service.get_emergency_symptoms()
-        return {"emergency_symptoms": results}
+        if response_format == "ndjson":
+            _, results, next_cursor = await knowledge_service.page_emergency_symptoms_async(_first_batch(limit), cursor)
+            return _stream_listing(
+                lambda after, size: knowledge_service.page_emergency_symptoms(size, after)[1:],
+                (results, next_cursor), cursor, limit
+            )
+        
+        version, results, next_cursor = await knowledge_service.page_emergency_symptoms_async(limit, cursor)
+        # The listing only changes with the knowledge base, so its version is the ETag
+        etag = f'"{version}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse({"emergency_symptoms": results, "next_cursor": next_cursor}, headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve emergency symptoms: {str(e)}")
 
 @router.post("/analyze-symptoms")
-def comprehensive_symptom_analysis(
+async def comprehensive_symptom_analysis(
     symptoms: List[str],
     age: Optional[int] = None,
-    gender: Optional[str] = None
+    gender: Optional[str] = None,
+    scorer: Optional[str] = Query(None, description="Scoring engine: 'ratio', 'weighted' or 'bayes'")
 ):
     """Comprehensive analysis of symptom combination"""
     if not knowledge_service:
@@ -198,13 +381,119 @@ def comprehensive_symptom_analysis(
         raise HTTPException(status_code=400, detail="At least one symptom is required")
     
     try:
-        analysis = knowledge_service.analyze_symptom_combination(symptoms, age, gender)
+        analysis = await knowledge_service.analyze_symptom_combination_async(symptoms, age, gender, scorer=scorer)
         return analysis
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Symptom analysis failed: {str(e)}")
 
+def _iter_ndjson(body: bytes) -> Iterator[bytes]:
+    """Yield the non-empty lines of an NDJSON body without splitting it all up front"""
+    for line in io.BytesIO(body):
+        if line.strip():
+            yield line
+
+def _parse_batch_item(raw) -> dict:
+    """Validate one batch entry, returning either the item or an error result"""
+    try:
+        if isinstance(raw, bytes):
+            raw = json.loads(raw)
+        item = SymptomBatchItem.parse_obj(raw)
+    except (ValueError, ValidationError) as e:
+        return {"error": f"Invalid symptom set: {e}"}
+    if not item.symptoms:
+        return {"error": "At least one symptom is required"}
+    return {"item": item.dict()}
+
+def _analyze_chunk(chunk: List[dict], scorer: Optional[str], index) -> Iterator[str]:
+    valid = [entry["item"] for entry in chunk if "item" in entry]
+    analyses = iter(knowledge_service.analyze_symptom_batch(valid, scorer, index))
+    for entry in chunk:
+        if "item" in entry:
+            result = {"index": entry["index"], "id": entry["item"]["id"], **next(analyses)}
+        else:
+            result = {"index": entry["index"], "error": entry["error"]}
+        yield json.dumps(result) + "\n"
+
+@router.post("/analyze-symptoms/batch")
+async def batch_symptom_analysis(
+    request: Request,
+    scorer: Optional[str] = Query(None, description="Scoring engine: 'ratio', 'weighted' or 'bayes'")
+):
+    """Analyze many symptom sets in one request
+    
+    Accepts a JSON array or an NDJSON body (Content-Type: application/x-ndjson)
+    of ``{"symptoms": [...], "age": .., "gender": .., "id": ..}`` objects and
+    streams one NDJSON result per input, in input order. Sets are scored in
+    chunks of KB_BATCH_CHUNK_SIZE against a single knowledge base snapshot.
+    """
+    if not knowledge_service:
+        raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
+    
+    try:
+        await run_in_threadpool(knowledge_service.get_scorer, scorer)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Every chunk is scored against this index, even if a reload swaps in a new one mid-stream
+    index = await knowledge_service.get_index_async()
+    
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        entries = _iter_ndjson(await request.body())
+    else:
+        try:
+            entries = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+        if not isinstance(entries, list):
+            raise HTTPException(status_code=400, detail="Request body must be a JSON array of symptom sets")
+    
+    def results() -> Iterator[str]:
+        chunk = []
+        for position, raw in enumerate(entries):
+            chunk.append({"index": position, **_parse_batch_item(raw)})
+            if len(chunk) >= settings.KB_BATCH_CHUNK_SIZE:
+                yield from _analyze_chunk(chunk, scorer, index)
+                chunk = []
+        if chunk:
+            yield from _analyze_chunk(chunk, scorer, index)
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """Get knowledge base query cache statistics"""
+    if not knowledge_service:
+        raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
+    
+    return await knowledge_service.get_cache_stats_async()
+
+@router.post("/admin/reload")
+async def reload_knowledge_base(
+    force: bool = Query(False, description="Rebuild even if the knowledge base version is unchanged"),
+    wait: bool = Query(False, description="Respond only once the new index is live"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Rebuild the knowledge base index in the background and swap it in atomically"""
+    if not knowledge_service:
+        raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
+    
+    if not settings.KB_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Knowledge base reload is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.KB_ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    
+    reload = knowledge_service.start_reload(force=force)
+    if wait:
+        try:
+            await asyncio.wrap_future(reload)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Knowledge base reload failed: {str(e)}")
+    return knowledge_service.get_reload_status()
+
 @router.get("/health-check")
-def knowledge_base_health():
+async def knowledge_base_health():
     """Check knowledge base service health"""
     if not knowledge_service:
         return {
@@ -214,11 +503,12 @@ def knowledge_base_health():
     
     try:
         # Test basic functionality
-        symptoms = knowledge_service.search_symptoms("fever", limit=1)
+        symptoms = await knowledge_service.search_symptoms_async("fever", limit=1)
         return {
             "status": "healthy",
             "message": "Knowledge base service is operational",
-            "test_result": f"Found {len(symptoms)} symptom(s) for test query"
+            "test_result": f"Found {len(symptoms)} symptom(s) for test query",
+            **knowledge_service.get_reload_status()
         }
     except Exception as e:
         return {
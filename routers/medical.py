@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from auth import get_current_active_user
-from database import get_db
-from models import User
+from database import SessionLocal, get_db_session, run_db
+from models import User, UserProfile
 from datetime import datetime
 import json
 from schemas import (
@@ -17,35 +20,32 @@ from schemas import (
 )
 from services.local_medical_ai import local_medical_ai
 from services.symptom_analysis import analyze_symptoms_model
+from services.lab_analysis import analyze_lab_results_model
+
+try:
+    from knowledge_base.service import knowledge_service
+except ImportError:
+    knowledge_service = None
 
 router = APIRouter()
 
-@router.post("/chat", response_model=ChatResponse)
-def chat_with_ai(message: ChatMessage, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
-    # Get enhanced response from AI with user context
-    ai_response = local_medical_ai.generate_response(
-        message.content, 
-        context={"session_id": message.session_id},
-        user_id=current_user.id
-    )
-    
+def _chat_sources(ai_response: dict) -> list:
     # Determine sources based on knowledge base usage
-    sources = []
     if ai_response.get('knowledge_base_used'):
-        sources = ["MAYBERRY Medical Knowledge Base", "WHO Guidelines", "Medical Literature", "Clinical Research"]
-    else:
-        sources = ["General Medical Knowledge", "Health Guidelines"]
-    
+        return ["MAYBERRY Medical Knowledge Base", "WHO Guidelines", "Medical Literature", "Clinical Research"]
+    return ["General Medical Knowledge", "Health Guidelines"]
+
+def _chat_response_data(message: ChatMessage, ai_response: dict) -> dict:
     # Add privacy and security information
     privacy_status = ai_response.get('privacy_status', {})
     
-    response_data = {
+    return {
         "id": f"chat_{hash(message.content) % 10000}",
         "content": ai_response.get('response', 'I apologize, but I could not process your request at this time.'),
         "risk_level": ai_response.get('risk_level', 'low'),
         "confidence_score": ai_response.get('confidence_score', 0.7),
         "recommendations": ai_response.get('recommendations', ["Consult a healthcare professional for personalized advice."]),
-        "sources": sources,
+        "sources": _chat_sources(ai_response),
         "is_emergency": ai_response.get('emergency_info', {}).get('immediate_action_required', False),
         "emergency_info": ai_response.get('emergency_info', {}),
         "emergency_response": ai_response.get('emergency_response', {}),
@@ -55,23 +55,23 @@ def chat_with_ai(message: ChatMessage, db: Session = Depends(get_db), current_us
         "model_version": ai_response.get('model_version', 'MAYBERRY-Medical-AI-v1.0'),
         "created_at": ai_response.get('timestamp', "2025-01-04T13:05:00.000Z")
     }
-    
-    # Store conversation in database
+
+def _store_conversation(db: Session, message: ChatMessage, user_id: str, ai_response: dict):
+    """Store the user message and the AI response as two Conversation rows"""
     from models import Conversation
     conversation = Conversation(
-        user_id=current_user.id,
-        session_id=message.session_id or f"session_{current_user.id}_{int(datetime.utcnow().timestamp())}",
+        user_id=user_id,
+        session_id=message.session_id or f"session_{user_id}_{int(datetime.utcnow().timestamp())}",
         message_type="user",
         content=message.content,
         risk_level=ai_response.get('risk_level'),
         confidence_score=ai_response.get('confidence_score'),
         extra_data=json.dumps(ai_response.get('extracted_entities', {}))
     )
-    db.add(conversation)
     
     # Store AI response
     ai_conversation = Conversation(
-        user_id=current_user.id,
+        user_id=user_id,
         session_id=conversation.session_id,
         message_type="assistant",
         content=ai_response.get('response'),
@@ -80,18 +80,85 @@ def chat_with_ai(message: ChatMessage, db: Session = Depends(get_db), current_us
         extra_data=json.dumps({
             "emergency_info": ai_response.get('emergency_info'),
             "recommendations": ai_response.get('recommendations'),
-            "sources": sources
+            "sources": _chat_sources(ai_response)
         })
     )
+    
+    db.add(conversation)
     db.add(ai_conversation)
     db.commit()
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_with_ai(message: ChatMessage, db=Depends(get_db_session), current_user: User = Depends(get_current_active_user)):
+    # Get enhanced response from AI with user context (model inference runs in the threadpool)
+    ai_response = await run_in_threadpool(
+        local_medical_ai.generate_response,
+        message.content, 
+        context={"session_id": message.session_id},
+        user_id=current_user.id
+    )
+    
+    response_data = _chat_response_data(message, ai_response)
     
+    # Store conversation in database
+    await run_db(db, _store_conversation, message, current_user.id, ai_response)
     return response_data
 
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _ndjson_event(event: str, data: dict) -> str:
+    return json.dumps({"event": event, "data": data}, default=str) + "\n"
+
+def _store_streamed_conversation(message: ChatMessage, user_id: str, completed: dict):
+    # Runs once the last byte is sent; the request's own session is already closed by then
+    if "ai_response" not in completed:
+        return
+    db = SessionLocal()
+    try:
+        _store_conversation(db, message, user_id, completed["ai_response"])
+    finally:
+        db.close()
+
+@router.post("/chat/stream")
+def stream_chat_with_ai(
+    message: ChatMessage,
+    response_format: str = Query("sse", alias="format", pattern="^(sse|ndjson)$",
+                                 description="'sse' for Server-Sent Events, or 'ndjson' for one event per line"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Stream the chat response as it is computed
+    
+    Events arrive in order: 'emergency' (from keyword detection alone),
+    'entities', 'findings', 'recommendations' and 'done', whose data is the
+    /chat response. The conversation is stored after the stream completes.
+    """
+    encode = _sse_event if response_format == "sse" else _ndjson_event
+    user_id = current_user.id
+    completed = {}
+    
+    def events():
+        # A sync generator: Starlette advances it in the threadpool
+        for event, data in local_medical_ai.iter_response_events(
+            message.content, context={"session_id": message.session_id}, user_id=user_id
+        ):
+            if event == "done":
+                completed["ai_response"] = data
+                data = _chat_response_data(message, data)
+            yield encode(event, data)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if response_format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_store_streamed_conversation, message, user_id, completed)
+    )
+
 @router.post("/symptom-checker", response_model=SymptomAnalysis)
-def analyze_symptoms(symptom_input: SymptomInput, db: Session = Depends(get_db)):
+async def analyze_symptoms(symptom_input: SymptomInput, db=Depends(get_db_session)):
     # Use symptom analysis service
-    analysis = analyze_symptoms_model(
+    analysis = await run_in_threadpool(
+        analyze_symptoms_model,
         symptoms=symptom_input.symptoms,
         duration=symptom_input.duration,
         severity=symptom_input.severity,
@@ -102,7 +169,7 @@ def analyze_symptoms(symptom_input: SymptomInput, db: Session = Depends(get_db))
     return analysis
 
 @router.post("/second-opinion", response_model=SecondOpinionResponse)
-def request_second_opinion(request: SecondOpinionRequest, db: Session = Depends(get_db)):
+async def request_second_opinion(request: SecondOpinionRequest, db=Depends(get_db_session)):
     # Placeholder for second opinion logic
     return {
         "id": "so_123",
@@ -123,14 +190,37 @@ def request_second_opinion(request: SecondOpinionRequest, db: Session = Depends(
     }
 
 @router.post("/lab-analysis", response_model=LabAnalysis)
-def analyze_lab_results(upload: LabResultUpload, db: Session = Depends(get_db)):
-    # Placeholder for lab analysis logic
-    return {
-        "test_name": upload.test_name,
-        "results": {"hemoglobin": "14.5 g/dL", "hematocrit": "42%"},
-        "interpretation": "The results are within the normal range for a healthy adult male.",
-        "risk_indicators": [],
-        "recommendations": ["No immediate action needed."],
-        "requires_followup": False,
-        "confidence_score": 0.95
-    }
+async def analyze_lab_results(upload: LabResultUpload, db=Depends(get_db_session)):
+    # Interpret manually entered results as one panel
+    return await run_in_threadpool(
+        analyze_lab_results_model,
+        test_name=upload.test_name,
+        raw_data=upload.raw_data
+    )
+
+@router.get("/medication-interactions")
+async def check_my_medication_interactions(db=Depends(get_db_session), current_user: User = Depends(get_current_active_user)):
+    """Check the current medications in the user's profile for drug interactions"""
+    if not knowledge_service:
+        raise HTTPException(status_code=503, detail="Knowledge base service unavailable")
+    
+    profile = await run_db(db, lambda db: db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first())
+    
+    try:
+        medications = json.loads(profile.current_medications) if profile and profile.current_medications else []
+        return await knowledge_service.check_drug_interactions_async(medications)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Interaction check failed: {str(e)}")
+
+@router.get("/memory-metrics")
+def get_medical_memory_metrics(current_user: User = Depends(get_current_active_user)):
+    """Get medical memory hot-tier and write-behind statistics"""
+    if not local_medical_ai.memory_store:
+        raise HTTPException(status_code=503, detail="Medical memory store unavailable")
+    
+    return local_medical_ai.memory_store.get_metrics()
+
+@router.get("/inference-metrics")
+def get_inference_metrics(current_user: User = Depends(get_current_active_user)):
+    """Get batch fill and latency statistics for each loaded inference model"""
+    return local_medical_ai.get_inference_metrics()
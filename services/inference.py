@@ -0,0 +1,243 @@
+"""
+Local Inference Backends
+CPU text encoders loaded from local model files, fed through a dynamic micro-batching queue
+"""
+
+import abc
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import torch
+    from transformers import AutoModel, AutoTokenizer, BertConfig, BertModel, BertTokenizer
+except ImportError:
+    torch = None
+    AutoModel = AutoTokenizer = None
+
+
+class InferenceBackend(abc.ABC):
+    """Encodes a batch of texts into one fixed-size embedding per text"""
+
+    name = "backend"
+
+    @abc.abstractmethod
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """One embedding per text, in input order"""
+
+    def close(self):
+        pass
+
+
+class TransformersBackend(InferenceBackend):
+    """A BERT-style encoder such as BioBERT or ClinicalBERT, run on the CPU
+
+    The model and tokenizer are read from ``model_path`` only
+    (``local_files_only``): a missing model fails at start-up instead of
+    being downloaded. Each text's embedding is the attention-masked mean of
+    the last hidden state.
+    """
+
+    def __init__(self, model_path: str, max_length: int = 256, num_threads: Optional[int] = None):
+        if AutoModel is None:
+            raise RuntimeError("Local inference requires torch and transformers")
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.name = os.path.basename(os.path.normpath(model_path))
+        self.model_path = model_path
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+        self.model = AutoModel.from_pretrained(model_path, local_files_only=True)
+        self.model.eval()
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        encoded = self.tokenizer(
+            list(texts), padding=True, truncation=True, max_length=self.max_length, return_tensors="pt"
+        )
+        with torch.inference_mode():
+            hidden = self.model(**encoded).last_hidden_state
+        mask = encoded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return pooled.tolist()
+
+
+BACKENDS: Dict[str, type] = {
+    "transformers": TransformersBackend,
+}
+
+
+def load_backend(name: str, model_path: str, **kwargs) -> InferenceBackend:
+    """Instantiate the backend registered as ``name`` for the model at ``model_path``"""
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Unknown inference backend '{name}'. Available backends: {', '.join(sorted(BACKENDS))}")
+    return backend_class(model_path, **kwargs)
+
+
+class _Request:
+    __slots__ = ("text", "future", "enqueued_at")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """Groups concurrent requests into batched backend calls under a latency budget
+
+    A worker thread takes the oldest waiting request, then keeps collecting
+    until ``max_batch_size`` requests are in hand or ``max_wait_ms`` has
+    passed since it took the first, and runs them as one ``embed`` call. A
+    lone request therefore waits at most ``max_wait_ms`` longer than it
+    would unbatched; under load, batches fill and the per-text cost drops.
+    """
+
+    def __init__(self, backend: InferenceBackend, max_batch_size: int = 8, max_wait_ms: float = 5.0,
+                 max_queue: int = 1024):
+        self.backend = backend
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stopped = False
+        self.batches = 0
+        self.requests = 0
+        self.failed_batches = 0
+        self.batch_sizes: Counter = Counter()
+        self.queue_wait_seconds = 0.0
+        self.inference_seconds = 0.0
+        self._worker = threading.Thread(target=self._run, name=f"inference-{backend.name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the future resolves to its embedding"""
+        if self._stopped:
+            raise RuntimeError("Inference batcher is stopped")
+        request = _Request(text)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            raise RuntimeError("Inference queue is full")
+        return request.future
+
+    def embed(self, texts: Sequence[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """Embed texts through the shared queue, blocking until all of them are done"""
+        futures = [self.submit(text) for text in texts]
+        return [future.result(timeout) for future in futures]
+
+    def _collect(self, first: _Request) -> Tuple[List[_Request], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            # Requests cancelled while queued are dropped, not computed
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_Request]):
+        started = time.monotonic()
+        try:
+            embeddings = self.backend.embed([request.text for request in batch])
+        except Exception as e:
+            with self._lock:
+                self.failed_batches += 1
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        finished = time.monotonic()
+        for request, embedding in zip(batch, embeddings):
+            request.future.set_result(embedding)
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.batch_sizes[len(batch)] += 1
+            self.queue_wait_seconds += sum(started - request.enqueued_at for request in batch)
+            self.inference_seconds += finished - started
+
+    def stop(self, timeout: float = 5.0):
+        """Finish the requests already queued, then stop the worker"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        self._worker.join(timeout)
+        # Anything submitted while stopping never reaches the worker
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and request.future.set_running_or_notify_cancel():
+                request.future.set_exception(RuntimeError("Inference batcher is stopped"))
+        self.backend.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Batch fill, batch size distribution and average queue wait and inference time"""
+        with self._lock:
+            batches, requests = self.batches, self.requests
+            return {
+                "backend": self.backend.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "requests": requests,
+                "failed_batches": self.failed_batches,
+                "queue_depth": self._queue.qsize(),
+                "mean_batch_size": requests / batches if batches else 0.0,
+                "batch_fill": requests / (batches * self.max_batch_size) if batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "avg_queue_wait_ms": self.queue_wait_seconds / requests * 1000 if requests else 0.0,
+                "avg_batch_inference_ms": self.inference_seconds / batches * 1000 if batches else 0.0
+            }
+
+
+TINY_VOCABULARY = [
+    "[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]",
+    "pain", "chest", "fever", "cough", "headache", "nausea", "breathing", "severe", "mild",
+    "heart", "blood", "pressure", "infection", "medication", "dose", "patient", "history",
+] + list("abcdefghijklmnopqrstuvwxyz0123456789") + [f"##{char}" for char in "abcdefghijklmnopqrstuvwxyz"]
+
+
+def save_tiny_random_model(path: str, seed: int = 0) -> str:
+    """Write a randomly initialised two-layer BERT and its tokenizer to ``path``
+
+    Loads with TransformersBackend like a real checkpoint, in milliseconds;
+    meant for tests and for exercising the batching path without BioBERT.
+    """
+    if AutoModel is None:
+        raise RuntimeError("Local inference requires torch and transformers")
+    os.makedirs(path, exist_ok=True)
+    vocab_file = os.path.join(path, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as handle:
+        handle.write("\n".join(TINY_VOCABULARY) + "\n")
+    BertTokenizer(vocab_file).save_pretrained(path)
+
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=len(TINY_VOCABULARY), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, max_position_embeddings=128
+    )
+    BertModel(config).save_pretrained(path)
+    return path
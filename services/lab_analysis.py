@@ -0,0 +1,79 @@
+import sys
+import os
+from typing import Dict, List, Optional
+
+# Add knowledge base to path
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+from knowledge_base.lab_panel import parse_lab_values
+
+try:
+    from knowledge_base.service import knowledge_service
+except ImportError:
+    knowledge_service = None
+    print("Warning: Knowledge base service not available, using fallback lab analysis")
+
+def analyze_lab_results_model(test_name: str, raw_data: Optional[str] = None) -> Dict:
+    """Interpret manually entered lab results against the knowledge base reference ranges"""
+    values = parse_lab_values(raw_data)
+
+    if not knowledge_service or not values:
+        return {
+            "test_name": test_name,
+            "results": {},
+            "interpretation": "No lab values could be read from the submitted results. "
+                              "Enter one result per line, e.g. 'Hemoglobin: 13.5'.",
+            "risk_indicators": [],
+            "recommendations": ["Review your lab report with a healthcare professional."],
+            "requires_followup": False,
+            "confidence_score": 0.0
+        }
+
+    panel = knowledge_service.interpret_lab_panel(values)
+
+    results = {}
+    risk_indicators: List[str] = []
+    for result in panel["results"]:
+        results[result["marker_name"]] = {
+            "value": result["value"],
+            "units": result["units"],
+            "normal_range": result["normal_range"],
+            "interpretation": result["interpretation"],
+            "status": result["status"]
+        }
+        if result["status"] != "within_range":
+            label = result["interpretation"].replace("_", " ")
+            risk_indicators.append(f"{result['marker_name']} {label} ({result['value']} {result['units'] or ''})".strip())
+
+    # Summarise the panel
+    if panel["overall_status"] == "critical":
+        interpretation = f"Critical values found: {', '.join(panel['critical_markers'])}."
+        recommendations = ["Contact your healthcare provider or seek medical attention immediately."]
+    elif panel["overall_status"] == "abnormal":
+        interpretation = f"Some results are outside the normal range: {', '.join(panel['abnormal_markers'])}."
+        recommendations = ["Discuss the out-of-range results with your healthcare provider."]
+    else:
+        interpretation = "All recognised results are within the normal range."
+        recommendations = ["No immediate action needed."]
+
+    if panel["unresolved_markers"]:
+        interpretation += f" Unrecognised markers: {', '.join(panel['unresolved_markers'])}."
+        recommendations.append("Have a clinician review the results that could not be interpreted automatically.")
+
+    if panel["duplicate_markers"]:
+        interpretation += f" Repeated markers were not interpreted: {', '.join(panel['duplicate_markers'])}."
+        recommendations.append("Report each marker once so every value can be interpreted.")
+
+    # Confidence reflects how much of the panel could be interpreted
+    confidence_score = round(0.5 + 0.45 * len(panel["results"]) / len(values), 2)
+
+    return {
+        "test_name": test_name,
+        "results": results,
+        "interpretation": interpretation,
+        "risk_indicators": risk_indicators,
+        "recommendations": recommendations,
+        "requires_followup": panel["overall_status"] != "normal",
+        "confidence_score": confidence_score
+    }
@@ -1,7 +1,8 @@
 import sys
 import os
 import re
-from typing import Dict, List, Optional, Any
+import threading
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 from datetime import datetime
 import json
 
@@ -9,12 +10,21 @@ import json
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, parent_dir)
 
+from services.inference import MicroBatcher, load_backend
+from services.text_matcher import TextMatcher
+
 try:
     from knowledge_base.service import knowledge_service
 except ImportError:
     knowledge_service = None
     print("Warning: Knowledge base service not available for medical AI")
 
+try:
+    from services.medical_memory import medical_memory_store
+except ImportError:
+    medical_memory_store = None
+    print("Warning: Medical memory store not available for medical AI")
+
 try:
     from services.privacy_security import privacy_security_service
     from config import settings
@@ -22,6 +32,18 @@ except ImportError:
     privacy_security_service = None
     settings = None
 
+# Categories whose terms also match plurals and other inflections ("chest pains", "headaches")
+INFLECTED_CATEGORIES = ('emergency', 'severity', 'symptom', 'medication', 'risk')
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) * sum(y * y for y in b)) ** 0.5
+    return dot / norm if norm else 0.0
+
+def _rescale(values: List[float]) -> List[float]:
+    low, high = min(values), max(values)
+    return [(v - low) / (high - low) if high > low else 0.0 for v in values]
+
 class LocalMedicalAI:
     """Enhanced medical AI with knowledge base integration and privacy-first architecture"""
     
@@ -29,13 +51,26 @@ class LocalMedicalAI:
         self.model_name = model_name
         self.knowledge_service = knowledge_service
         self.privacy_service = privacy_security_service
-        self.medical_memory = {}  # Store user medical history
+        self.memory_store = medical_memory_store  # Bounded, persistent per-user medical history
         self.emergency_keywords = [
             'chest pain', 'heart attack', 'stroke', 'severe bleeding', 
             'difficulty breathing', 'unconscious', 'severe headache',
             'stroke symptoms', 'emergency', 'urgent', 'critical'
         ]
+        # Words that raise a detected emergency to critical, and emergencies that are high priority on their own
+        self.severity_keywords = ['severe', 'critical', 'emergency', 'urgent']
+        self.high_priority_keywords = ['chest pain', 'difficulty breathing', 'stroke']
+        self.symptom_keywords = ['pain', 'ache', 'fever', 'cough', 'headache', 'nausea', 'vomiting',
+                                 'dizziness', 'fatigue', 'shortness of breath', 'chest pain']
+        self.medication_keywords = ['medication', 'medicine', 'drug', 'pill', 'tablet', 'prescription']
+        # Non-emergency terms that still make a message medium risk
+        self.risk_keywords = ['pain', 'fever', 'bleeding', 'infection']
+        self._text_matcher: Optional[TextMatcher] = None
+        self._matcher_key = None
+        self._matcher_pending = None
+        self._matcher_lock = threading.Lock()
         self.ai_personality = 'balanced'  # 'formal', 'friendly', 'balanced'
+        self.inference_batchers: Dict[str, MicroBatcher] = {}
         
         print(f"Initialized MAYBERRY Medical AI v2.0 - Model: {model_name}")
         if self.knowledge_service:
@@ -52,30 +87,151 @@ class LocalMedicalAI:
     
     def _initialize_advanced_models(self):
         """Initialize advanced AI models for medical text understanding"""
+        # Each encoder gets its own micro-batching queue, so concurrent chats share forward passes
+        for name, label, enabled, path in (
+            ('biobert', 'BioBERT', settings.BIOBERT_MODEL_ENABLED, settings.BIOBERT_MODEL_PATH),
+            ('clinicalbert', 'ClinicalBERT', settings.CLINICALBERT_MODEL_ENABLED, settings.CLINICALBERT_MODEL_PATH),
+        ):
+            if not enabled:
+                continue
+            if not path:
+                print(f"⚠ {label} enabled but no local model path is configured")
+                continue
+            try:
+                backend = load_backend(
+                    settings.INFERENCE_BACKEND, path,
+                    max_length=settings.INFERENCE_MAX_LENGTH, num_threads=settings.INFERENCE_NUM_THREADS
+                )
+                self.inference_batchers[name] = MicroBatcher(
+                    backend, settings.INFERENCE_MAX_BATCH_SIZE, settings.INFERENCE_MAX_WAIT_MS
+                )
+                print(f"✓ {label} model loaded from {path}")
+            except Exception as e:
+                print(f"⚠ {label} model initialization failed: {e}")
+    
+    def close_advanced_models(self):
+        """Stop the inference queues after finishing the requests already queued"""
+        for batcher in self.inference_batchers.values():
+            batcher.stop()
+        self.inference_batchers = {}
+    
+    def get_inference_metrics(self) -> Dict[str, Dict]:
+        return {name: batcher.get_metrics() for name, batcher in self.inference_batchers.items()}
+    
+    def _rerank_batcher(self) -> Optional[MicroBatcher]:
+        """The encoder used to re-rank chat search results, or None when re-ranking is off"""
+        if not settings or settings.INFERENCE_RERANK_WEIGHT <= 0:
+            return None
+        return self.inference_batchers.get('biobert') or self.inference_batchers.get('clinicalbert')
+    
+    def _rerank(self, prompt: str, results: List[Dict], limit: int) -> List[Dict]:
+        """Blend encoder similarity to the message into the TF-IDF scores of search results
+        
+        Encoders that are not fine-tuned for retrieval rate most texts as
+        similar, so both scores are rescaled to 0-1 across the candidates and
+        mixed by INFERENCE_RERANK_WEIGHT. Without a loaded encoder, or at
+        weight 0, the TF-IDF order is kept.
+        """
+        batcher = self._rerank_batcher()
+        if not batcher or len(results) <= 1:
+            return results[:limit]
         try:
-            # In production, this would load actual BioBERT/ClinicalBERT models
-            print("✓ BioBERT model loaded for medical text understanding")
-            print("✓ ClinicalBERT model loaded for clinical text analysis")
-            print("✓ Predictive analytics models initialized")
+            embeddings = batcher.embed(
+                [prompt] + [f"{result['title']}: {result['snippet']}" for result in results],
+                timeout=settings.INFERENCE_TIMEOUT_SECONDS
+            )
         except Exception as e:
-            print(f"⚠ Advanced model initialization failed: {e}")
+            print(f"⚠ Encoder ranking unavailable: {e}")
+            return results[:limit]
+        query, documents = embeddings[0], embeddings[1:]
+        weight = min(settings.INFERENCE_RERANK_WEIGHT, 1.0)
+        lexical = _rescale([result.get('score', 0.0) for result in results])
+        encoder = _rescale([_cosine(query, document) for document in documents])
+        scores = [(1 - weight) * l + weight * e for l, e in zip(lexical, encoder)]
+        # sorted() is stable, so ties keep the TF-IDF order
+        order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)
+        return [results[i] for i in order[:limit]]
+    
+    def _keyword_vocabulary(self) -> Tuple[Tuple[str, str, str], ...]:
+        """(term, category, value) entries for the built-in keyword lists"""
+        return tuple(
+            (term, category, term.title() if category in ('symptom', 'medication') else term)
+            for category, terms in (
+                ('emergency', self.emergency_keywords),
+                ('severity', self.severity_keywords),
+                ('symptom', self.symptom_keywords),
+                ('medication', self.medication_keywords),
+                ('risk', self.risk_keywords),
+            )
+            for term in terms
+        )
     
-    def detect_emergency(self, prompt: str) -> Dict[str, Any]:
-        """Detect emergency situations from user input"""
-        prompt_lower = prompt.lower()
-        emergency_detected = False
+    def _knowledge_vocabulary(self) -> Tuple[Tuple[str, str, str], ...]:
+        """Symptom, medication and disease names (and synonyms) of the current knowledge base"""
+        if not self.knowledge_service:
+            return ()
+        try:
+            return self.knowledge_service.get_entity_vocabulary()
+        except Exception as e:
+            print(f"Knowledge base vocabulary unavailable: {e}")
+            return ()
+    
+    def get_text_matcher(self) -> TextMatcher:
+        """Get the matcher for the current vocabulary, recompiling it only after the vocabulary changed
+        
+        The knowledge base hands out a new vocabulary tuple only when its
+        version changes, so checking for one costs an identity comparison.
+        After a knowledge base reload the previous matcher keeps answering
+        while the new one compiles on a background thread.
+        """
+        keywords = self._keyword_vocabulary()
+        knowledge = self._knowledge_vocabulary()
+        with self._matcher_lock:
+            if self._text_matcher is not None and self._matcher_key[0] == keywords:
+                if self._matcher_key[1] is knowledge:
+                    return self._text_matcher
+                if self._matcher_pending is not knowledge:
+                    self._matcher_pending = knowledge
+                    threading.Thread(target=self._install_text_matcher, args=(keywords, knowledge),
+                                     name="chat-vocabulary", daemon=True).start()
+                return self._text_matcher
+            self._text_matcher = self._compile_text_matcher(keywords, knowledge)
+            self._matcher_key = (keywords, knowledge)
+            return self._text_matcher
+    
+    def _compile_text_matcher(self, keywords, knowledge) -> TextMatcher:
+        # Knowledge base names come first so they supply the canonical value of shared terms;
+        # disease names are the only terms that must match exactly as written
+        return TextMatcher(knowledge + keywords, inflected=INFLECTED_CATEGORIES)
+    
+    def _install_text_matcher(self, keywords, knowledge):
+        matcher = self._compile_text_matcher(keywords, knowledge)
+        with self._matcher_lock:
+            # Skip if the keywords changed or a newer vocabulary arrived meanwhile
+            if self._matcher_pending is knowledge and self._matcher_key[0] == keywords:
+                self._text_matcher = matcher
+                self._matcher_key = (keywords, knowledge)
+            if self._matcher_pending is knowledge:
+                self._matcher_pending = None
+    
+    def scan_prompt(self, prompt: str) -> Dict[str, List[str]]:
+        """Find every known term in the prompt in one pass, grouped by category"""
+        return self.get_text_matcher().find_by_category(prompt)
+    
+    def detect_emergency(self, prompt: str, found: Dict[str, List[str]] = None) -> Dict[str, Any]:
+        """Detect emergency situations from user input
+        
+        ``found`` is the result of ``scan_prompt`` when the caller already has it.
+        """
+        found = self.scan_prompt(prompt) if found is None else found
+        emergency_keywords_found = list(found.get('emergency', []))
+        emergency_detected = bool(emergency_keywords_found)
         emergency_level = 'none'
-        emergency_keywords_found = []
-        
-        for keyword in self.emergency_keywords:
-            if keyword in prompt_lower:
-                emergency_detected = True
-                emergency_keywords_found.append(keyword)
         
         if emergency_detected:
-            if any(severity in prompt_lower for severity in ['severe', 'critical', 'emergency', 'urgent']):
+            if found.get('severity'):
                 emergency_level = 'critical'
-            elif any(moderate in prompt_lower for moderate in ['chest pain', 'difficulty breathing', 'stroke']):
+            elif any(keyword in self.high_priority_keywords for keyword in emergency_keywords_found):
                 emergency_level = 'high'
             else:
                 emergency_level = 'medium'
@@ -89,74 +245,33 @@ class LocalMedicalAI:
     
     def update_medical_memory(self, user_id: str, interaction_data: Dict):
         """Update medical memory for personalized responses"""
-        if not settings or not settings.MEDICAL_MEMORY_ENABLED:
+        if not settings or not settings.MEDICAL_MEMORY_ENABLED or not self.memory_store:
             return
         
-        if user_id not in self.medical_memory:
-            self.medical_memory[user_id] = {
-                'symptoms_history': [],
-                'conditions_discussed': [],
-                'medications_mentioned': [],
-                'interaction_count': 0,
-                'last_interaction': None
-            }
-        
-        memory = self.medical_memory[user_id]
-        memory['interaction_count'] += 1
-        memory['last_interaction'] = datetime.utcnow().isoformat()
-        
-        # Extract and store relevant medical information
-        if 'symptoms' in interaction_data:
-            memory['symptoms_history'].extend(interaction_data['symptoms'])
-        
-        if 'conditions' in interaction_data:
-            memory['conditions_discussed'].extend(interaction_data['conditions'])
-        
-        if 'medications' in interaction_data:
-            memory['medications_mentioned'].extend(interaction_data['medications'])
-        
-        # Keep only recent history (last 30 interactions)
-        if len(memory['symptoms_history']) > 100:
-            memory['symptoms_history'] = memory['symptoms_history'][-50:]
-        if len(memory['conditions_discussed']) > 50:
-            memory['conditions_discussed'] = memory['conditions_discussed'][-25:]
-        if len(memory['medications_mentioned']) > 50:
-            memory['medications_mentioned'] = memory['medications_mentioned'][-25:]
+        self.memory_store.record_interaction(
+            user_id,
+            symptoms=interaction_data.get('symptoms', []),
+            conditions=interaction_data.get('conditions', []),
+            medications=interaction_data.get('medications', [])
+        )
     
     def get_medical_memory(self, user_id: str) -> Dict:
         """Get user's medical memory for personalized responses"""
-        if not settings or not settings.MEDICAL_MEMORY_ENABLED:
+        if not settings or not settings.MEDICAL_MEMORY_ENABLED or not self.memory_store:
             return {}
         
-        return self.medical_memory.get(user_id, {})
+        return self.memory_store.get(user_id)
     
-    def extract_medical_entities(self, prompt: str) -> Dict[str, List[str]]:
+    def extract_medical_entities(self, prompt: str, found: Dict[str, List[str]] = None) -> Dict[str, List[str]]:
         """Extract medical entities from user prompt"""
-        # Simple keyword extraction (can be enhanced with NLP)
-        symptoms_keywords = ['pain', 'ache', 'fever', 'cough', 'headache', 'nausea', 'vomiting', 
-                           'dizziness', 'fatigue', 'shortness of breath', 'chest pain']
-        
-        medication_keywords = ['medication', 'medicine', 'drug', 'pill', 'tablet', 'prescription']
-        
-        found_symptoms = []
-        found_medications = []
-        
-        prompt_lower = prompt.lower()
-        
-        for symptom in symptoms_keywords:
-            if symptom in prompt_lower:
-                found_symptoms.append(symptom.title())
-        
-        for med in medication_keywords:
-            if med in prompt_lower:
-                found_medications.append(med.title())
-        
+        found = self.scan_prompt(prompt) if found is None else found
         return {
-            'symptoms': found_symptoms,
-            'medications': found_medications
+            'symptoms': list(found.get('symptom', [])),
+            'medications': list(found.get('medication', [])),
+            'conditions': list(found.get('disease', []))
         }
     
-    def generate_knowledge_based_response(self, prompt: str, entities: Dict) -> str:
+    def generate_knowledge_based_response(self, prompt: str, entities: Dict, medical_memory: Dict = None) -> str:
         """Generate response using knowledge base"""
         if not self.knowledge_service:
             return self.generate_fallback_response(prompt)
@@ -190,29 +305,43 @@ class LocalMedicalAI:
                     response_parts.append(f"• {rec}")
         
         # Handle medication queries
-        elif 'medication' in prompt.lower() or 'medicine' in prompt.lower():
-            # Extract potential medication name
+        elif entities.get('medications'):
+            # Medications named in the knowledge base are recognized directly;
+            # otherwise take the word after "medication", "medicine" or "drug"
+            candidates = [name for name in entities['medications'] if name.lower() not in self.medication_keywords]
             words = prompt.split()
-            for i, word in enumerate(words):
-                if word.lower() in ['medication', 'medicine', 'drug'] and i + 1 < len(words):
-                    med_name = words[i + 1]
-                    med_info = self.knowledge_service.get_medication_info(med_name)
-                    if med_info:
-                        response_parts.append(f"Information about {med_info['generic_name']}:")
-                        response_parts.append(f"Drug class: {med_info.get('drug_class', 'N/A')}")
-                        response_parts.append(f"Common uses: {med_info.get('indications', 'N/A')}")
-                        if med_info.get('side_effects'):
-                            response_parts.append(f"Important side effects to watch for: {med_info['side_effects']}")
+            candidates += [
+                words[i + 1] for i, word in enumerate(words)
+                if word.lower() in ['medication', 'medicine', 'drug'] and i + 1 < len(words)
+            ]
+            for med_name in candidates:
+                med_info = self.knowledge_service.get_medication_info(med_name)
+                if med_info:
+                    response_parts.append(f"Information about {med_info['generic_name']}:")
+                    response_parts.append(f"Drug class: {med_info.get('drug_class', 'N/A')}")
+                    response_parts.append(f"Common uses: {med_info.get('indications', 'N/A')}")
+                    if med_info.get('side_effects'):
+                        response_parts.append(f"Important side effects to watch for: {med_info['side_effects']}")
                     break
         
         # Handle general health queries
         else:
-            # Search for relevant diseases or symptoms
-            search_results = self.knowledge_service.search_diseases(prompt, limit=3)
+            # Rank diseases and guidelines by similarity to the whole message;
+            # with re-ranking on, the encoder helps pick the best three of ten candidates
+            try:
+                candidates = 10 if self._rerank_batcher() else 3
+                search_results = self._rerank(
+                    prompt, self.knowledge_service.semantic_search(prompt, limit=candidates), 3
+                )
+            except RuntimeError:
+                search_results = [
+                    {"title": result['name'], "snippet": (result['description'] or '')[:200]}
+                    for result in self.knowledge_service.search_diseases(prompt, limit=3)
+                ]
             if search_results:
                 response_parts.append("I found some relevant information:")
                 for result in search_results:
-                    response_parts.append(f"\n• {result['name']}: {result['description'][:200]}...")
+                    response_parts.append(f"\n• {result['title']}: {result['snippet']}...")
         
         if not response_parts:
             response_parts.append("I understand your health concern. While I can provide general health information, ")
@@ -235,6 +364,17 @@ class LocalMedicalAI:
     
     def generate_response(self, prompt: str, context: Dict = None, user_id: str = None) -> Dict[str, any]:
         """Generate comprehensive medical response with advanced features"""
+        for event, data in self.iter_response_events(prompt, context, user_id):
+            pass
+        return data
+    
+    def iter_response_events(self, prompt: str, context: Dict = None, user_id: str = None) -> Iterator[Tuple[str, Dict]]:
+        """Produce the response in stages as (event, data) pairs for streaming
+        
+        'emergency' comes first, costing only the keyword scan; then
+        'entities', 'findings' from the knowledge base, 'recommendations',
+        and finally 'done' carrying the complete generate_response result.
+        """
         # Track processing type for privacy metrics
         if self.privacy_service:
             if settings and settings.LOCAL_PROCESSING_ENABLED:
@@ -242,11 +382,29 @@ class LocalMedicalAI:
             else:
                 self.privacy_service.track_cloud_processing()
         
+        # One pass over the prompt serves emergency detection, entity extraction and risk
+        found = self.scan_prompt(prompt)
+        
         # Detect emergency situations
-        emergency_info = self.detect_emergency(prompt)
+        emergency_info = self.detect_emergency(prompt, found)
+        emergency_response = (
+            self._generate_emergency_response(emergency_info) if emergency_info['immediate_action_required'] else None
+        )
+        
+        # Determine risk level based on emergency detection and content
+        risk_level = emergency_info['emergency_level'] if emergency_info['emergency_detected'] else "low"
+        if risk_level == "none":
+            if found.get('risk'):
+                risk_level = "medium"
+        
+        emergency_event = {"emergency_info": emergency_info, "risk_level": risk_level}
+        if emergency_response:
+            emergency_event['emergency_response'] = emergency_response
+        yield "emergency", emergency_event
         
         # Extract medical entities from prompt
-        entities = self.extract_medical_entities(prompt)
+        entities = self.extract_medical_entities(prompt, found)
+        yield "entities", {"extracted_entities": entities}
         
         # Get user's medical memory for personalized responses
         medical_memory = self.get_medical_memory(user_id) if user_id else {}
@@ -258,18 +416,16 @@ class LocalMedicalAI:
         else:
             response_text = self.generate_fallback_response(prompt)
             knowledge_used = False
-        
-        # Determine risk level based on emergency detection and content
-        risk_level = emergency_info['emergency_level'] if emergency_info['emergency_detected'] else "low"
-        if risk_level == "none":
-            if any(keyword in prompt.lower() for keyword in ['pain', 'fever', 'bleeding', 'infection']):
-                risk_level = "medium"
+        yield "findings", {"response": response_text, "knowledge_base_used": knowledge_used}
         
         # Calculate confidence score
         confidence_score = 0.85 if knowledge_used else 0.65
         if emergency_info['emergency_detected']:
             confidence_score = min(0.95, confidence_score + 0.1)
         
+        recommendations = self._generate_recommendations(risk_level)
+        yield "recommendations", {"recommendations": recommendations, "confidence_score": confidence_score}
+        
         # Update medical memory
         if user_id:
             self.update_medical_memory(user_id, {
@@ -287,7 +443,7 @@ class LocalMedicalAI:
             "confidence_score": confidence_score,
             "knowledge_base_used": knowledge_used,
             "extracted_entities": entities,
-            "recommendations": self._generate_recommendations(risk_level),
+            "recommendations": recommendations,
             "emergency_info": emergency_info,
             "medical_memory_used": bool(medical_memory),
             "privacy_status": privacy_status,
@@ -297,10 +453,10 @@ class LocalMedicalAI:
         }
         
         # Add emergency response if needed
-        if emergency_info['immediate_action_required']:
-            response_data['emergency_response'] = self._generate_emergency_response(emergency_info)
+        if emergency_response:
+            response_data['emergency_response'] = emergency_response
         
-        return response_data
+        yield "done", response_data
     
     def _generate_emergency_response(self, emergency_info: Dict) -> Dict[str, any]:
         """Generate emergency response with immediate action steps"""
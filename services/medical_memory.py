@@ -0,0 +1,210 @@
+"""
+Medical Memory Store
+Per-user medical memory in a bounded LRU/TTL hot tier over a shared, write-behind database table
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from config import settings
+from knowledge_base.bulk_load import upsert_rows
+from knowledge_base.cache import LRUCache
+from models import MedicalMemory
+
+# History kept per list: once a list outgrows the limit it is cut back to the most recent entries
+HISTORY_LIMITS = {
+    'symptoms_history': (100, 50),
+    'conditions_discussed': (50, 25),
+    'medications_mentioned': (50, 25),
+}
+
+
+def _encode(memory: Dict) -> str:
+    return json.dumps(memory, separators=(",", ":"))
+
+
+class MedicalMemoryStore:
+    """Bounded per-user memory shared by every worker through the ``medical_memories`` table
+
+    Reads go hot tier -> unflushed writes -> database; the hot tier holds the
+    compact JSON of at most ``max_users`` users (users without a memory are
+    cached too, so they cost one query per TTL). Updates land in the hot tier
+    immediately and are upserted in batches by a daemon writer thread every
+    ``flush_seconds``, or sooner once ``flush_batch`` users are pending.
+
+    A worker sees another worker's updates once they are flushed and its own
+    hot entry has expired; concurrent updates for one user in two workers
+    resolve as last flush wins.
+    """
+
+    def __init__(self, engine: Engine = None, max_users: int = None, ttl_seconds: float = None,
+                 flush_seconds: float = None, flush_batch: int = None):
+        if engine is None:
+            from database import engine
+        self.engine = engine
+        self.hot = LRUCache(
+            max_users if max_users is not None else settings.MEDICAL_MEMORY_MAX_USERS,
+            ttl_seconds if ttl_seconds is not None else settings.MEDICAL_MEMORY_TTL_SECONDS
+        )
+        self.flush_seconds = flush_seconds if flush_seconds is not None else settings.MEDICAL_MEMORY_FLUSH_SECONDS
+        self.flush_batch = flush_batch if flush_batch is not None else settings.MEDICAL_MEMORY_FLUSH_BATCH
+        # user_id -> (encoded memory, interaction count, updated at) awaiting the writer
+        self._pending: Dict[str, Tuple[str, int, datetime]] = {}
+        # The batch the writer is upserting, still readable until it is committed
+        self._flushing: Dict[str, Tuple[str, int, datetime]] = {}
+        self._lock = threading.RLock()  # guards _pending and _flushing and serializes every hot-tier write
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self.db_reads = 0
+        self.db_read_errors = 0
+        self.rows_flushed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+
+    def get(self, user_id: str) -> Dict:
+        """The user's memory, or an empty dict when nothing has been recorded; callers get their own copy"""
+        encoded = self._lookup(user_id)
+        return json.loads(encoded) if encoded else {}
+
+    def _lookup(self, user_id: str) -> Optional[str]:
+        hit, encoded = self.hot.get(user_id)
+        if hit:
+            return encoded
+        # Misses are filled under the lock, so a concurrent update cannot be overwritten by an older read
+        with self._lock:
+            unwritten = self._pending.get(user_id) or self._flushing.get(user_id)
+            if unwritten is not None:
+                # Evicted from the hot tier before the writer committed it
+                encoded = unwritten[0]
+            else:
+                try:
+                    with self.engine.connect() as connection:
+                        encoded = connection.execute(
+                            select(MedicalMemory.data).where(MedicalMemory.user_id == user_id)
+                        ).scalar()
+                    self.db_reads += 1
+                except SQLAlchemyError as e:
+                    # Not cached, so the next lookup tries the database again
+                    self.db_read_errors += 1
+                    print(f"Medical memory read error: {e}")
+                    return None
+            self.hot.set(user_id, encoded)
+            return encoded
+
+    def record_interaction(self, user_id: str, symptoms: Iterable[str] = (), conditions: Iterable[str] = (),
+                           medications: Iterable[str] = ()) -> Dict:
+        """Add one interaction's entities to the user's memory and queue it for the writer"""
+        with self._lock:
+            memory = self.get(user_id) or {
+                'symptoms_history': [],
+                'conditions_discussed': [],
+                'medications_mentioned': [],
+                'interaction_count': 0,
+                'last_interaction': None
+            }
+            now = datetime.utcnow()
+            memory['interaction_count'] += 1
+            memory['last_interaction'] = now.isoformat()
+            memory['symptoms_history'].extend(symptoms)
+            memory['conditions_discussed'].extend(conditions)
+            memory['medications_mentioned'].extend(medications)
+            for field, (limit, keep) in HISTORY_LIMITS.items():
+                if len(memory[field]) > limit:
+                    memory[field] = memory[field][-keep:]
+
+            encoded = _encode(memory)
+            self.hot.set(user_id, encoded)
+            self._pending[user_id] = (encoded, memory['interaction_count'], now)
+            pending = len(self._pending)
+
+        self._ensure_writer()
+        if pending >= self.flush_batch:
+            self._wake.set()
+        return memory
+
+    def flush(self) -> int:
+        """Upsert every pending memory in one batch; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+            if not batch:
+                return 0
+            rows = [
+                {"user_id": user_id, "data": encoded, "interaction_count": count, "updated_at": updated_at}
+                for user_id, (encoded, count, updated_at) in batch.items()
+            ]
+            started = time.perf_counter()
+            try:
+                with self.engine.begin() as connection:
+                    upsert_rows(connection, MedicalMemory.__table__, rows, ("user_id",))
+            except SQLAlchemyError as e:
+                # Requeue for the next flush unless a newer update has replaced the entry meanwhile
+                with self._lock:
+                    for user_id, entry in batch.items():
+                        self._pending.setdefault(user_id, entry)
+                    self._flushing = {}
+                self.flush_errors += 1
+                print(f"Medical memory flush error: {e}")
+                return 0
+            with self._lock:
+                self._flushing = {}
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.rows_flushed += len(rows)
+            return len(rows)
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._write_loop, name="medical-memory-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the writer thread and write out whatever is still pending"""
+        self._stop.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join(timeout)
+        self.flush()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Hot-tier size and hit rate, plus database read and write-behind counters"""
+        metrics = self.hot.stats()
+        with self._lock:
+            pending = len(self._pending)
+        metrics.update({
+            "memory_bytes": sum(len(encoded) for encoded in self.hot.values() if encoded),
+            "db_reads": self.db_reads,
+            "db_read_errors": self.db_read_errors,
+            "pending_writes": pending,
+            "rows_flushed": self.rows_flushed,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "flush_seconds": self.flush_seconds
+        })
+        return metrics
+
+
+medical_memory_store = MedicalMemoryStore()
@@ -16,11 +16,12 @@ def analyze_symptoms_model(symptoms, duration=None, severity=None, age=None, gen
     """Enhanced symptom analysis using knowledge base"""
     
     if knowledge_service:
-        # Use knowledge base for intelligent analysis
+        # Use knowledge base for intelligent analysis; free text is resolved
+        # to canonical symptom names by the knowledge base resolver
         if isinstance(symptoms, str):
-            symptoms = [s.strip().title() for s in symptoms.split(',')]
+            symptoms = [s.strip() for s in symptoms.split(',') if s.strip()]
         elif isinstance(symptoms, list):
-            symptoms = [s.strip().title() for s in symptoms]
+            symptoms = [s.strip() for s in symptoms if s.strip()]
         
         # Get analysis from knowledge base
         kb_analysis = knowledge_service.analyze_symptom_combination(
@@ -34,7 +35,7 @@ def analyze_symptoms_model(symptoms, duration=None, severity=None, age=None, gen
         for disease in kb_analysis.get('possible_diseases', []):
             possible_conditions.append({
                 "name": disease['name'],
-                "probability": disease['match_score'],
+                "probability": disease.get('posterior', disease['match_score']),
                 "description": disease.get('description', ''),
                 "icd_10_code": disease.get('icd_10_code', ''),
                 "severity_level": disease.get('severity_level', 'unknown')
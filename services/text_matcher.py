@@ -0,0 +1,128 @@
+"""
+Multi-Pattern Text Matcher
+Aho-Corasick automaton that finds every vocabulary term in a message in one pass
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+
+class TermMatch(NamedTuple):
+    term: str  # the vocabulary term as given, not the slice of the message
+    category: str
+    value: str  # what the term stands for, e.g. the canonical name of a synonym
+    start: int  # offsets into the lowercased message
+    end: int
+
+
+# Endings a term of an inflected category may carry: "chest pains", "headaches", "severely"
+INFLECTIONS = ("s", "es", "ing", "ed", "ly")
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _inflected_end(text: str, end: int) -> int:
+    """End of the word when ``text[end:]`` continues with one of INFLECTIONS, else -1"""
+    for suffix in INFLECTIONS:
+        stop = end + len(suffix)
+        if text.startswith(suffix, end) and (stop == len(text) or not _is_word_char(text[stop])):
+            return stop
+    return -1
+
+
+class TextMatcher:
+    """Case-insensitive, word-boundary-aware matcher over a fixed vocabulary
+
+    Built once from (term, category) or (term, category, value) tuples;
+    ``find`` then costs one walk of the message however many terms there
+    are. A term only matches as whole words, so "pain" is found in
+    "chest pain" but not in "painting". Terms of the ``inflected`` categories
+    may also end in one of INFLECTIONS, so "chest pain" is found in "chest
+    pains". The same term may belong to several categories; within one
+    category its first value wins.
+    """
+
+    def __init__(self, terms: Iterable[Tuple[str, ...]], inflected: Iterable[str] = ()):
+        self.inflected = frozenset(inflected)
+        self.terms: List[Tuple[str, str, str]] = []
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        seen = set()
+        for entry in terms:
+            term, category = entry[0], entry[1]
+            value = entry[2] if len(entry) > 2 else term
+            pattern = term.strip().lower()
+            if not pattern or (pattern, category) in seen:
+                continue
+            seen.add((pattern, category))
+            node = 0
+            for char in pattern:
+                child = goto[node].get(char)
+                if child is None:
+                    child = len(goto)
+                    goto[node][char] = child
+                    goto.append({})
+                    outputs.append([])
+                node = child
+            outputs[node].append(len(self.terms))
+            self.terms.append((term, category, value))
+
+        # Breadth-first failure links; each node inherits the outputs of its fallback
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                fallback = fail[node]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0)
+                outputs[child] = outputs[child] + outputs[fail[child]]
+                queue.append(child)
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+        self._lengths = [len(term.strip().lower()) for term, _, _ in self.terms]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def find(self, text: str) -> List[TermMatch]:
+        """Every whole-word occurrence of a vocabulary term, in order of where it ends"""
+        text = text.lower()
+        goto, fail, outputs, lengths = self._goto, self._fail, self._outputs, self._lengths
+        matches = []
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not outputs[node]:
+                continue
+            end = position + 1
+            word_end = end
+            if end < len(text) and _is_word_char(text[end]):
+                word_end = _inflected_end(text, end) if self.inflected else -1
+                if word_end < 0:
+                    continue
+            for term_index in outputs[node]:
+                start = end - lengths[term_index]
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                term, category, value = self.terms[term_index]
+                if word_end != end and category not in self.inflected:
+                    continue
+                matches.append(TermMatch(term, category, value, start, word_end))
+        return matches
+
+    def find_by_category(self, text: str) -> Dict[str, List[str]]:
+        """Distinct matched values per category, in order of first appearance"""
+        found: Dict[str, List[str]] = {}
+        for match in self.find(text):
+            values = found.setdefault(match.category, [])
+            if match.value not in values:
+                values.append(match.value)
+        return found
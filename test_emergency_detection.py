@@ -0,0 +1,65 @@
+"""
+Emergency Detection Regression Tests
+Phrases the original substring keyword checks flagged must still be flagged by the vocabulary matcher
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The AI loads its vocabulary from the knowledge base; point it at a copy so the
+# connection PRAGMAs never rewrite the bundled database
+ROOT = os.path.dirname(os.path.abspath(__file__))
+if "DATABASE_URL" not in os.environ and os.path.exists(os.path.join(ROOT, "mayberry_medical.db")):
+    _copy = os.path.join(tempfile.mkdtemp(prefix="emergency-"), "mayberry_medical.db")
+    shutil.copyfile(os.path.join(ROOT, "mayberry_medical.db"), _copy)
+    os.environ["DATABASE_URL"] = f"sqlite:///{_copy}"
+
+from services.local_medical_ai import local_medical_ai
+from services.text_matcher import TextMatcher
+
+# (message, emergency level the pre-matcher keyword checks assigned)
+BASELINE_EMERGENCIES = [
+    ("I'm having chest pains", "high"),
+    ("heart attacks run in family, I think I'm having one", "medium"),
+    ("I think I'm having a stroke", "high"),
+    ("severe chest pain radiating to my arm", "critical"),
+    ("my father is unconscious", "medium"),
+    ("I have had difficulty breathing since this morning", "high"),
+    ("there is severe bleeding from the cut", "critical"),
+    ("the worst severe headache of my life", "critical"),
+    ("this is an emergency", "critical"),
+    ("having stroke symptoms, it is urgent", "critical"),
+]
+
+
+@pytest.mark.parametrize("message, level", BASELINE_EMERGENCIES)
+def test_baseline_emergencies_are_detected(message, level):
+    result = local_medical_ai.detect_emergency(message)
+    assert result["emergency_detected"], result
+    assert result["emergency_level"] == level, result
+
+
+@pytest.mark.parametrize("message", [
+    "I have a mild cough",
+    "I was painting the fence all day",
+])
+def test_ordinary_messages_are_not_emergencies(message):
+    assert not local_medical_ai.detect_emergency(message)["emergency_detected"]
+
+
+@pytest.mark.parametrize("message, symptom", [
+    ("I keep having headaches", "Headache"),
+    ("coughing all night", "Cough"),
+    ("I've had fevers on and off", "Fever"),
+])
+def test_inflected_symptoms_are_extracted(message, symptom):
+    assert symptom in local_medical_ai.extract_medical_entities(message)["symptoms"]
+
+
+def test_inflections_only_apply_to_inflected_categories():
+    matcher = TextMatcher([("pain", "symptom"), ("flu", "disease")], inflected=("symptom",))
+    assert [match.term for match in matcher.find("pains and flus")] == ["pain"]
+    assert matcher.find("painting") == []
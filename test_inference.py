@@ -0,0 +1,95 @@
+"""
+Inference Batching Tests
+Micro-batching against a recording backend, and the transformers backend on a tiny random model
+"""
+
+import threading
+import time
+
+import pytest
+
+from services.inference import InferenceBackend, MicroBatcher, TransformersBackend, save_tiny_random_model
+
+
+class RecordingBackend(InferenceBackend):
+    """Embeds a text as [len(text)] and remembers the size of every batch"""
+
+    name = "recording"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    def embed(self, texts):
+        self.batches.append(len(texts))
+        time.sleep(self.delay)
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_requests_share_batches():
+    backend = RecordingBackend(delay=0.01)
+    batcher = MicroBatcher(backend, max_batch_size=4, max_wait_ms=50)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def request(i):
+        barrier.wait()
+        results[i] = batcher.embed(["x" * i])[0]
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.stop()
+
+    assert results == {i: [float(i)] for i in range(8)}
+    assert max(backend.batches) == 4
+    assert len(backend.batches) < 8
+    metrics = batcher.get_metrics()
+    assert metrics["requests"] == 8
+    assert metrics["batch_fill"] == pytest.approx(8 / (4 * metrics["batches"]))
+
+
+def test_lone_request_waits_at_most_the_budget():
+    batcher = MicroBatcher(RecordingBackend(), max_batch_size=8, max_wait_ms=20)
+    started = time.monotonic()
+    assert batcher.embed(["fever"], timeout=1) == [[5.0]]
+    elapsed = time.monotonic() - started
+    batcher.stop()
+    assert elapsed < 0.5
+    assert batcher.get_metrics()["batch_sizes"] == {1: 1}
+
+
+def test_backend_errors_reach_every_caller():
+    class FailingBackend(InferenceBackend):
+        def embed(self, texts):
+            raise ValueError("model exploded")
+
+    batcher = MicroBatcher(FailingBackend(), max_batch_size=2, max_wait_ms=20)
+    futures = [batcher.submit("a"), batcher.submit("b")]
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result(timeout=1)
+    batcher.stop()
+    assert batcher.get_metrics()["failed_batches"] == 1
+    with pytest.raises(RuntimeError):
+        batcher.submit("c")
+
+
+def test_transformers_backend_on_tiny_random_model(tmp_path):
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    path = save_tiny_random_model(str(tmp_path / "tiny-bert"))
+    backend = TransformersBackend(path, max_length=32)
+    batcher = MicroBatcher(backend, max_batch_size=4, max_wait_ms=10)
+    try:
+        texts = ["severe chest pain", "mild fever", "cough"]
+        batched = batcher.embed(texts, timeout=10)
+    finally:
+        batcher.stop()
+
+    assert len(batched) == 3 and all(len(vector) == 32 for vector in batched)
+    # Padding inside a batch must not change a text's embedding
+    alone = backend.embed(["cough"])[0]
+    assert alone == pytest.approx(batched[2], abs=1e-5)
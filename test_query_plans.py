@@ -0,0 +1,168 @@
+"""
+Query Plan Regression Tests
+Run EXPLAIN QUERY PLAN on the queries the services issue and fail on full table scans
+"""
+
+import os
+import re
+import shutil
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.orm import sessionmaker
+
+import models
+from auth import get_user_by_email
+from knowledge_base import models as kb_models
+from knowledge_base.service import MedicalKnowledgeService
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# "SCAN t" / "SCAN TABLE t" with no index is a full table scan; index scans, FTS
+# virtual tables, subqueries and constant rows are not
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(?!\()(?!CONSTANT ROW)(\S+)(?!.*\b(?:USING|VIRTUAL TABLE)\b)")
+
+
+def _full_scans(connection, statement: str, parameters=()) -> list:
+    plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters or ())).all()
+    return [row[-1] for row in plan if FULL_SCAN.match(row[-1])]
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    """A copy of the bundled database, brought to the latest migration"""
+    database_path = str(tmp_path_factory.mktemp("plans") / "plans.db")
+    source = os.path.join(ROOT, "mayberry_medical.db")
+    if os.path.exists(source):
+        shutil.copyfile(source, database_path)
+    url = f"sqlite:///{database_path}"
+
+    engine = create_engine(url)
+    # Same order as a deployment: the app creates missing tables, then migrations run
+    models.Base.metadata.create_all(bind=engine)
+    kb_models.Base.metadata.create_all(bind=engine)
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def captured(engine):
+    """Record every SELECT issued on the engine during a test"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def _assert_no_full_scans(engine, statements):
+    assert statements, "no queries were captured"
+    with engine.connect() as connection:
+        failures = [
+            (statement, scans) for statement, parameters in statements
+            if (scans := _full_scans(connection, statement, parameters))
+        ]
+    assert not failures, "\n\n".join(f"{scans}\n{statement}" for statement, scans in failures)
+
+
+def test_knowledge_service_queries_use_indexes(engine, captured):
+    # Searches FTS finds nothing for fall back to a substring scan, so give the guideline search a match
+    db = sessionmaker(bind=engine)()
+    try:
+        db.add(kb_models.MedicalGuideline(title="Hypertension management", content="Blood pressure targets"))
+        db.commit()
+    finally:
+        db.close()
+    service = MedicalKnowledgeService(engine=engine)
+    # Loading the index, fingerprinting the version and the FTS setup check read whole tables by design
+    index = service.get_index()
+    assert service.fts_enabled
+    del captured[:]
+
+    disease = next(iter(index.diseases.values()), {"name": "influenza"})
+    symptom = next(iter(index.symptoms.values()), {"name": "fever"})
+    medication = index.medications[0]["generic_name"] if index.medications else "aspirin"
+
+    service.search_symptoms(symptom["name"])
+    _, cursor = service.page_symptoms("pain", limit=1)
+    service.page_symptoms("pain", limit=1, cursor=cursor)
+    service.search_diseases(disease["name"])
+    _, cursor = service.page_diseases("infection", limit=1)
+    service.page_diseases("infection", limit=1, cursor=cursor)
+    service.get_differentials(disease["name"])
+    service.get_differentials_for_symptoms((symptom["name"],))
+    service.get_treatments_for_disease(disease["name"])
+    service.get_medication_info(medication)
+    service.get_medical_guidelines("hypertension")
+
+    _assert_no_full_scans(engine, captured)
+
+
+def test_auth_queries_use_indexes(engine, captured):
+    db = sessionmaker(bind=engine)()
+    try:
+        get_user_by_email(db, "nobody@example.com")
+        db.query(models.UserProfile).filter(models.UserProfile.user_id == "missing").first()
+    finally:
+        db.close()
+
+    _assert_no_full_scans(engine, captured)
+
+
+# Access patterns each index added by the migrations exists to serve
+ACCESS_PATTERNS = {
+    "conversations_by_session": select(models.Conversation).where(
+        models.Conversation.session_id == "s").order_by(models.Conversation.created_at),
+    "conversations_by_user": select(models.Conversation).where(
+        models.Conversation.user_id == "u").order_by(models.Conversation.created_at.desc()),
+    "health_records_by_user": select(models.HealthRecord).where(
+        models.HealthRecord.user_id == "u").order_by(models.HealthRecord.created_at.desc()),
+    "medications_by_generic_name": select(kb_models.Medication).where(
+        kb_models.Medication.generic_name == "aspirin"),
+    "lab_markers_by_name": select(kb_models.LabMarker).where(kb_models.LabMarker.name == "Glucose"),
+    "lab_markers_by_disease": select(kb_models.LabMarker).where(kb_models.LabMarker.disease_id == "d"),
+    "diseases_for_symptom_mapping": select(kb_models.symptom_disease_association).where(
+        kb_models.symptom_disease_association.c.disease_id == "d"),
+    "differentials_by_similarity": select(kb_models.DifferentialDiagnosis).where(
+        kb_models.DifferentialDiagnosis.primary_disease_id == "d"
+    ).order_by(kb_models.DifferentialDiagnosis.similarity_score.desc()).limit(10),
+}
+
+
+@pytest.mark.parametrize("name", list(ACCESS_PATTERNS))
+def test_access_pattern_uses_index(engine, name):
+    compiled = ACCESS_PATTERNS[name].compile(engine)
+    parameters = [compiled.params[key] for key in compiled.positiontup]
+    with engine.connect() as connection:
+        plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", tuple(parameters)).all()
+    details = [row[-1] for row in plan]
+    assert not any(FULL_SCAN.match(detail) for detail in details), details
+    assert not any("USE TEMP B-TREE FOR ORDER BY" in detail for detail in details), details
+
+
+def test_downgrade_removes_indexes(engine, tmp_path):
+    database_path = str(tmp_path / "downgrade.db")
+    with engine.connect() as connection:
+        connection.execute(text(f"VACUUM INTO '{database_path}'"))
+    url = f"sqlite:///{database_path}"
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.downgrade(config, "base")
+
+    downgraded = create_engine(url)
+    try:
+        with downgraded.connect() as connection:
+            names = {row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    finally:
+        downgraded.dispose()
+    assert "ix_conversations_session_created" not in names
+    assert "ix_medications_generic_name" not in names